@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Check that ``apply_inverse_batch`` (used by ``prek_make_stcs.py``) gives the
+same STCs, and morphed STCs, as applying the inverse one condition at a time.
+
+Every combination of orientation constraint (free, loose, fixed), inverse
+method (MNE, dSPM, sLORETA) and estimate type (magnitude, and vector/normal
+where the constraint allows) is checked, on each subject's pre-camp evokeds
+(equalized as in ``prek_make_stcs.py``, but with "aliens" averaged from every
+other epoch, so that there are always two ``nave`` batches). Meant for the
+synthetic dataset:
+
+    python make_synthetic_dataset.py /tmp/prek-synth --subjects 2
+    cd erp
+    PREK_PARAMS=/tmp/prek-synth/params python prek_check_batch_inverse.py
+
+The exit status is 1 if any STC differs.
+"""
+
+import os
+import sys
+import numpy as np
+import mne
+from mne.minimum_norm import apply_inverse, read_inverse_operator
+from sswef_helpers.aux_functions import (
+    load_paths, load_params, yamload, load_fsaverage_src, apply_inverse_batch,
+    PREPROCESS_JOINTLY)
+
+# flags
+rtol = 1e-10  # relative to the largest value of each STC
+mne.set_log_level('warning')  # just the report, not MNE's progress
+
+# load params
+*_, subjects, cohort = load_params(experiment='erp')
+
+# config paths
+data_root, subjects_dir, _ = load_paths()
+subfolder = 'combined' if PREPROCESS_JOINTLY else 'erp'
+
+# config other
+conditions = ['words', 'faces', 'cars', 'aliens']
+conditions_that_matter = conditions[:-1]
+lambda2 = 1. / 3. ** 2
+smoothing_steps = 10
+methods = ('MNE', 'dSPM', 'sLORETA')
+# inverse file suffix, and the estimate types each constraint allows
+constraints = {'free': ('-free', (None, 'vector')),
+               'loose': ('', (None, 'normal', 'vector')),
+               'fixed': ('-fixed', (None,))}
+paramfile = os.path.join('..', 'preprocessing', 'mnefun_common_params.yaml')
+with open(paramfile, 'r') as f:
+    params = yamload(f)
+lp_cut = params['preprocessing']['filtering']['lp_cut']
+del params
+
+# load fsaverage source space
+fsaverage_src = load_fsaverage_src()
+fsaverage_vertices = [s['vertno'] for s in fsaverage_src]
+
+
+def compare(batched, single):
+    """Largest difference between two lists of STCs, relative to the
+    largest value of each (inf if their vertices or times differ)."""
+    worst = 0.
+    for stc, _stc in zip(batched, single):
+        if (type(stc) is not type(_stc) or
+                not all(np.array_equal(verts, _verts) for verts, _verts in
+                        zip(stc.vertices, _stc.vertices)) or
+                not np.allclose(stc.times, _stc.times)):
+            return np.inf
+        scale = np.abs(_stc.data).max()
+        worst = max(worst, np.abs(stc.data - _stc.data).max() / scale)
+    return worst
+
+
+failed = list()
+for s in subjects:
+    this_subj = os.path.join(data_root, 'pre_camp', 'twa_hp', subfolder, s)
+    epo_path = os.path.join(this_subj, 'epochs',
+                            f'All_{lp_cut}-sss_{s}-epo.fif')
+    # load epochs, equalize, make evokeds
+    epochs = mne.read_epochs(epo_path)
+    epochs, _ = epochs.equalize_event_counts(
+        event_ids=conditions_that_matter, method='mintime')
+    evokeds = [epochs[cond].average() for cond in conditions_that_matter]
+    evokeds.append(epochs[conditions[-1]][::2].average())
+    naves = sorted(set(evk.nave for evk in evokeds))
+    print(f'{s}: nave {", ".join(map(str, naves))}')
+    morph = None
+    for constr, (suffix, oris) in constraints.items():
+        inv_path = os.path.join(this_subj, 'inverse',
+                                f'{s}-{lp_cut}-sss-meg{suffix}-inv.fif')
+        inv = read_inverse_operator(inv_path)
+        if morph is None:  # only needs the anatomy
+            morph = mne.compute_source_morph(inv['src'],
+                                             subject_from=s.upper(),
+                                             subject_to='fsaverage',
+                                             subjects_dir=subjects_dir,
+                                             spacing=fsaverage_vertices,
+                                             smooth=smoothing_steps)
+        for method in methods:
+            for ori in oris:
+                stcs, morphed_stcs = apply_inverse_batch(
+                    evokeds, inv, lambda2, method=method, pick_ori=ori,
+                    morph=morph)
+                _stcs = [apply_inverse(evk, inv, lambda2, method=method,
+                                       pick_ori=ori) for evk in evokeds]
+                _morphed_stcs = [morph.apply(stc) for stc in _stcs]
+                diffs = (compare(stcs, _stcs),
+                         compare(morphed_stcs, _morphed_stcs))
+                ok = max(diffs) <= rtol
+                print(f'  {constr:5} {method:7} {ori or "magnitude":9} '
+                      f'max rel. diff {diffs[0]:.1e} (morphed '
+                      f'{diffs[1]:.1e}){"" if ok else "  FAILED"}')
+                if not ok:
+                    failed.append((s, constr, method, ori))
+
+print(f'{len(failed)} failed combination(s)')
+sys.exit(int(bool(failed)))
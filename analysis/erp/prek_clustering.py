@@ -18,12 +18,14 @@ from mne.stats import (spatio_temporal_cluster_1samp_test,
                        spatio_temporal_cluster_test)
 from sswef_helpers.aux_functions import (
     load_paths, load_params, load_cohorts, load_fsaverage_src,
-    load_inverse_params, prep_cluster_stats, define_labels, PREPROCESS_JOINTLY)
+    load_inverse_params, prep_cluster_stats, define_labels, stc_store_fname,
+    STCStore, stamp, PREPROCESS_JOINTLY)
 
 mne.cuda.init_cuda()
 rng = np.random.RandomState(seed=15485863)  # the one millionth prime
 n_jobs = 10
 threshold = None        # or dict(start=0, step=0.2) for TFCE
+use_stc_store = True    # read subject STCs from prek_make_stc_store.py's store
 
 
 def do_clustering(X, label, adjacency, groups=1):
@@ -43,6 +45,8 @@ def do_clustering(X, label, adjacency, groups=1):
     out_fpath = os.path.join(cluster_dir, out_fname)
     print(f'Saving cluster results to {out_fpath}')
     np.savez(out_fpath, **stats)
+    stamp(out_fpath, threshold=threshold, n_permutations=1024,
+          spatial_limits=spatial_limits)
 
 
 # define the maximum spatial extent of clustering. The following special
@@ -93,6 +97,10 @@ rh_src = fsaverage_src.copy()
 _ = lh_src.pop(1)
 _ = rh_src.pop(0)
 source_spaces = dict(both=fsaverage_src, lh=lh_src, rh=rh_src)
+# rows of the STC data in each hemisphere
+hemi_rows = dict(lh=slice(0, hemi_nverts), rh=slice(hemi_nverts, None),
+                 both=slice(None))
+store = STCStore(stc_store_fname('erp')) if use_stc_store else None
 adj_matrices = {hemi: mne.spatial_src_adjacency(src)
                 for hemi, src in source_spaces.items()}
 
@@ -159,6 +167,14 @@ for hemi in spatial_limits['hemi']:
             data_dict[group][timepoint] = dict()
             # load the individual subject STCs for each condition
             for cond in conditions:
+                if use_stc_store:
+                    # all subjects at once, just the hemisphere(s) we want;
+                    # transpose to (subj, time, space)
+                    data = store.get_data(
+                        group_members, [timepoint[:-4]], [cond], [method],
+                        vertices=hemi_rows[hemi])[:, 0, 0, 0]
+                    data_dict[group][timepoint][cond] = data.transpose(0, 2, 1)
+                    continue
                 data_dict[group][timepoint][cond] = list()
                 # loop over subjects
                 for s in group_members:
@@ -12,7 +12,7 @@ import os
 from itertools import combinations
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params, load_cohorts,
-                                         load_inverse_params)
+                                         load_inverse_params, stamp)
 
 mne.cuda.init_cuda()
 overwrite = False
@@ -43,6 +43,18 @@ groups = dict(GrandAvg=subjects)
 groups.update(intervention_group)
 groups.update(letter_knowledge_group)
 
+# group average STCs that each STC is computed from, keyed like stc_dict
+sources = dict()
+
+
+def save_contrast(stc, fname, key, *parts):
+    """Save a contrast STC (of the STCs keyed ``parts``) as ``key``."""
+    sources[key] = [fpath for part in parts for fpath in sources[part]]
+    fpath = os.path.join(groupavg_path, fname)
+    stc.save(fpath)
+    stamp(fpath, inputs=sources[key])
+
+
 # LOOP ONCE THROUGH ALL CONDITIONS TO LOAD THE STCs INTO A DICT
 stc_dict = dict()
 for group_name, group_members in groups.items():
@@ -60,6 +72,7 @@ for group_name, group_members in groups.items():
             avg_fpath = os.path.join(groupavg_path, fname)
             stc = mne.read_source_estimate(avg_fpath)
             stc_dict[group][timepoint][cond] = stc
+            sources[(group, timepoint, cond)] = [avg_fpath]
 
         # CONTRAST TRIAL CONDITIONS
         for contr_key, (contr_0, contr_1) in contrasts.items():
@@ -68,7 +81,9 @@ for group_name, group_members in groups.items():
             stc_dict[group][timepoint][contr_key] = stc
             # save the contrast STC
             fname = f'{cohort}_{group}_{timepoint}_{method}_{contr_key}'
-            stc.save(os.path.join(groupavg_path, fname))
+            save_contrast(stc, fname, (group, timepoint, contr_key),
+                          (group, timepoint, contr_0),
+                          (group, timepoint, contr_1))
 
     # CONTRAST POST-MINUS-PRE
     timepoint = 'PostCampMinusPreCamp'
@@ -82,7 +97,8 @@ for group_name, group_members in groups.items():
         stc_dict[group][timepoint][con] = stc
         # save the contrast STC
         fname = f'{cohort}_{group}_{timepoint}_{method}_{con}'
-        stc.save(os.path.join(groupavg_path, fname))
+        save_contrast(stc, fname, (group, timepoint, con),
+                      (group, 'postCamp', con), (group, 'preCamp', con))
 
 # CONTRAST PRE-INTERVENTION LETTER KNOWLEDGE
 timepoint = 'preCamp'
@@ -99,7 +115,9 @@ for con in conditions + list(contrasts):
     stc_dict[group][timepoint][con] = stc
     # save the contrast STC
     fname = f'{cohort}_{group}_{timepoint}_{method}_{con}'
-    stc.save(os.path.join(groupavg_path, fname))
+    save_contrast(stc, fname, (group, timepoint, con),
+                  (keys['UpperKnowledge'], timepoint, con),
+                  (keys['LowerKnowledge'], timepoint, con))
 
 # CONTRAST EFFECT OF INTERVENTION ON COHORTS
 if cohort != 'replication':
@@ -117,7 +135,9 @@ if cohort != 'replication':
         stc_dict[group][timepoint][con] = stc
         # save the contrast STC
         fname = f'{cohort}_{group}_{timepoint}_{method}_{con}'
-        stc.save(os.path.join(groupavg_path, fname))
+        save_contrast(stc, fname, (group, timepoint, con),
+                      (keys['LetterIntervention'], timepoint, con),
+                      (keys['LanguageIntervention'], timepoint, con))
 
 # MAKE THE MOVIES
 if make_movies:
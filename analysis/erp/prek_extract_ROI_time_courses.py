@@ -10,16 +10,20 @@ and subjects.
 import os
 import numpy as np
 import mne
+from mne.parallel import parallel_func
 from matplotlib import rcParams
 from matplotlib.colors import to_rgba
 from sswef_helpers.aux_functions import (
     load_paths, load_params, load_inverse_params, load_fsaverage_src,
-    get_dataframe_from_label, plot_label, plot_label_and_timeseries)
+    get_dataframes_from_labels, plot_label, plot_label_and_timeseries,
+    write_roi_timeseries, use_offscreen_rendering, stc_store_fname, stamp)
 
 # flags
 mne.cuda.init_cuda()
 n_jobs = 10
 plot = True
+run_parallel = True  # use `n_jobs` workers for label extraction & plotting
+use_stc_store = True  # read subject STCs from prek_make_stc_store.py's store
 
 # load params
 brain_plot_kwargs, _, subjects, cohort = load_params(experiment='erp')
@@ -34,6 +38,7 @@ chosen_constraints = ('{orientation_constraint}-{estimate_type}'
 data_root, subjects_dir, results_dir = load_paths()
 roi_dir = os.path.join('..', 'ROIs')
 timeseries_dir = os.path.join(results_dir, 'roi', 'time-series')
+timeseries_store = os.path.join(timeseries_dir, 'roi-timeseries-long')
 img_dir = os.path.join(results_dir, 'roi', 'images')
 for dir in (timeseries_dir, img_dir):
     os.makedirs(dir, exist_ok=True)
@@ -91,30 +96,48 @@ if cohort == 'replication':
 else:
     group_lists = (['grandavg'], ['letter', 'language'], ['upper', 'lower'])
 
-for region, label in rois.items():
-    # prepare to plot
-    lineplot_kwargs = dict(hue='condition', hue_order=all_conditions,
-                           style='timepoint', style_order=all_timepoints)
-    # get dataframe
-    df = get_dataframe_from_label(label, fsaverage_src, experiment='erp')
+lineplot_kwargs = dict(hue='condition', hue_order=all_conditions,
+                       style='timepoint', style_order=all_timepoints)
+
+
+def csv_fpath(region):
+    return os.path.join(timeseries_dir, f'roi-{region}-timeseries-long.csv')
+
+
+def plot_roi(region, label, df):
+    """Plot label, and label + timeseries, for each grouping of subjects."""
+    use_offscreen_rendering()
+    for groups in group_lists:
+        # plot label
+        group_str = 'Versus'.join([g.capitalize() for g in groups])
+        img_fname = f'{method}-{group_str}-roi-{region}.png'
+        img_path = os.path.join(img_dir, img_fname)
+        plot_label(label, img_path, **brain_plot_kwargs)
+        # plot timeseries
+        plot_label_and_timeseries(label, img_path, df, method, groups,
+                                  timepoints=all_timepoints,
+                                  conditions=all_conditions,
+                                  all_timepoints=all_timepoints,
+                                  all_conditions=all_conditions,
+                                  cluster=None,
+                                  lineplot_kwargs=lineplot_kwargs)
+        stamp(img_path, inputs=(csv_fpath(region),))
+
+
+# get dataframes (loads each subject's STCs once, for all ROIs)
+use_n_jobs = n_jobs if run_parallel else 1
+store = stc_store_fname('erp') if use_stc_store else None
+dfs = get_dataframes_from_labels(rois, fsaverage_src, experiment='erp',
+                                 n_jobs=use_n_jobs, store=store)
+for region, df in dfs.items():
     df['roi'] = region
-    # save dataframe
-    df.to_csv(os.path.join(timeseries_dir,
-                           f'roi-{region}-timeseries-long.csv'))
-    # plot
-    if plot:
-        for groups in group_lists:
-            # plot label
-            group_str = 'Versus'.join([g.capitalize() for g in groups])
-            img_fname = f'{method}-{group_str}-roi-{region}.png'
-            img_path = os.path.join(img_dir, img_fname)
-            plot_label(label, img_path, **brain_plot_kwargs)
-            # plot timeseries
-            this_df = df.loc[df['method'] == method]
-            plot_label_and_timeseries(label, img_path, this_df, method, groups,
-                                      timepoints=all_timepoints,
-                                      conditions=all_conditions,
-                                      all_timepoints=all_timepoints,
-                                      all_conditions=all_conditions,
-                                      cluster=None,
-                                      lineplot_kwargs=lineplot_kwargs)
+    # save dataframe (CSV for R, partitioned store for the python stats)
+    df.to_csv(csv_fpath(region))
+    stamp(csv_fpath(region))
+    write_roi_timeseries(df, timeseries_store)
+# plot (one ROI per worker)
+if plot:
+    parallel, run_func, _ = parallel_func(plot_roi, use_n_jobs)
+    parallel(run_func(region, rois[region],
+                      df.loc[df['method'] == method])
+             for region, df in dfs.items())
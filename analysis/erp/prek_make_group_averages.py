@@ -10,10 +10,11 @@ import os
 import mne
 from sswef_helpers.aux_functions import (
     load_paths, load_params, load_cohorts, load_inverse_params,
-    PREPROCESS_JOINTLY)
+    stc_store_fname, STCStore, stamp, PREPROCESS_JOINTLY)
 
 mne.cuda.init_cuda()
 overwrite = False
+use_stc_store = True  # read subject STCs from prek_make_stc_store.py's store
 
 # load params
 brain_plot_kwargs, _, subjects, cohort = load_params(experiment='erp')
@@ -31,6 +32,8 @@ subfolder = 'combined' if PREPROCESS_JOINTLY else 'erp'
 
 # config other
 conditions = ('words', 'faces', 'cars', 'aliens')
+store_fname = stc_store_fname('erp')
+store = STCStore(store_fname) if use_stc_store else None
 
 
 # load cohort info (keys Language/LetterIntervention and Lower/UpperKnowledge)
@@ -61,12 +64,19 @@ for prepost in ('pre', 'post'):
             if prepost == 'post' and group_name.endswith('Knowledge'):
                 continue
             # make cross-subject average
+            inputs = [store_fname] if use_stc_store else list()
             for s in group_members:
+                if use_stc_store:
+                    avg += store.get_stc(s, prepost, cond, method)
+                    continue
                 this_subj = os.path.join(data_root, f'{prepost}_camp',
                                          'twa_hp', subfolder, s)
                 fname = f'{s}FSAverage_{prepost}Camp_{method}_{cond}'
                 stc_path = os.path.join(this_subj, 'stc', fname)
                 avg += mne.read_source_estimate(stc_path)
+                inputs.append(stc_path)
             avg /= len(group_members)
             # save group average STCs
             avg.save(os.path.join(groupavg_path, avg_fname))
+            stamp(os.path.join(groupavg_path, avg_fname), inputs=inputs,
+                  members=group_members)
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Collect the morphed subject STCs into one chunked, compressed store (see
+``write_stc_store``), so that scripts that read many subjects at once
+(group averages, clustering, ROI extraction) make sliced reads of one file
+instead of opening thousands of small ones. Re-run after ``prek_make_stcs.py``.
+"""
+
+from sswef_helpers.aux_functions import (load_params, load_inverse_params,
+                                         stc_store_fname, write_stc_store,
+                                         stamp)
+
+# load params
+*_, subjects, cohort = load_params(experiment='erp')
+method = load_inverse_params()['method']
+
+# config other
+timepoints = ('pre', 'post')
+conditions = ('words', 'faces', 'cars', 'aliens')
+
+fname = stc_store_fname('erp')
+write_stc_store(fname, subjects, timepoints, conditions, methods=(method,),
+                overwrite=True)
+stamp(fname)
+print(f'Wrote {fname}')
@@ -12,7 +12,12 @@ import mne
 from mne.minimum_norm import apply_inverse, read_inverse_operator
 from sswef_helpers.aux_functions import (
     load_paths, load_params, yamload, load_inverse_params, load_fsaverage_src,
-    PREPROCESS_JOINTLY)
+    apply_inverse_batch, profile_units, stamp, PREPROCESS_JOINTLY)
+
+# flags
+# apply inverse & morph to all conditions at once (prek_check_batch_inverse.py
+# checks that this matches doing it one condition at a time)
+batch_inverse = True
 
 # load params
 *_, subjects, cohort = load_params(experiment='erp')
@@ -51,7 +56,7 @@ fsaverage_src = load_fsaverage_src()
 fsaverage_vertices = [s['vertno'] for s in fsaverage_src]
 
 # loop over subjects
-for s in subjects:
+for s in profile_units(subjects):
     already_morphed = False
     # loop over pre/post measurement time
     for prepost in ('pre', 'post'):
@@ -75,28 +80,40 @@ for s in subjects:
         epochs, dropped_indices = epochs.equalize_event_counts(
             event_ids=conditions_that_matter, method='mintime')
         evokeds = [epochs[cond].average() for cond in conditions]
-        # load inverse, make STCs and save
+        # load inverse
         inv = read_inverse_operator(inv_path)
-        stcs = [apply_inverse(evk, inv, lambda2, method=method,
-                              pick_ori=ori) for evk in evokeds]
-        # save STCs
-        for idx, stc in enumerate(stcs):
-            out_fname = (f'{s}_{prepost}Camp_{method}_'
-                         f'{evokeds[idx].comment}')
-            stc.save(os.path.join(stc_path, out_fname))
-        # morph to fsaverage. Doesn't recalculate for `post_camp` since
-        # anatomy hasn't changed; uses the most recent STC from the above
-        # saving loop (morph only needs the anatomy, not the MEG data)
+        # compute morph to fsaverage. Doesn't recalculate for `post_camp`
+        # since anatomy hasn't changed (morph only needs the anatomy, not the
+        # MEG data, and the inverse's source space gives us the anatomy)
         if not already_morphed:
-            morph = mne.compute_source_morph(stc, subject_from=s.upper(),
+            morph = mne.compute_source_morph(inv['src'],
+                                             subject_from=s.upper(),
                                              subject_to='fsaverage',
                                              subjects_dir=subjects_dir,
                                              spacing=fsaverage_vertices,
                                              smooth=smoothing_steps)
             already_morphed = True
-        morphed_stcs = [morph.apply(stc) for stc in stcs]
+        # make STCs & morph them
+        if batch_inverse:
+            stcs, morphed_stcs = apply_inverse_batch(
+                evokeds, inv, lambda2, method=method, pick_ori=ori,
+                morph=morph)
+        else:
+            stcs = [apply_inverse(evk, inv, lambda2, method=method,
+                                  pick_ori=ori) for evk in evokeds]
+            morphed_stcs = [morph.apply(stc) for stc in stcs]
+        # save STCs
+        for idx, stc in enumerate(stcs):
+            out_fname = (f'{s}_{prepost}Camp_{method}_'
+                         f'{evokeds[idx].comment}')
+            stc.save(os.path.join(stc_path, out_fname))
+            stamp(os.path.join(stc_path, out_fname),
+                  inputs=(epo_path, inv_path), snr=snr)
         # save morphed STCs
         for idx, stc in enumerate(morphed_stcs):
             out_fname = (f'{s}FSAverage_{prepost}Camp_{method}_'
                          f'{evokeds[idx].comment}')
             stc.save(os.path.join(stc_path, out_fname))
+            stamp(os.path.join(stc_path, out_fname),
+                  inputs=(epo_path, inv_path), snr=snr,
+                  smoothing_steps=smoothing_steps)
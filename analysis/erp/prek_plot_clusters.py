@@ -12,7 +12,7 @@ import numpy as np
 import mne
 from sswef_helpers.aux_functions import (
     load_paths, load_params, load_cohorts, load_inverse_params,
-    load_fsaverage_src)
+    load_fsaverage_src, BrainRenderer, stamp)
 
 mne.cuda.init_cuda()
 n_jobs = 10
@@ -52,6 +52,9 @@ groups.update(intervention_group)
 # load fsaverage source space
 fsaverage_src = load_fsaverage_src()
 
+# re-use the same (offscreen) Brain for every frame of every movie
+renderer = BrainRenderer(**brain_plot_kwargs)
+
 
 # workhorse function
 def make_cluster_movie(group, prepost, method, con, results_dir,
@@ -70,11 +73,10 @@ def make_cluster_movie(group, prepost, method, con, results_dir,
     # prepare output directory
     this_frames_dir = os.path.join(frames_dir, f'{stc_fname}_frames')
     os.makedirs(this_frames_dir, exist_ok=True)
-    # plot the brain
-    brain = stc.plot(subject='fsaverage', **brain_plot_kwargs)
     # loop over time points
+    frames = list()
     for t_idx, time in enumerate(stc.times):
-        brain.set_time(time)
+        labels = list()
         # loop over clusters
         for clu in signif_clu:
             temporal_idxs, spatial_idxs = cluster_dict['clusters'][clu]
@@ -97,10 +99,14 @@ def make_cluster_movie(group, prepost, method, con, results_dir,
                                   subject=stc.subject)
                 # fill in verts that are surrounded by cluster verts
                 label = label.fill(fsaverage_src)
-                brain.add_label(label, borders=True, color='m')
+                labels.append((label, dict(borders=True, color='m')))
         frame_fname = f'{cohort}_{stc_fname}_{t_idx:03}.png'
-        brain.save_image(os.path.join(this_frames_dir, frame_fname))
-        brain.remove_labels()
+        frames.append(dict(img_path=os.path.join(this_frames_dir,
+                                                 frame_fname),
+                           time=time, labels=labels))
+    # plot the brain, once per frame
+    for img_path in renderer.render(frames, stc=stc):
+        stamp(img_path, inputs=(stc_fpath, cluster_fpath))
 
 
 # loop over groups
@@ -126,3 +132,4 @@ for group_name, group_members in groups.items():
         make_cluster_movie(prepost='PostCampMinusPre', con=contrast,
                            results_subdir='group_averages',
                            **common_kwargs)
+renderer.close()
@@ -12,7 +12,8 @@ import numpy as np
 import mne
 from sswef_helpers.aux_functions import (
     load_paths, load_params, load_cohorts, load_inverse_params,
-    load_fsaverage_src, get_dataframe_from_label, plot_label_and_timeseries)
+    load_fsaverage_src, get_dataframe_from_label, plot_label_and_timeseries,
+    stamp)
 
 mne.cuda.init_cuda()
 n_jobs = 10
@@ -176,7 +177,9 @@ def make_cluster_stc(cluster_fname):
             f.write('no significant clusters')
     if has_signif_clusters:
         # save the quasi-STC
-        cluster_stc.save(os.path.join(cluster_stc_dir, avg_stc_fname))
+        cluster_stc_fpath = os.path.join(cluster_stc_dir, avg_stc_fname)
+        cluster_stc.save(cluster_stc_fpath)
+        stamp(cluster_stc_fpath, inputs=(avg_stc_fpath, cluster_fpath))
         # get indices for which clusters are significant
         signif_clu = cluster_dict['good_cluster_idxs'][0]
         # plot the clusters (saves as PNG image)
@@ -203,6 +206,7 @@ def make_cluster_stc(cluster_fname):
                                       groups, timepoints, conditions,
                                       all_timepoints, all_conditions,
                                       cluster, lineplot_kwargs)
+        stamp(cluster_img_path)
 
 
 cluster_fnames = sorted([x.name for x in os.scandir(cluster_dir)
@@ -3,6 +3,7 @@ set -e
 export DISPLAY=:1.0
 
 python prek_make_stcs.py
+python prek_make_stc_store.py
 python prek_make_group_averages.py
 python prek_do_contrasts.py
 python prek_extract_ROI_time_courses.py
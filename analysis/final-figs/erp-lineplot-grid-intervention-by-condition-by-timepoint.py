@@ -15,7 +15,7 @@ from matplotlib.patches import Polygon, FancyArrowPatch
 import pandas as pd
 import seaborn as sns
 
-from sswef_helpers.aux_functions import load_paths, yamload
+from sswef_helpers.aux_functions import load_paths, yamload, stamp
 
 
 def nice_ticklabels(ticks):
@@ -209,7 +209,9 @@ axs[0, -1].legend(handles=legend_artists.values(),
 
 # save
 linefig.savefig('lineplot-grid.png')
+stamp('lineplot-grid.png')
 linefig.savefig('lineplot-grid.pdf', dpi=400)
+stamp('lineplot-grid.pdf')
 
 # DIFFERENCE WAVES
 # init figure
@@ -288,4 +290,6 @@ difffig.subplots_adjust(left=0.14, bottom=0.12, right=0.97, top=0.9,
                         hspace=0.3, wspace=0.1)
 # save
 difffig.savefig('difference-waves-lineplot-grid.png')
+stamp('difference-waves-lineplot-grid.png')
 difffig.savefig('difference-waves-lineplot-grid.pdf', dpi=400)
+stamp('difference-waves-lineplot-grid.pdf')
@@ -14,7 +14,7 @@ from matplotlib.lines import Line2D
 import pandas as pd
 import seaborn as sns
 
-from sswef_helpers.aux_functions import load_paths, yamload
+from sswef_helpers.aux_functions import load_paths, yamload, stamp
 
 
 def nice_ticklabels(ticks):
@@ -105,4 +105,6 @@ linefig.subplots_adjust(left=0.1, bottom=0.13, right=0.97, top=0.92,
                         wspace=0.1)
 # save
 fig.savefig('lineplot-postcamp.png')
+stamp('lineplot-postcamp.png')
 fig.savefig('lineplot-postcamp.pdf', dpi=400)
+stamp('lineplot-postcamp.pdf')
@@ -16,7 +16,7 @@ import pandas as pd
 import seaborn as sns
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params, yamload,
-                                         nice_ticklabels)
+                                         nice_ticklabels, stamp)
 
 # flags
 force_redraw_brain = False
@@ -78,6 +78,7 @@ if force_redraw_brain or not os.path.exists(img_path):
         brain.add_label(lab, alpha=0.75, color='#44BB99')
         brain.add_label(lab, alpha=1, color='#44BB99', borders=True)
     brain.save_image(img_path)
+    stamp(img_path)
 
 # add brain ROI to main figure
 brainax = brainfig.subplots()
@@ -145,4 +146,6 @@ cbar_ax.set_ylabel(ylab, labelpad=12)
 heatfig.subplots_adjust(left=0.1, right=0.85, bottom=0.15, top=0.95)
 
 fig.savefig('epoch-rejection-crossval.png')
+stamp('epoch-rejection-crossval.png')
 fig.savefig('epoch-rejection-crossval.pdf')
+stamp('epoch-rejection-crossval.pdf')
@@ -15,7 +15,7 @@ from matplotlib.image import imread
 import pandas as pd
 import seaborn as sns
 
-from sswef_helpers.aux_functions import load_paths, nice_ticklabels
+from sswef_helpers.aux_functions import load_paths, nice_ticklabels, stamp
 
 # config paths
 data_root, subjects_dir, results_dir = load_paths()
@@ -84,4 +84,6 @@ linefig.text(0.015, 0.98, 'B', **kwargs)
 linefig.subplots_adjust(bottom=0.15, top=0.9)
 
 fig.savefig('spatial-temporal-ROIs.png')
+stamp('spatial-temporal-ROIs.png')
 fig.savefig('spatial-temporal-ROIs.pdf', dpi=400)
+stamp('spatial-temporal-ROIs.pdf')
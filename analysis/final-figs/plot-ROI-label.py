@@ -9,7 +9,7 @@ Plot a cortical label for a figure.
 import os
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params,
-                                         load_fsaverage_src)
+                                         load_fsaverage_src, stamp)
 
 # config paths
 data_root, subjects_dir, results_dir = load_paths()
@@ -44,3 +44,4 @@ brain.add_label(label, alpha=0.75, color='#44BB99')  # EE7733 → orange
 brain.add_label(label, alpha=1, color='#44BB99', borders=True)
 brain.show_view(azimuth=30, elevation=210, roll=0)
 brain.save_image(img_path)
+stamp(img_path)
@@ -10,7 +10,7 @@ import os
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (
-    load_paths, load_params, div_by_adj_bins, set_brain_view_distance)
+    load_paths, load_params, div_by_adj_bins, set_brain_view_distance, stamp)
 
 # config paths
 _, _, results_dir = load_paths()
@@ -73,5 +73,6 @@ for condition in conditions:
             fname = (f'fig1-{cohort}-GrandAvg-pre_and_post_camp-pskt'
                      f'-{condition}-fft-{kind}-{freq:02}_Hz.png')
             brain.save_image(fname)
+            stamp(fname)
         brain.close()
         del brain
@@ -12,7 +12,7 @@ import mne
 from mne.stats import ttest_ind_no_p
 from sswef_helpers.aux_functions import (
     load_paths, load_params, load_cohorts, div_by_adj_bins,
-    set_brain_view_distance)
+    set_brain_view_distance, stamp)
 
 # config paths
 _, _, results_dir = load_paths()
@@ -80,6 +80,7 @@ for condition in conditions:
             fname = (f'fig2-{cohort}-{subgroup}-pre_camp-pskt'
                      f'-{condition}-fft-{kind}-{freq:02}_Hz.png')
             brain.save_image(fname)
+            stamp(fname)
             brain.close()
             del brain
 
@@ -114,5 +115,6 @@ for kind in ('fft', 'snr'):
     fname = (f'fig2-{cohort}-Lower_vs_Upper_ttest-pre_camp-pskt'
              f'-{condition}-fft-{kind}-{freq:02}_Hz.png')
     brain.save_image(fname)
+    stamp(fname)
     brain.close()
     del brain
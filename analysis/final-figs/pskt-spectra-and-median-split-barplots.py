@@ -10,6 +10,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
+from sswef_helpers.aux_functions import stamp
 
 # config label
 region = 'IOS_IOG_pOTS'
@@ -75,6 +76,7 @@ ax.xaxis.labelpad = -12
 fig.subplots_adjust(left=0.08, right=0.95, bottom=0.1, top=0.95, hspace=0.05)
 fig.align_labels()
 fig.savefig('fig3-pskt-grandavg-spectra-fft-snr.png')
+stamp('fig3-pskt-grandavg-spectra-fft-snr.png')
 plt.close(fig)
 
 
@@ -106,4 +108,5 @@ fig.subplots_adjust(left=0.08, right=0.95, bottom=0.1, top=0.9,
                     hspace=0.05, wspace=0.05)
 fig.align_labels()
 fig.savefig('fig4-pskt-pretest-barplots.png')
+stamp('fig4-pskt-pretest-barplots.png')
 plt.close(fig)
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Make a synthetic dataset that the pipeline can run on, for benchmarking and
+regression testing without the real data.
+
+Everything is written under one folder, laid out as ``load_paths()``
+expects (and as ``run_mnefun.py`` leaves it), with a ``params`` folder to
+match:
+
+- ``anat/``: spherical "brains" (``{lh,rh}.white``, ``.sphere``,
+  ``.sphere.reg``, ``.inflated``) for ``fsaverage`` and each subject, with
+  each subject's cortex dented differently and its ``sphere.reg`` slightly
+  rotated; fsaverage's icosahedral source space (always saved as
+  ``fsaverage-ico-5-src.fif``, whatever ``--ico`` is), and
+  ``HCPMMP1_combined`` & ``aparc.a2009s`` annotations with the labels the
+  scripts look up.
+- ``{pre,post}_camp/twa_hp/{erp,pskt}/<subject>/``:
+  ``sss_pca_fif/*_allclean_fil40_raw_sss.fif`` with the incoming trigger
+  codes on ``STI101``, ``lists/ALL_*-eve.lst`` scored as ``prek_score``
+  does, ERP ``epochs/``, and free, loose & fixed ``inverse/`` operators
+  (with ``--raw-inputs``, also the ``raw_fif/`` files).
+- ``params/``: copies of the repo's params, pointing at the above, listing
+  the synthetic subjects (half in each intervention & knowledge group).
+
+The MEG sensors are triplets (2 planar gradiometers & a magnetometer) on a
+helmet around a spherical head model. During PS/KT trials there is a 6 Hz
+(base) response in early visual cortex and a 2 Hz (oddball) one in early &
+ventral visual cortex; ERP trials evoke a P1 (early visual) and an N170
+(ventral; largest for faces & words). The oddball & word responses grow from
+pre- to post-camp in the LetterIntervention group. Noise is 1/f, low-passed
+at ``lp_cut``. To run the pipeline on it:
+
+    python make_synthetic_dataset.py /tmp/prek-synth --subjects 4
+    PREK_PARAMS=/tmp/prek-synth/params python run_pipeline.py \\
+        --until ssvep_clustering prek_do_contrasts --jobs 4
+
+For benchmarks at 1x, 4x & 16x cohort size, use e.g. ``--subjects 12``, 48
+& 192; ``--channels 306 --ico 5`` matches the real sensor & source counts.
+"""
+
+import os
+import shutil
+from contextlib import nullcontext
+import numpy as np
+import yaml
+import mne
+from mne.io.constants import FIFF
+from mne.surface import _get_ico_surface
+
+here = os.path.dirname(os.path.abspath(__file__))
+repo_params = os.path.join(here, '..', 'params')
+mnefun_params = os.path.join(here, 'preprocessing',
+                             'mnefun_common_params.yaml')
+
+# paradigm (see preprocessing/prek_score.py and the mnefun params)
+erp_codes = dict(words=1, faces=2, cars=3, aliens=4)  # incoming codes
+press_code = 16  # button presses are scored with mask=240
+pskt_codes = (60, 60, 60, 70, 70, 70)  # 3 PS trials then 3 KT trials
+pskt_trial_dur = 20  # seconds
+pskt_epoch_dur = 5  # trials are split into epochs this long
+timepoints = ('pre', 'post')
+constraints = dict(free=1., loose=0.2, fixed=0.)
+epoch_tmin, epoch_tmax = -0.1, 1.
+
+# simulated responses (in A·m, summed over a patch of cortex)
+base_freq, oddball_freq = 6., 2.
+base_amp, oddball_amp = 20e-9, 10e-9
+p1_amp = 15e-9
+n170_amp = dict(words=25e-9, faces=30e-9, cars=15e-9, aliens=20e-9)
+intervention_gain = 1.5  # post / pre, for the LetterIntervention group
+noise_std = dict(mag=40e-15, grad=8e-13)
+
+# brains: one sphere per hemisphere (MRI coordinates, mm)
+hemi_centers = dict(lh=(-38., -5., 45.), rh=(38., -5., 45.))
+brain_radius = 30.
+helmet_center, helmet_radius = (0., 0., 0.04), 0.12  # m
+# label name: direction (in each hemisphere's own frame, x = lateral)
+hcp_labels = {'Early Visual Cortex': (0, -1, 0),
+              'Ventral Stream Visual Cortex': (0, -0.6, -0.8),
+              'Dorsal Stream Visual Cortex': (0, -0.6, 0.8),
+              'MT+ Complex and Neighboring Visual Areas': (1, -0.5, 0),
+              'Auditory Association Cortex': (1, 0.2, -0.3),
+              'Somatosensory and Motor Cortex': (0.5, 0.2, 0.8),
+              'Dorsolateral Prefrontal Cortex': (0.5, 1, 0.3),
+              'Medial Temporal Cortex': (-1, 0, -0.5),
+              'Posterior Cingulate Cortex': (-1, -0.4, 0.3),
+              'Anterior Cingulate and Medial Prefrontal Cortex': (-1, 0.7, 0)}
+a2009s_labels = {  # all the labels used by define_labels(), and some others
+    'G_and_S_paracentral': (-0.8, 0, 0.6),
+    'G_and_S_cingul-Ant': (-1, 0.6, 0.2),
+    'G_and_S_cingul-Mid-Ant': (-1, 0.3, 0.3),
+    'G_and_S_cingul-Mid-Post': (-1, 0, 0.3),
+    'G_cingul-Post-dorsal': (-1, -0.3, 0.3),
+    'G_cingul-Post-ventral': (-1, -0.4, 0),
+    'G_front_sup': (-0.3, 0.6, 0.8),
+    'G_oc-temp_med-Parahip': (-0.8, -0.1, -0.6),
+    'G_precuneus': (-0.8, -0.5, 0.4),
+    'G_rectus': (-0.7, 0.8, -0.5),
+    'G_subcallosal': (-1, 0.5, -0.3),
+    'S_cingul-Marginalis': (-0.9, -0.2, 0.5),
+    'S_pericallosal': (-1, 0.1, 0.1),
+    'S_suborbital': (-0.8, 0.9, -0.1),
+    'S_subparietal': (-0.9, -0.5, 0.2),
+    'Unknown': (-1, 0, 0),
+    'G_and_S_occipital_inf': (0.3, -0.9, -0.4),
+    'G_oc-temp_lat-fusifor': (0.2, -0.3, -0.9),
+    'G_temporal_inf': (0.7, -0.1, -0.7),
+    'S_collat_transv_ant': (-0.2, 0, -1),
+    'S_collat_transv_post': (-0.2, -0.5, -0.9),
+    'S_occipital_ant': (0.6, -0.7, -0.3),
+    'S_oc-temp_lat': (0.4, -0.4, -0.8),
+    'S_oc-temp_med_and_Lingual': (-0.5, -0.6, -0.6),
+    'S_temporal_inf': (0.8, -0.3, -0.5),
+    'Pole_occipital': (0, -1, 0),
+    'G_occipital_middle': (0.6, -0.8, 0.2),
+    'G_temporal_middle': (1, 0, -0.3),
+    'G_pariet_inf-Supramar': (0.8, -0.2, 0.6),
+    'G_postcentral': (0.6, -0.1, 0.8),
+    'G_precentral': (0.6, 0.2, 0.8),
+    'G_front_middle': (0.6, 0.7, 0.4),
+    'Pole_temporal': (0.5, 0.7, -0.5)}
+# where the simulated responses are
+patches = dict(early=(0, -1, 0), ventral=(0, -0.5, -0.85))
+
+
+def _unlocked(info):
+    return info._unlock() if hasattr(info, '_unlock') else nullcontext()
+
+
+def _hemi_frame(direction, hemi):
+    """Convert a direction with x = lateral into x = right."""
+    direction = np.array(direction, float)
+    if hemi == 'lh':
+        direction[0] *= -1
+    return direction / np.linalg.norm(direction)
+
+
+def _random_rotation(max_deg, rng):
+    axis = rng.randn(3)
+    axis /= np.linalg.norm(axis)
+    angle = np.deg2rad(max_deg) * rng.rand()
+    cross = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]],
+                      [-axis[1], axis[0], 0]])
+    return (np.eye(3) + np.sin(angle) * cross +
+            (1 - np.cos(angle)) * cross @ cross)
+
+
+def make_anatomy(subjects_dir, subject, ico, rng):
+    """Write the FreeSurfer surfaces of a spherical brain."""
+    surf_dir = os.path.join(subjects_dir, subject, 'surf')
+    os.makedirs(surf_dir, exist_ok=True)
+    os.makedirs(os.path.join(subjects_dir, subject, 'bem'), exist_ok=True)
+    os.makedirs(os.path.join(subjects_dir, subject, 'label'), exist_ok=True)
+    surf = _get_ico_surface(ico + 1)
+    unit, tris = surf['rr'], surf['tris']
+    is_template = subject == 'fsaverage'
+    for hemi, center in hemi_centers.items():
+        # smooth dents, so that no two brains are the same shape
+        dents = np.sin(3 * unit @ rng.randn(3, 3)).mean(axis=1)
+        radius = brain_radius * (1 + (0 if is_template else 0.1) * dents)
+        white = np.array(center) + radius[:, np.newaxis] * unit
+        rotation = np.eye(3) if is_template else _random_rotation(10, rng)
+        for name, coords in dict(white=white, inflated=white,
+                                 sphere=100 * unit,
+                                 sphere_reg=100 * unit @ rotation).items():
+            fname = os.path.join(surf_dir, f'{hemi}.{name}'.replace('_', '.'))
+            mne.write_surface(fname, coords, tris, overwrite=True)
+
+
+def make_annotations(subjects_dir, src, rng):
+    """Write fsaverage parcellations (nearest-direction regions)."""
+    for parc, directions in (('HCPMMP1_combined', hcp_labels),
+                             ('aparc.a2009s', a2009s_labels)):
+        labels = list()
+        for hemi, s in zip(hemi_centers, src):
+            unit = s['rr'] * 1e3 - hemi_centers[hemi]
+            unit /= np.linalg.norm(unit, axis=1, keepdims=True)
+            dirs = np.array([_hemi_frame(d, hemi)
+                             for d in directions.values()])
+            nearest = np.argmax(unit @ dirs.T, axis=1)
+            for idx, name in enumerate(directions):
+                vertices = np.where(nearest == idx)[0]
+                labels.append(mne.Label(
+                    vertices, s['rr'][vertices], hemi=hemi,
+                    name=f'{name}-{hemi}', subject='fsaverage',
+                    color=tuple(rng.rand(3)) + (1.,)))
+        mne.write_labels_to_annot(labels, 'fsaverage', parc,
+                                  subjects_dir=subjects_dir, overwrite=True,
+                                  verbose=False)
+
+
+def make_info(n_channels, sfreq, lp_cut):
+    """MEG sensor triplets (2 planar gradiometers & a magnetometer)."""
+    n_locs = n_channels // 3
+    # evenly spread over the top of a sphere (a Fibonacci spiral)
+    z = np.linspace(1, -0.2, n_locs)
+    phi = np.pi * (3 - np.sqrt(5)) * np.arange(n_locs)
+    normals = np.array([np.sqrt(1 - z ** 2) * np.cos(phi),
+                        np.sqrt(1 - z ** 2) * np.sin(phi), z]).T
+    ch_names, ch_types, locs = list(), list(), list()
+    for idx, ez in enumerate(normals):
+        ex = np.cross([0, 0.01, 1], ez)
+        ex /= np.linalg.norm(ex)
+        ey = np.cross(ez, ex)
+        pos = np.array(helmet_center) + helmet_radius * ez
+        for suffix, ch_type, (dx, dy) in (('2', 'grad', (ex, ey)),
+                                          ('3', 'grad', (ey, -ex)),
+                                          ('1', 'mag', (ex, ey))):
+            ch_names.append(f'MEG{idx + 1:03}{suffix}')
+            ch_types.append(ch_type)
+            locs.append(np.concatenate([pos, dx, dy, ez]))
+    info = mne.create_info(ch_names + ['STI101'], sfreq,
+                           ch_types + ['stim'])
+    coil_types = dict(grad=FIFF.FIFFV_COIL_VV_PLANAR_T1,
+                      mag=FIFF.FIFFV_COIL_VV_MAG_T3)
+    for ch, ch_type, loc in zip(info['chs'], ch_types, locs):
+        ch['loc'][:12] = loc
+        ch['coil_type'] = coil_types[ch_type]
+    with _unlocked(info):
+        info['dev_head_t'] = mne.transforms.Transform('meg', 'head')
+        info['lowpass'] = float(lp_cut)
+    return info
+
+
+def make_forward(info, subject, subjects_dir, ico):
+    """Source space & forward solution (on a spherical head model)."""
+    src = mne.setup_source_space(subject, spacing=f'ico{ico}',
+                                 subjects_dir=subjects_dir, add_dist=False,
+                                 verbose=False)
+    sphere = mne.make_sphere_model(r0=helmet_center, head_radius=None,
+                                   verbose=False)
+    trans = mne.transforms.Transform('head', 'mri')
+    return mne.make_forward_solution(info, trans, src, sphere, meg=True,
+                                     eeg=False, mindist=0., verbose=False)
+
+
+def make_topographies(fwd):
+    """Sensor patterns of each simulated patch of activity (per A·m)."""
+    fixed = mne.convert_forward_solution(fwd, surf_ori=True,
+                                         force_fixed=True, use_cps=True,
+                                         verbose=False)
+    gain = fixed['sol']['data']
+    topos = dict()
+    for patch, direction in patches.items():
+        weights = list()
+        for hemi, s in zip(hemi_centers, fixed['src']):
+            unit = s['rr'][s['vertno']] * 1e3 - hemi_centers[hemi]
+            unit /= np.linalg.norm(unit, axis=1, keepdims=True)
+            # von Mises-like bump, ~25° wide
+            weights.append(np.exp((unit @ _hemi_frame(direction, hemi) - 1)
+                                  / 0.1))
+        weights = np.concatenate(weights)
+        topos[patch] = gain @ (weights / weights.sum())
+    return topos
+
+
+def make_noise(info, n_times, lp_cut, rng, block=64):
+    """1/f sensor noise, low-passed at ``lp_cut``."""
+    picks = mne.pick_types(info, meg=True)
+    freqs = np.fft.rfftfreq(n_times, 1. / info['sfreq'])
+    shape = 1. / np.sqrt(np.maximum(freqs, 0.5))
+    shape[0] = 0
+    shape *= 1. / (1 + (freqs / lp_cut) ** 16)  # ~ the FIR low-pass
+    noise = np.zeros((len(info['ch_names']), n_times))
+    for start in range(0, len(picks), block):
+        these = picks[start:start + block]
+        spec = rng.randn(len(these), freqs.size) * shape * np.exp(
+            2j * np.pi * rng.rand(len(these), freqs.size))
+        noise[these] = np.fft.irfft(spec, n=n_times)
+    noise[picks] /= noise[picks].std(axis=1, keepdims=True)
+    for ch_type, std in noise_std.items():
+        noise[mne.pick_types(info, meg=ch_type)] *= std
+    return noise
+
+
+def simulate_pskt(info, topos, duration, lp_cut, oddball_gain, rng):
+    """A PS/KT run; returns the raw data & its scored events."""
+    sfreq = info['sfreq']
+    n_times = int(duration * sfreq)
+    times = np.arange(n_times) / sfreq
+    data = make_noise(info, n_times, lp_cut, rng)
+    stim = data[info['ch_names'].index('STI101')]
+    gap = (duration - 4. - len(pskt_codes) * pskt_trial_dur) / len(pskt_codes)
+    if gap < 0.5:
+        min_duration = 4 + len(pskt_codes) * (pskt_trial_dur + 0.5)
+        raise ValueError(f'PS/KT runs must be at least {min_duration} s')
+    onsets = (2. + gap / 2 + np.arange(len(pskt_codes)) *
+              (pskt_trial_dur + gap) + rng.uniform(-gap, gap, 6) / 4)
+    events = list()
+    base, oddball = np.zeros(n_times), np.zeros(n_times)
+    for onset, code in zip(onsets, pskt_codes):
+        trial = (times >= onset) & (times < onset + pskt_trial_dur)
+        t = times[trial] - onset
+        base[trial] = base_amp * np.sin(2 * np.pi * base_freq * t)
+        oddball[trial] = (oddball_gain * oddball_amp *
+                          np.sin(2 * np.pi * oddball_freq * t))
+        sample = int(round(onset * sfreq))
+        stim[sample:sample + 10] = 1
+        for offset in range(0, pskt_trial_dur, pskt_epoch_dur):
+            events.append([sample + int(round(offset * sfreq)), 0, code])
+    picks = mne.pick_types(info, meg=True)
+    data[picks] += np.outer(topos['early'], base)
+    data[picks] += np.outer(topos['early'] + topos['ventral'], oddball) / 2
+    return data, np.array(events)
+
+
+def simulate_erp(info, topos, duration, word_gain, rng):
+    """An ERP run; returns the raw data & its scored events."""
+    from scipy.signal import fftconvolve
+    sfreq = info['sfreq']
+    n_times = int(duration * sfreq)
+    data = make_noise(info, n_times, info['lowpass'], rng)
+    stim = data[info['ch_names'].index('STI101')]
+    soas = rng.uniform(1.2, 1.6, int(duration / 1.2))
+    onsets = 2. + np.cumsum(soas)
+    onsets = onsets[onsets < duration - 2.]
+    conditions = np.resize(list(erp_codes), onsets.size)
+    rng.shuffle(conditions)
+    # impulse trains (with trial-to-trial variability), then the waveforms
+    kernel_times = np.arange(int(0.5 * sfreq)) / sfreq
+    p1 = np.exp(-0.5 * ((kernel_times - 0.1) / 0.02) ** 2)
+    n170 = -np.exp(-0.5 * ((kernel_times - 0.17) / 0.03) ** 2)
+    p1_train, n170_train = np.zeros(n_times), np.zeros(n_times)
+    events = list()
+    for onset, condition in zip(onsets, conditions):
+        sample = int(round(onset * sfreq))
+        code = erp_codes[condition]
+        stim[sample:sample + 10] = code
+        events.append([sample, 0, 10 * code])
+        gain = word_gain if condition == 'words' else 1.
+        p1_train[sample] = p1_amp * (1 + 0.2 * rng.randn())
+        n170_train[sample] = (gain * n170_amp[condition] *
+                              (1 + 0.2 * rng.randn()))
+        if condition == 'aliens':  # target; the child presses the button
+            sample += int(0.5 * sfreq)
+            stim[sample:sample + 10] = press_code
+            events.append([sample, 0, 50])
+    picks = mne.pick_types(info, meg=True)
+    data[picks] += np.outer(topos['early'],
+                            fftconvolve(p1_train, p1)[:n_times])
+    data[picks] += np.outer(topos['ventral'],
+                            fftconvolve(n170_train, n170)[:n_times])
+    return data, np.array(events)
+
+
+def make_raw(data, info, events, rng):
+    """Raw object (& events in its samples) with some blink annotations."""
+    first_samp = rng.randint(10000, 60000)
+    raw = mne.io.RawArray(data, info, first_samp=first_samp, verbose=False)
+    n_blinks = int(raw.times[-1] / 30)
+    onsets = np.sort(rng.uniform(0, raw.times[-1] - 1, n_blinks))
+    raw.set_annotations(mne.Annotations(onsets, 0.5, 'BAD_EOG_MANUAL'))
+    events = events.copy()
+    events[:, 0] += first_samp
+    return raw, events
+
+
+def _remove(fname):
+    """Make way for writers that won't overwrite on newer MNE versions."""
+    if os.path.exists(fname):
+        os.remove(fname)
+    return fname
+
+
+def write_run(raw, events, subj_dir, run_name, raw_inputs=False):
+    """Save a run as ``run_mnefun.py`` leaves it (and its input)."""
+    for folder in ('sss_pca_fif', 'lists') + (('raw_fif',) * raw_inputs):
+        os.makedirs(os.path.join(subj_dir, folder), exist_ok=True)
+    lp_cut = int(raw.info['lowpass'])
+    raw.save(os.path.join(subj_dir, 'sss_pca_fif',
+                          f'{run_name}_allclean_fil{lp_cut}_raw_sss.fif'),
+             overwrite=True, verbose=False)
+    mne.write_events(_remove(os.path.join(subj_dir, 'lists',
+                                          f'ALL_{run_name}-eve.lst')), events)
+    if raw_inputs:
+        raw.save(os.path.join(subj_dir, 'raw_fif', f'{run_name}_raw.fif'),
+                 overwrite=True, verbose=False)
+
+
+def write_params(out_dir, subjects, rng):
+    """Copy the repo's params, pointing them at the synthetic dataset."""
+    param_dir = os.path.join(out_dir, 'params')
+    os.makedirs(param_dir, exist_ok=True)
+    for fname in os.listdir(repo_params):
+        if fname.endswith('.yaml'):
+            shutil.copy(os.path.join(repo_params, fname), param_dir)
+    nums = [int(s.split('_')[1]) for s in subjects]
+    rng.shuffle(nums)
+    half = len(nums) // 2
+    groups = dict(
+        intervention_cohorts=dict(LanguageIntervention=sorted(nums[:half]),
+                                  LetterIntervention=sorted(nums[half:])),
+        letter_knowledge_cohorts=dict(
+            LowerKnowledge=sorted(nums[::2]),
+            UpperKnowledge=sorted(nums[1::2])))
+    with open(os.path.join(param_dir, 'brain_plot_params.yaml'), 'r') as f:
+        brain_plot_params = yaml.safe_load(f)
+    brain_plot_params['subjects_dir'] = os.path.join(out_dir, 'anat')
+    contents = dict(
+        paths=dict(data_root=out_dir,
+                   subjects_dir=os.path.join(out_dir, 'anat'),
+                   results_dir=os.path.join(out_dir, 'results')),
+        current_cohort='original', subjects=dict(original=subjects),
+        skip_subjects_erp=[], skip_subjects_pskt=[],
+        brain_plot_params=brain_plot_params,
+        **{name: dict(original=value) for name, value in groups.items()})
+    for name, content in contents.items():
+        with open(os.path.join(param_dir, f'{name}.yaml'), 'w') as f:
+            yaml.safe_dump(content, f, default_flow_style=False)
+    return groups['intervention_cohorts']['LetterIntervention']
+
+
+def make_dataset(out_dir, n_subjects=4, n_channels=60, ico=4, duration=130.,
+                 sfreq=1000., raw_inputs=False, seed=0):
+    """Write the whole synthetic dataset to ``out_dir``."""
+    rng = np.random.RandomState(seed)
+    out_dir = os.path.abspath(out_dir)
+    subjects_dir = os.path.join(out_dir, 'anat')
+    with open(mnefun_params, 'r') as f:
+        lp_cut = yaml.safe_load(f)['preprocessing']['filtering']['lp_cut']
+    subjects = [f'prek_{9001 + idx}' for idx in range(n_subjects)]
+    letter_group = write_params(out_dir, subjects, rng)
+    # template brain
+    make_anatomy(subjects_dir, 'fsaverage', ico, rng)
+    src = mne.setup_source_space('fsaverage', spacing=f'ico{ico}',
+                                 subjects_dir=subjects_dir, add_dist=False,
+                                 verbose=False)
+    src.save(os.path.join(subjects_dir, 'fsaverage', 'bem',
+                          'fsaverage-ico-5-src.fif'), overwrite=True,
+             verbose=False)
+    make_annotations(subjects_dir, src, rng)
+    info = make_info(n_channels, sfreq, lp_cut)
+    noise_cov = mne.make_ad_hoc_cov(info, std=noise_std, verbose=False)
+    for subject in subjects:
+        print(f'simulating {subject}')
+        make_anatomy(subjects_dir, subject.upper(), ico, rng)
+        fwd = make_forward(info, subject.upper(), subjects_dir, ico)
+        topos = make_topographies(fwd)
+        inverses = {
+            constr: mne.minimum_norm.make_inverse_operator(
+                info, fwd, noise_cov, loose=loose, fixed=(constr == 'fixed'),
+                verbose=False)
+            for constr, loose in constraints.items()}
+        in_letter_group = int(subject.split('_')[1]) in letter_group
+        subj_gain = 1 + 0.2 * rng.randn()
+        for timepoint in timepoints:
+            gain = subj_gain * (intervention_gain if in_letter_group and
+                                timepoint == 'post' else 1.)
+            for experiment in ('erp', 'pskt'):
+                subj_dir = os.path.join(out_dir, f'{timepoint}_camp',
+                                        'twa_hp', experiment, subject)
+                if experiment == 'erp':
+                    data, events = simulate_erp(info, topos, 2 * duration,
+                                                gain, rng)
+                    raw, events = make_raw(data, info, events, rng)
+                    write_run(raw, events, subj_dir,
+                              f'{subject}_erp_{timepoint}', raw_inputs)
+                    event_id = {name: 10 * code
+                                for name, code in erp_codes.items()}
+                    # (without the button presses, like mnefun's epochs)
+                    trials = np.isin(events[:, 2], list(event_id.values()))
+                    epochs = mne.Epochs(
+                        raw, events[trials], event_id, epoch_tmin, epoch_tmax,
+                        reject_by_annotation=False, preload=True,
+                        verbose=False)
+                    os.makedirs(os.path.join(subj_dir, 'epochs'),
+                                exist_ok=True)
+                    fname = f'All_{lp_cut}-sss_{subject}-epo.fif'
+                    epochs.save(os.path.join(subj_dir, 'epochs', fname),
+                                overwrite=True, verbose=False)
+                else:
+                    for run in (1, 2):
+                        data, events = simulate_pskt(info, topos, duration,
+                                                     lp_cut, gain, rng)
+                        raw, events = make_raw(data, info, events, rng)
+                        write_run(raw, events, subj_dir,
+                                  f'{subject}_pskt_{run:02}_{timepoint}',
+                                  raw_inputs)
+                inv_dir = os.path.join(subj_dir, 'inverse')
+                os.makedirs(inv_dir, exist_ok=True)
+                for constr, inv in inverses.items():
+                    suffix = '' if constr == 'loose' else f'-{constr}'
+                    fname = f'{subject}-{lp_cut}-sss-meg{suffix}-inv.fif'
+                    mne.minimum_norm.write_inverse_operator(
+                        _remove(os.path.join(inv_dir, fname)), inv,
+                        verbose=False)
+    return subjects
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Make a synthetic dataset for the pipeline.')
+    parser.add_argument('out_dir', help='folder to write the dataset to')
+    parser.add_argument('--subjects', type=int, default=4,
+                        help='number of subjects')
+    parser.add_argument('--channels', type=int, default=60,
+                        help='number of MEG channels (306 is real size)')
+    parser.add_argument('--ico', type=int, default=4,
+                        help='icosahedron grade of the source spaces '
+                        '(5 is real size: 10242 vertices per hemisphere)')
+    parser.add_argument('--duration', type=float, default=130.,
+                        help='length of each PS/KT run in seconds (the ERP '
+                        'runs are twice as long)')
+    parser.add_argument('--sfreq', type=float, default=1000.)
+    parser.add_argument('--raw-inputs', action='store_true',
+                        help="also write run_mnefun.py's raw_fif inputs")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    subjects = make_dataset(args.out_dir, args.subjects, args.channels,
+                            args.ico, args.duration, args.sfreq,
+                            args.raw_inputs, args.seed)
+    param_dir = os.path.join(os.path.abspath(args.out_dir), 'params')
+    print(f'{len(subjects)} subjects written to {args.out_dir}; set '
+          f'PREK_PARAMS={param_dir} to use them')
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark FFT filtering & resampling of a raw file on each available backend:
+
+- ``cuda`` (only if CUDA can be initialized here);
+- ``cpu-1``: one CPU, which is what ``n_jobs='cuda'`` falls back to on a
+  machine without a GPU;
+- ``cpu-threads``: ``fft_n_jobs()`` threads (``fft_threads``), which is what
+  the scripts now use when there is no GPU;
+- ``cpu-processes``: the same number of joblib worker processes.
+
+Each backend low-passes the data (as mnefun does) and resamples it (as
+``ssvep_make_epochs.py`` does); wall times and the largest difference from
+``cpu-1`` are printed. Run with
+
+    python bench_fft_backends.py prek_1103_pskt_01_pre_raw.fif --n-jobs 8
+
+or without a file to use 3 minutes of simulated 306-channel data.
+"""
+
+import time
+from contextlib import nullcontext
+import numpy as np
+import mne
+from sswef_helpers.aux_functions import fft_n_jobs, fft_threads
+
+
+def simulate_raw(duration=180., sfreq=1000., seed=0):
+    """Noise on a Neuromag-like channel set (306 MEG + stim)."""
+    rng = np.random.RandomState(seed)
+    ch_types = ['grad', 'grad', 'mag'] * 102 + ['stim']
+    ch_names = [f'MEG{ix:04}' for ix in range(306)] + ['STI101']
+    info = mne.create_info(ch_names, sfreq, ch_types)
+    data = 1e-12 * rng.randn(len(ch_names), int(duration * sfreq))
+    data[-1] = 0
+    return mne.io.RawArray(data, info, verbose=False)
+
+
+def run_backend(raw, n_jobs, l_freq, h_freq, sfreq, backend):
+    """Filter then resample a copy of ``raw``; return data and timings."""
+    raw = raw.copy()
+    times = dict()
+    with fft_threads(n_jobs) if backend == 'threads' else nullcontext():
+        start = time.perf_counter()
+        raw.filter(l_freq, h_freq, n_jobs=n_jobs, verbose=False)
+        times['filter'] = time.perf_counter() - start
+        start = time.perf_counter()
+        raw.resample(sfreq, n_jobs=n_jobs, verbose=False)
+        times['resample'] = time.perf_counter() - start
+    return raw.get_data(), times
+
+
+def benchmark(raw, n_jobs=None, l_freq=None, h_freq=40., sfreq=84.):
+    """Time each backend; differences are relative to the cpu-1 output."""
+    n_threads = fft_n_jobs(n_jobs, cuda=False)
+    backends = dict()
+    if fft_n_jobs(n_jobs) == 'cuda':
+        backends['cuda'] = ('cuda', None)
+    backends.update({'cpu-1': (1, None),
+                     'cpu-threads': (n_threads, 'threads'),
+                     'cpu-processes': (n_threads, None)})
+    results = dict()
+    reference = None
+    for name, (this_n_jobs, backend) in backends.items():
+        data, times = run_backend(raw, this_n_jobs, l_freq, h_freq, sfreq,
+                                  backend)
+        if name == 'cpu-1':
+            reference = data
+        results[name] = dict(n_jobs=this_n_jobs, data=data, **times)
+    for result in results.values():
+        data = result.pop('data')
+        result['max_diff'] = (np.abs(data - reference).max() /
+                              np.abs(reference).max())
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Benchmark FFT filtering & resampling backends.')
+    parser.add_argument('raw', nargs='?', default=None,
+                        help='raw FIF file (default: simulated data)')
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help='CPU threads/processes (default: all CPUs)')
+    parser.add_argument('--h-freq', type=float, default=40.)
+    parser.add_argument('--sfreq', type=float, default=84.)
+    args = parser.parse_args()
+    if args.raw is None:
+        raw = simulate_raw()
+    else:
+        raw = mne.io.read_raw_fif(args.raw, allow_maxshield=True,
+                                  preload=True, verbose=False)
+    print(f'{len(raw.ch_names)} channels, {raw.times[-1]:.0f} s at '
+          f'{raw.info["sfreq"]:.0f} Hz')
+    results = benchmark(raw, args.n_jobs, h_freq=args.h_freq,
+                        sfreq=args.sfreq)
+    for name, res in results.items():
+        print(f'{name:>13} (n_jobs={res["n_jobs"]}): filter '
+              f'{res["filter"]:6.2f} s, resample {res["resample"]:6.2f} s, '
+              f'max rel. diff {res["max_diff"]:.1e}')
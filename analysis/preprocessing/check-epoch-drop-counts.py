@@ -19,7 +19,8 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 import mne
-from sswef_helpers.aux_functions import load_paths, load_params, yamload
+from sswef_helpers.aux_functions import (load_paths, load_params, yamload,
+                                         stamp)
 
 # load general params
 data_root, subjects_dir, _ = load_paths()
@@ -98,6 +99,10 @@ peak_to_peak_df.to_csv('unthresholded-epoch-peak-to-peak-amplitudes.csv',
                        index=False)
 trial_count_df.to_csv('trial-counts-after-thresholding.csv', index=False)
 merged_df.to_csv('trial-counts-and-r-values.csv', index=False)
+for fname in ('unthresholded-epoch-peak-to-peak-amplitudes.csv',
+              'trial-counts-after-thresholding.csv',
+              'trial-counts-and-r-values.csv'):
+    stamp(fname, reject=thresholds)
 
 # plot histogram of peak-to-peak epoch amplitudes
 g = sns.FacetGrid(peak_to_peak_df, row='ch_type', sharex=False)
@@ -105,6 +110,7 @@ g.map(sns.histplot, 'ptp_ampl', stat='count')
 for ch_type, ax in g.axes_dict.items():
     ax.axvline(x=thresholds[ch_type], color='C1', ls='--')
 g.fig.savefig('peak-to-peak-hists-and-rejection-thresholds.png')
+stamp('peak-to-peak-hists-and-rejection-thresholds.png', reject=thresholds)
 
 # scatterplot r-values in left and right hemispheres
 fig, ax = plt.subplots()
@@ -112,6 +118,7 @@ sns.scatterplot(x='rval_lh', y='rval_rh', hue='cond', style='cond',
                 data=merged_df, legend=False, ax=ax)
 ax.grid(True)
 fig.savefig('rval-scatterplot.png')
+stamp('rval-scatterplot.png', inputs=(fpath,))
 
 # dotplot of r-values for each subj
 g = sns.PairGrid(data=merged_df.sort_values(['rval_lh', 'rval_rh']),
@@ -127,6 +134,7 @@ g.set(xlim=(-1, 1), ylabel="")
 g.fig.subplots_adjust(left=0.2, wspace=0.4)
 sns.despine(left=True, bottom=True)
 g.fig.savefig('rval-dotplot.png')
+stamp('rval-dotplot.png', inputs=(fpath,))
 
 # distribution of r-values across subjects
 melted = merged_df.melt(id_vars=['subj'],
@@ -137,5 +145,6 @@ fig, ax = plt.subplots()
 sns.histplot(rval_distr, x='rval', bins=int(round(len(subjects) // 3)), ax=ax)
 ax.set_title('distribution of mean R-values across subjects')
 ax.figure.savefig('rval-distribution.png')
+stamp('rval-distribution.png', inputs=(fpath,))
 
 # print(trial_count_df.query('cars<15 or words<15 or faces<15'))
@@ -12,7 +12,8 @@ import pandas as pd
 import mne
 from mne.minimum_norm import apply_inverse, read_inverse_operator
 from sswef_helpers.aux_functions import (
-    load_paths, load_params, yamload, load_inverse_params, PREPROCESS_JOINTLY)
+    load_paths, load_params, yamload, load_inverse_params, stamp,
+    PREPROCESS_JOINTLY)
 
 from joblib import Parallel, delayed
 
@@ -113,12 +114,18 @@ def get_rval(mag, grad):
                                         rval=[rval]))
                 rval_df = pd.concat([rval_df, row], ignore_index=True)
     # save the dataframe for later inspection
-    fname = (f'pre-post-correlations-mag{int(mag * 1e15)}fT'
-             f'-grad{int(grad * 1e13)}fTcm.csv')
-    rval_df.to_csv(os.path.join(csvdir, fname))
+    fpath = rval_fpath(mag, grad)
+    rval_df.to_csv(fpath)
+    # (in a joblib worker, so the parameter files read above aren't seen)
+    stamp(fpath, lp_cut=lp_cut, reject=dict(mag=mag, grad=grad))
     return rval_df['rval'].mean()
 
 
+def rval_fpath(mag, grad):
+    return os.path.join(csvdir, f'pre-post-correlations-mag{int(mag * 1e15)}'
+                        f'fT-grad{int(grad * 1e13)}fTcm.csv')
+
+
 # grid search setup
 mags = np.linspace(3, 10, 15) * 1e-12  # 3k-10k fT, in 500 fT steps
 grads = np.linspace(1, 4, 13) * 1e-10  # 1k-4k fT/cm, in 250 fT/cm steps
@@ -132,4 +139,7 @@ rvals = Parallel(n_jobs=6)(
 
 result_df = pd.DataFrame(dict(mag=mags_, grad=grads_, rval=rvals))
 result_df.to_csv('crossval-results.csv', index=False)
+stamp('crossval-results.csv',
+      inputs=[rval_fpath(mag, grad) for mag, grad, rval in
+              zip(mags_, grads_, rvals) if rval != -1])
 print(result_df.iloc[result_df['rval'].argmax()])
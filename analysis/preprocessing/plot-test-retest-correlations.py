@@ -15,7 +15,8 @@ import seaborn as sns
 import mne
 from mne.minimum_norm import apply_inverse, read_inverse_operator
 from sswef_helpers.aux_functions import (
-    load_paths, load_params, yamload, load_inverse_params, PREPROCESS_JOINTLY)
+    load_paths, load_params, yamload, load_inverse_params, stamp,
+    PREPROCESS_JOINTLY)
 
 # load params
 *_, subjects, cohort = load_params(experiment='erp')
@@ -168,3 +169,4 @@ axs[0, -1].legend(handles=legend_lines, ncol=2, loc='lower right',
 fig.suptitle('test-retest (pre-vs-post) in early visual cortex',
              x=0.05, y=0.998, ha='left', size='x-large')
 fig.savefig('test-retest-label-timecourses.png')
+stamp('test-retest-label-timecourses.png')
@@ -6,6 +6,8 @@ import numpy as np
 import mne
 from mnefun._paths import (get_raw_fnames, get_event_fnames)
 import expyfun
+from sswef_helpers.aux_functions import (
+    read_stim_steps, find_events_from_steps, split_events)
 
 # INCOMING EVENT CODES
 # ====================
@@ -19,7 +21,6 @@ import expyfun
 pskt_orig_dur = 20
 pskt_new_dur = 5
 assert pskt_orig_dur % pskt_new_dur == 0
-offsets = np.arange(1, pskt_orig_dur // pskt_new_dur)
 
 
 def prek_score(p, subjects):
@@ -28,31 +29,30 @@ def prek_score(p, subjects):
                                 add_splits=False, run_indices=None)
         event_fnames = get_event_fnames(p, subject, run_indices=None)
         for fname, event_fname in zip(fnames, event_fnames):
-            raw = mne.io.read_raw_fif(fname, allow_maxshield=True)
-            sfreq = raw.info['sfreq']
+            # stim channel transitions, decoded once and cached on disk; each
+            # masked set of events below is just a filter over them
+            steps = read_stim_steps(fname)
+            sfreq = steps['sfreq']
 
             # original trials 20 s; add events to later split into 5 s epochs
             if 'pskt' in fname:
-                events = mne.find_events(raw, shortest_event=1, mask=1)
+                events = find_events_from_steps(steps, shortest_event=1,
+                                                mask=1)
                 assert events.shape[0] == 6
                 events[:3, 2] = 60  # see "incoming event codes" note above
                 events[3:, 2] = 70  # see "incoming event codes" note above
-                new_events = list()
-                for row in events:
-                    new_events.append(row)
-                    if row[2] in (60, 70):
-                        _offsets = np.rint(offsets * pskt_new_dur * sfreq)
-                        for _offset in _offsets:
-                            new_row = row + np.array([_offset, 0, 0])
-                            new_events.append(new_row)
-                events = np.array(new_events)
+                events = split_events(events, sfreq, pskt_orig_dur,
+                                      pskt_new_dur, event_ids=(60, 70))
             else:
                 # split events for behavioral scoring
-                presses = mne.find_events(raw, shortest_event=1, mask=240)
-                alien = mne.find_events(raw, shortest_event=1, mask=4)
+                presses = find_events_from_steps(steps, shortest_event=1,
+                                                 mask=240)
+                alien = find_events_from_steps(steps, shortest_event=1,
+                                               mask=4)
                 # a mask of 3 will include events 1 & 2 also, and masks of 1 or
                 # 2 will each include event 3 also, so we need to segregate
-                wordsfacescars = mne.find_events(raw, shortest_event=1, mask=3)
+                wordsfacescars = find_events_from_steps(
+                    steps, shortest_event=1, mask=3)
                 words = wordsfacescars[wordsfacescars[:, 2] == 1]
                 faces = wordsfacescars[wordsfacescars[:, 2] == 2]
                 cars = wordsfacescars[wordsfacescars[:, 2] == 3]
@@ -77,7 +77,7 @@ def prek_score(p, subjects):
             misses = []
             correct_rejections = 0
             images = np.concatenate((words, cars, faces))
-            all_events = mne.find_events(raw, shortest_event=1)
+            all_events = find_events_from_steps(steps, shortest_event=1)
 
             for event in all_events:
                 if event[0] in presses:
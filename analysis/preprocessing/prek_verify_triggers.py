@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Check the triggers in the raw MEG files against the presentation logs (the
+expyfun data files written by the r21 scripts), and write corrected event
+files.
+
+For each run, the triggers the presentation script meant to stamp (image
+onsets for the ERP runs, block starts for the PS/KT runs) are read from the
+log and matched to the raw events in one vectorized pass: a clock offset is
+found by trying every pairing of early log triggers with raw events, then
+refined with a linear fit (offset + drift) of MEG time against log time.
+Reported per run:
+
+- how many intended triggers were found, missing, or extra in the raw;
+- clock drift, and residual jitter of the raw triggers around the fit;
+- latency from stamping each trigger to the next screen flip (from the log).
+
+Corrected events use the raw sample of each matched trigger, the fitted
+sample of any missing one, and the event code from the log rather than the
+bits seen on the stim channel. They have the same codes (and PS/KT sub-events)
+as ``prek_score``. A run where some log could not be aligned (no triggers in
+the log or the raw, or too few of them matching under any clock offset) is
+reported as unaligned, and gets no corrected events. Run a batch of files with
+
+    python prek_verify_triggers.py manifest.txt --n-jobs 8
+
+where each line of the manifest is a raw file followed by its log file(s), in
+presentation order (PS then KT for the pskt runs). The exit status is 1 if
+any run could not be aligned.
+"""
+
+import os
+import sys
+import numpy as np
+import mne
+from sswef_helpers.aux_functions import (
+    read_stim_steps, find_events_from_steps, split_events)
+from prek_score import pskt_orig_dur, pskt_new_dur
+
+TRIGGER_MASK = 15   # int4 triggers stamped by the presentation scripts
+PRESS_MASK = 240    # button presses
+PRESS_CODE = 50
+PSKT_CODES = (60, 70)  # PS blocks, then KT blocks (see prek_score.py)
+
+
+def read_presentation_log(fname):
+    """Read an expyfun data file.
+
+    Returns
+    -------
+    times : array of float
+        Timestamp of each line (s, presentation clock).
+    kinds : array of str
+        Event type of each line ('flip', 'imtype', 'Start', ...).
+    values : array of str
+        Value of each line.
+    """
+    times, kinds, values = list(), list(), list()
+    with open(fname) as fid:
+        for line in fid:
+            parts = line.rstrip('\n').split('\t')
+            if line.startswith('#') or len(parts) < 2:
+                continue
+            try:
+                times.append(float(parts[0]))
+            except ValueError:  # column header
+                continue
+            kinds.append(parts[1])
+            values.append(parts[2] if len(parts) > 2 else '')
+    return np.array(times), np.array(kinds), np.array(values)
+
+
+def intended_triggers(fname):
+    """Get the triggers a presentation script stamped, from its log.
+
+    The event-related script logs 'imnumber'/'imtype' just before stamping
+    the image category; the blocked SSVEP scripts log 'Start' just before
+    stamping a 1.
+
+    Returns
+    -------
+    stamps : array of float
+        Time each trigger was stamped (s, presentation clock).
+    onsets : array of float
+        Time of the flip that followed each trigger (NaN if none).
+    values : array of int
+        The trigger values.
+    """
+    times, kinds, values = read_presentation_log(fname)
+    if (kinds == 'imnumber').any():
+        mask = kinds == 'imtype'
+        trig_values = values[mask].astype(int)
+    else:
+        mask = kinds == 'Start'
+        trig_values = np.ones(mask.sum(), int)
+    stamps = times[mask]
+    flips = np.append(times[kinds == 'flip'], np.nan)
+    onsets = flips[np.searchsorted(flips[:-1], stamps)]
+    return stamps, onsets, trig_values
+
+
+def _nearest(sorted_times, targets):
+    """Index of the nearest element of ``sorted_times`` to each target."""
+    if len(sorted_times) < 2:
+        return np.zeros(np.shape(targets), int)
+    idx = np.searchsorted(sorted_times, targets)
+    idx = idx.clip(1, len(sorted_times) - 1)
+    left = sorted_times[idx - 1]
+    right = sorted_times[idx]
+    return np.where(targets - left < right - targets, idx - 1, idx)
+
+
+def align_triggers(log_times, log_values, raw_times, raw_values, tol=0.05,
+                   n_anchors=5, min_matches=3):
+    """Match intended triggers to raw events.
+
+    Parameters
+    ----------
+    log_times : array of float
+        Trigger times from the presentation log (s).
+    log_values : array of int
+        Trigger values from the presentation log.
+    raw_times : array of float
+        Sorted raw event times (s).
+    raw_values : array of int
+        Raw event values (masked to the trigger bits).
+    tol : float
+        Largest distance (s) between a fitted log time and a raw event for
+        the two to match.
+    n_anchors : int
+        How many of the first log triggers to try anchoring on.
+    min_matches : int
+        Fewest triggers that must match (or all of them, if the log has
+        fewer) for the log to count as aligned.
+
+    Returns
+    -------
+    alignment : dict
+        ``aligned`` (whether a clock offset was found), ``raw_idx`` (matched
+        raw event per log trigger, -1 if missing), ``fit`` (raw time =
+        fit[0] * log time + fit[1]; None if not aligned), ``residual`` (s,
+        NaN where missing) and ``extra`` (indices of unmatched raw events
+        within the span of the log).
+    """
+    log_times = np.asarray(log_times, float)
+    log_values = np.asarray(log_values)
+    unaligned = dict(aligned=False, raw_idx=np.full(len(log_times), -1),
+                     fit=None, residual=np.full(len(log_times), np.nan),
+                     extra=np.array([], int))
+    if not len(log_times) or not len(raw_times):
+        return unaligned
+    # every pairing of an early log trigger with a raw event gives a
+    # candidate clock offset; keep the one that matches the most triggers
+    cands = (raw_times[:, np.newaxis] -
+             log_times[np.newaxis, :n_anchors]).ravel()
+    mapped = log_times[np.newaxis] + cands[:, np.newaxis]
+    near = _nearest(raw_times, mapped)
+    ok = ((np.abs(raw_times[near] - mapped) < tol) &
+          (raw_values[near] == log_values))
+    best = np.argmax(ok.sum(axis=1))
+    matched = ok[best]
+    if matched.sum() < min(min_matches, len(log_times)):
+        return unaligned
+    fit = np.array([1., cands[best]])
+    # refine with a linear fit (allows for drift between the clocks)
+    if matched.sum() > 2:
+        fit = np.polyfit(log_times[matched], raw_times[near[best][matched]],
+                         1)
+    mapped = np.polyval(fit, log_times)
+    near = _nearest(raw_times, mapped)
+    matched = ((np.abs(raw_times[near] - mapped) < tol) &
+               (raw_values[near] == log_values))
+    raw_idx = np.where(matched, near, -1)
+    residual = np.where(matched, raw_times[near] - mapped, np.nan)
+    span = ((raw_times >= mapped[0] - tol) & (raw_times <= mapped[-1] + tol))
+    extra = np.setdiff1d(np.where(span)[0], raw_idx[matched])
+    return dict(aligned=True, raw_idx=raw_idx, fit=fit, residual=residual,
+                extra=extra)
+
+
+def verify_run(raw_fname, log_fnames, tol=0.05):
+    """Verify the triggers of one raw file against its presentation log(s).
+
+    Parameters
+    ----------
+    raw_fname : str
+        Raw FIF file.
+    log_fnames : list of str
+        expyfun data files for the runs in ``raw_fname``, in order.
+    tol : float
+        Matching tolerance (s).
+
+    Returns
+    -------
+    events : array, shape (n_events, 3) | None
+        Corrected events (codes as in ``prek_score``); None if any log could
+        not be aligned.
+    report : dict
+        Counts, clock drift (ppm), residuals, stamp-to-flip latencies, and
+        the logs that could not be aligned (``unaligned``).
+    """
+    steps = read_stim_steps(raw_fname)  # shared with prek_score
+    sfreq = steps['sfreq']
+    triggers = find_events_from_steps(steps, shortest_event=1,
+                                      mask=TRIGGER_MASK)
+    raw_times = triggers[:, 0] / sfreq
+    pskt = 'pskt' in os.path.basename(raw_fname)
+    events = list()
+    report = dict(raw=raw_fname, n_intended=0, n_missing=0, n_extra=0,
+                  drift_ppm=list(), residual=list(), latency=list(),
+                  unaligned=list())
+    first = 0  # each log is aligned to the raw events after the previous
+    for ix, log_fname in enumerate(log_fnames):
+        stamps, onsets, values = intended_triggers(log_fname)
+        align = align_triggers(stamps, values, raw_times[first:],
+                               triggers[first:, 2], tol=tol)
+        report['n_intended'] += len(values)
+        report['latency'].extend(onsets - stamps)
+        if not align['aligned']:
+            report['n_missing'] += len(values)
+            report['unaligned'].append(log_fname)
+            continue
+        matched = align['raw_idx'] >= 0
+        align['raw_idx'][matched] += first
+        samples = np.where(matched, triggers[align['raw_idx'], 0],
+                           np.rint(np.polyval(align['fit'], stamps) * sfreq))
+        first = np.searchsorted(triggers[:, 0], samples.max(), 'right')
+        codes = (np.full(len(values), PSKT_CODES[ix]) if pskt
+                 else values * 10)
+        events.append(np.c_[samples, np.zeros_like(samples), codes])
+        report['n_missing'] += int((~matched).sum())
+        report['n_extra'] += len(align['extra'])
+        report['drift_ppm'].append(1e6 * (align['fit'][0] - 1))
+        report['residual'].extend(align['residual'][matched])
+    for key in ('residual', 'latency'):
+        report[key] = np.array(report[key])
+    if report['unaligned']:
+        return None, report
+    events = np.concatenate(events).astype(int)
+    if pskt:
+        # split the 20 s blocks into 5 s epochs, as prek_score does
+        events = split_events(events, sfreq, pskt_orig_dur, pskt_new_dur)
+    else:
+        presses = find_events_from_steps(steps, shortest_event=1,
+                                         mask=PRESS_MASK)
+        presses[:, 2] = PRESS_CODE
+        events = np.concatenate((events, presses))
+    events = events[np.argsort(events[:, 0], kind='stable')]
+    return events, report
+
+
+def _summarize(report):
+    res = 1e3 * np.abs(report['residual'])
+    lat = 1e3 * report['latency'][~np.isnan(report['latency'])]
+    lines = [report['raw'],
+             f"  {report['n_intended']} intended triggers, "
+             f"{report['n_missing']} missing, {report['n_extra']} extra"]
+    if report['drift_ppm']:
+        lines.append('  clock drift: ' + ', '.join(
+            f'{d:.1f} ppm' for d in report['drift_ppm']))
+    lines.extend(f'  not aligned (no corrected events): {log_fname}'
+                 for log_fname in report['unaligned'])
+    if len(res):
+        lines.append(f'  |residual| median {np.median(res):.2f} ms, '
+                     f'95th pct {np.percentile(res, 95):.2f} ms, '
+                     f'max {res.max():.2f} ms')
+    if len(lat):
+        lines.append(f'  stamp-to-flip latency median {np.median(lat):.2f} '
+                     f'ms, 95th pct {np.percentile(lat, 95):.2f} ms, '
+                     f'max {lat.max():.2f} ms')
+    return '\n'.join(lines)
+
+
+def _verify_and_write(raw_fname, log_fnames, tol):
+    events, report = verify_run(raw_fname, log_fnames, tol=tol)
+    if events is not None:
+        out_fname = raw_fname.replace('_raw.fif', '-verified-eve.fif')
+        mne.write_events(out_fname, events, overwrite=True)
+    return _summarize(report), events is not None
+
+
+if __name__ == '__main__':
+    import argparse
+    from mne.parallel import parallel_func
+    parser = argparse.ArgumentParser(
+        description='Verify raw triggers against presentation logs.')
+    parser.add_argument('manifest', help='lines of: RAW LOG [LOG ...]')
+    parser.add_argument('--tol', type=float, default=0.05,
+                        help='matching tolerance (s)')
+    parser.add_argument('--n-jobs', type=int, default=1)
+    args = parser.parse_args()
+    with open(args.manifest) as fid:
+        runs = [line.split() for line in fid if line.strip()]
+    parallel, run_func, _ = parallel_func(_verify_and_write, args.n_jobs)
+    all_aligned = True
+    for summary, aligned in parallel(run_func(run[0], run[1:], args.tol)
+                                     for run in runs):
+        print(summary)
+        all_aligned &= aligned
+    sys.exit(int(not all_aligned))
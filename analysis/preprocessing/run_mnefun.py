@@ -1,86 +1,376 @@
 #!/usr/bin/env python
 """
 mnefun preprocessing of either or both PRE-K cohorts (original & replication).
+
+Each combination of recording (pre/post camp), head position transform and
+experiment gets its own mnefun params, built from the YAML files afresh (the
+params are never shared between combinations). By default the combinations
+are processed one after another, in this process. With ``--jobs N`` up to N
+of them run at once, each in its own process with its output going to
+``--log-dir``, so e.g. pre- and post-camp preprocessing proceed side by side;
+``--per-subject`` further splits each combination into one process per
+subject. The running processes share ``--cpus`` CPUs (default: all) through
+mnefun's ``n_jobs`` settings.
+
+Processing is resumable. mnefun's steps (SSS, scoring, SSP, epochs,
+covariances, forward & inverse solutions, report) are run one at a time, and
+when a step is done for a subject that is recorded in
+``<work_dir>/<subject>/mnefun-status.json`` (with the sizes & times of the
+files it wrote, and a hash of the params). On the next run, a subject only
+gets the steps from its first one that is not done: no record, different
+params, or outputs that are missing or have changed since. Outputs made
+before there were records are taken as done if they are not older than
+those of the step before. ``--status`` shows what is left to do, and
+``--from-step STEP`` reruns everything from STEP on.
+
+    python run_mnefun.py                        # everything, serially
+    python run_mnefun.py --jobs 2               # pre & post camp at once
+    python run_mnefun.py --jobs 8 --per-subject --cpus 32
+    python run_mnefun.py --list
+    python run_mnefun.py --status
+    python run_mnefun.py --from-step gen_inv      # e.g., after editing params
 """
 
+import glob
+import hashlib
+import json
 import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import yaml
 import mnefun
+from mnefun._paths import get_raw_fnames, get_event_fnames
 from mnefun._yaml import _flat_params_read
-from sswef_helpers.aux_functions import load_paths, load_params
+from sswef_helpers.aux_functions import load_paths, load_params, fft_n_jobs
 from prek_score import prek_score
 
+here = os.path.dirname(os.path.abspath(__file__))
+Combination = namedtuple('Combination', ('prepost', 'headpos', 'experiment'))
+# the do_processing steps, in the order mnefun runs them
+STEPS = ('do_sss', 'do_score', 'gen_ssp', 'apply_ssp', 'write_epochs',
+         'gen_covs', 'gen_fwd', 'gen_inv', 'gen_report')
+status_fname = 'mnefun-status.json'
+
 # load general params
 data_root, subjects_dir, _ = load_paths()
-_params = _flat_params_read('mnefun_common_params.yaml')
-tmpfile = 'temp.yaml'
-
-# loop over pre/post intervention recordings, and over head pos transforms
-for prepost in ('pre', 'post'):
-    for headpos in ('twa', 'fixed'):
-        for experiment in ('erp',):  # XXX ('pskt', 'erp') or ('combined',)
-            # skip what we don't care about
-            if headpos == 'fixed' and experiment == 'erp':
-                continue
-            # load subjects
-            *_, subjects, cohort = load_params(experiment=experiment)
-            # load the (common and experiment-specific) mnefun params
-            exp_params = _flat_params_read(f'mnefun_{experiment}_params.yaml')
-            _params.update(exp_params)
-            # hack: mnefun only reads params from file, not from dict, so
-            # write a tempfile
-            with open(tmpfile, 'w') as f:
-                yaml.dump(_params, f)
-            params = mnefun.read_params(tmpfile)
-            os.remove(tmpfile)
-            # set general params
-            params.subjects_dir = subjects_dir
-            params.score = prek_score
-            params.subjects = subjects
-            params.subject_indices = list(range(len(params.subjects)))
-            params.structurals = [s.upper() for s in params.subjects]
-            params.dates = [(2013, 0, 00)] * len(params.subjects)
-            # set variable-contingent params
-            params.work_dir = os.path.join(data_root, f'{prepost}_camp',
-                                           f'{headpos}_hp', experiment)
-            params.trans_to = (0., 0., 0.04) if headpos == 'fixed' else headpos
-            # run filenames
-            erp_run_names = [f'%s_erp_{prepost}']
-            pskt_run_names = [f'%s_pskt_{run:02}_{prepost}' for run in (1, 2)]
-            if experiment == 'combined':
-                params.run_names = (erp_run_names + pskt_run_names)
-            elif experiment == 'pskt':
-                params.run_names = pskt_run_names
-            else:
-                params.run_names = erp_run_names
-
-            # set additional params: report
-            common_kw = dict(analysis='Conditions')
-            sns_kw = dict(times='peaks', **common_kw)
-            snr_kw = dict(inv=f'%s-{params.lp_cut}-sss-meg-inv.fif',
-                          **common_kw)
-            src_kw = dict(views=['lateral', 'ventral'], size=(800, 800),
-                          **snr_kw)
-            wht_kw = dict(cov=f'%s-{params.lp_cut}-sss-cov.fif', **common_kw)
-            conds = params.in_names  # experimental conditions
-            params.report['snr'] = [dict(name=c, **snr_kw) for c in conds]
-            params.report['sensor'] = [dict(name=c, **sns_kw) for c in conds]
-            params.report['source'] = [dict(name=c, **src_kw) for c in conds]
-            params.report['whitening'] = [dict(name=c, **wht_kw)
-                                          for c in conds]
-
-            # run it
-            mnefun.do_processing(
-                params,
-                fetch_raw=False,      # go get the Raw files
-                do_sss=True,          # tSSS / maxwell filtering
-                do_score=True,        # run scoring function to extract events
-                gen_ssp=True,         # create SSP projectors
-                apply_ssp=True,       # apply SSP projectors
-                write_epochs=True,    # epoching & filtering
-                gen_covs=True,        # make covariance
-                gen_fwd=True,         # generate fwd model
-                gen_inv=True,         # generate inverse
-                gen_report=True,      # print report
-                print_status=True     # show status
-            )
+
+
+def combinations():
+    """The combinations to preprocess, in the order they are run serially."""
+    combos = list()
+    # loop over pre/post intervention recordings, and over head pos transforms
+    for prepost in ('pre', 'post'):
+        for headpos in ('twa', 'fixed'):
+            for experiment in ('erp',):  # XXX ('pskt', 'erp') or ('combined',)
+                # skip what we don't care about
+                if headpos == 'fixed' and experiment == 'erp':
+                    continue
+                combos.append(Combination(prepost, headpos, experiment))
+    return combos
+
+
+def param_dict(experiment, n_jobs=None):
+    """A new dict of the (common and experiment-specific) mnefun params."""
+    params = _flat_params_read('mnefun_common_params.yaml')
+    params.update(_flat_params_read(f'mnefun_{experiment}_params.yaml'))
+    if n_jobs is not None:  # this process's share of the CPUs
+        params['n_jobs'] = n_jobs
+        params['n_jobs_mkl'] = min(params['n_jobs_mkl'], n_jobs)
+    # without a GPU, filter & resample in worker processes instead of on 1 CPU
+    n_jobs_fft = fft_n_jobs()
+    if n_jobs_fft != 'cuda':
+        for key in ('n_jobs_fir', 'n_jobs_resample'):
+            params[key] = min(n_jobs_fft, params['n_jobs'])
+    return params
+
+
+def make_params(combo, n_jobs=None):
+    """The mnefun ``Params`` of one combination."""
+    prepost, headpos, experiment = combo
+    # load subjects
+    *_, subjects, cohort = load_params(experiment=experiment)
+    # hack: mnefun only reads params from file, not from dict, so write a
+    # tempfile (with a unique name, so concurrent runs don't clobber it)
+    fd, tmpfile = tempfile.mkstemp(prefix='mnefun-', suffix='.yaml')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yaml.dump(param_dict(experiment, n_jobs), f)
+        params = mnefun.read_params(tmpfile)
+    finally:
+        os.remove(tmpfile)
+    # set general params
+    params.subjects_dir = subjects_dir
+    params.score = prek_score
+    params.subjects = subjects
+    params.subject_indices = list(range(len(params.subjects)))
+    params.structurals = [s.upper() for s in params.subjects]
+    params.dates = [(2013, 0, 00)] * len(params.subjects)
+    # set variable-contingent params
+    params.work_dir = os.path.join(data_root, f'{prepost}_camp',
+                                   f'{headpos}_hp', experiment)
+    params.trans_to = (0., 0., 0.04) if headpos == 'fixed' else headpos
+    # run filenames
+    erp_run_names = [f'%s_erp_{prepost}']
+    pskt_run_names = [f'%s_pskt_{run:02}_{prepost}' for run in (1, 2)]
+    if experiment == 'combined':
+        params.run_names = (erp_run_names + pskt_run_names)
+    elif experiment == 'pskt':
+        params.run_names = pskt_run_names
+    else:
+        params.run_names = erp_run_names
+
+    # set additional params: report
+    common_kw = dict(analysis='Conditions')
+    sns_kw = dict(times='peaks', **common_kw)
+    snr_kw = dict(inv=f'%s-{params.lp_cut}-sss-meg-inv.fif', **common_kw)
+    src_kw = dict(views=['lateral', 'ventral'], size=(800, 800), **snr_kw)
+    wht_kw = dict(cov=f'%s-{params.lp_cut}-sss-cov.fif', **common_kw)
+    conds = params.in_names  # experimental conditions
+    params.report['snr'] = [dict(name=c, **snr_kw) for c in conds]
+    params.report['sensor'] = [dict(name=c, **sns_kw) for c in conds]
+    params.report['source'] = [dict(name=c, **src_kw) for c in conds]
+    params.report['whitening'] = [dict(name=c, **wht_kw) for c in conds]
+    return params
+
+
+def params_hash(combo):
+    """Hash of the params of a combination (except the n_jobs settings)."""
+    params = {key: value for key, value in param_dict(combo.experiment).items()
+              if not key.startswith('n_jobs')}
+    text = json.dumps([combo, params], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def step_outputs(params, subject, step):
+    """The files that mnefun ``step`` writes for ``subject``."""
+    if step in ('do_sss', 'apply_ssp'):
+        which = 'sss' if step == 'do_sss' else 'pca'
+        return get_raw_fnames(params, subject, which=which, erm=False,
+                              add_splits=False, run_indices=None)
+    if step == 'do_score':
+        return get_event_fnames(params, subject, run_indices=None)
+    folder, pattern = dict(gen_ssp=(params.pca_dir, 'preproc_*-proj.fif'),
+                           write_epochs=(params.epochs_dir, '*-epo.fif'),
+                           gen_covs=(params.cov_dir, '*-cov.fif'),
+                           gen_fwd=(params.forward_dir, '*-fwd.fif'),
+                           gen_inv=(params.inverse_dir, '*-inv.fif'),
+                           gen_report=('', '*_report.html'))[step]
+    return sorted(glob.glob(os.path.join(params.work_dir, subject, folder,
+                                         pattern)))
+
+
+def _file_stats(fnames):
+    """Size & modification time of each file (None if it is missing)."""
+    return {fname: ([os.stat(fname).st_size, os.stat(fname).st_mtime_ns]
+                    if os.path.isfile(fname) else None) for fname in fnames}
+
+
+def read_status(params, subject):
+    fname = os.path.join(params.work_dir, subject, status_fname)
+    if not os.path.isfile(fname):
+        return dict()
+    with open(fname, 'r') as f:
+        return json.load(f)
+
+
+def write_status(params, subject, status):
+    fname = os.path.join(params.work_dir, subject, status_fname)
+    with open(f'{fname}.tmp', 'w') as f:
+        json.dump(status, f, indent=2)
+    os.replace(f'{fname}.tmp', fname)  # never leave a half-written record
+
+
+def mark_done(params, subject, step, digest, adopted=False):
+    """Record that ``step`` is done for ``subject`` (if it wrote outputs)."""
+    stats = _file_stats(step_outputs(params, subject, step))
+    if not stats or None in stats.values():
+        print(f'    {subject}: {step} is missing outputs, not marking it done')
+        return
+    status = read_status(params, subject)
+    status[step] = dict(finished=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        adopted=adopted, params=digest, outputs=stats)
+    write_status(params, subject, status)
+
+
+def first_missing(params, subject, digest, adopt=True):
+    """Index in STEPS of the first step that is not done for ``subject``.
+
+    Steps whose outputs predate the status records are recorded as done if
+    ``adopt`` (see the module docstring).
+    """
+    status = read_status(params, subject)
+    newest = 0  # the newest output of the steps before
+    for ii, step in enumerate(STEPS):
+        stats = _file_stats(step_outputs(params, subject, step))
+        if not stats or any(stat is None or stat[0] == 0
+                            for stat in stats.values()):
+            return ii
+        record = status.get(step)
+        if record is None:
+            if min(stat[1] for stat in stats.values()) < newest:
+                return ii
+            if adopt:
+                mark_done(params, subject, step, digest, adopted=True)
+        elif record['params'] != digest or any(
+                stats.get(fname) != stat
+                for fname, stat in record['outputs'].items()):
+            return ii
+        newest = max(stat[1] for stat in stats.values())
+    return len(STEPS)
+
+
+def process(combo, n_jobs=None, from_step=None):
+    """Run the missing mnefun steps of one combination.
+
+    Only the subjects in PREK_SUBJECTS (if set) are processed. Each step is
+    run for the subjects that need it, and recorded as done for each of
+    them once it has finished for all of them.
+    """
+    params = make_params(combo, n_jobs)
+    digest = params_hash(combo)
+    start = len(STEPS) if from_step is None else STEPS.index(from_step)
+    first = {subject: min(start, first_missing(params, subject, digest))
+             for subject in params.subjects}
+    for ii, step in enumerate(STEPS):
+        todo = [subject for subject in params.subjects
+                if first[subject] <= ii]
+        if not todo:
+            continue
+        print(f'{" ".join(combo)}: {step} for {", ".join(todo)}')
+        params.subject_indices = [params.subjects.index(subject)
+                                  for subject in todo]
+        mnefun.do_processing(
+            params,
+            fetch_raw=False,      # go get the Raw files
+            print_status=False,   # show status
+            **{this_step: this_step == step for this_step in STEPS})
+        for subject in todo:
+            mark_done(params, subject, step, digest)
+
+
+def print_status(combo):
+    """Print the steps that are left to do, per subject."""
+    params = make_params(combo)
+    digest = params_hash(combo)
+    print(' '.join(combo))
+    for subject in params.subjects:
+        first = first_missing(params, subject, digest, adopt=False)
+        print(f'    {subject}: {", ".join(STEPS[first:]) or "done"}')
+
+
+def _label(unit):
+    combo, subject = unit
+    return '-'.join(combo) + ('' if subject is None else f'-{subject}')
+
+
+def _run_unit(unit, n_jobs, log_dir, from_step=None):
+    combo, subject = unit
+    env = dict(os.environ)
+    env.setdefault('MPL_BACKEND', 'Agg')
+    # keep numpy's BLAS threads within this process's share, too
+    env.setdefault('OMP_NUM_THREADS', str(n_jobs))
+    if subject is not None:
+        env['PREK_SUBJECTS'] = subject
+    log_fname = os.path.join(log_dir, f'run_mnefun-{_label(unit)}.log')
+    start = time.time()
+    with open(log_fname, 'w') as log:
+        proc = subprocess.run(
+            [sys.executable, os.path.basename(__file__), '--combination',
+             *combo, '--n-jobs', str(n_jobs)] +
+            ([] if from_step is None else ['--from-step', from_step]),
+            cwd=here, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.time() - start, log_fname
+
+
+def run_parallel(combos, jobs, cpus=None, per_subject=False,
+                 log_dir='mnefun-logs', from_step=None):
+    """Process the combinations, ``jobs`` at a time, in separate processes.
+
+    Each process gets an equal share of ``cpus`` (default: all). With
+    ``per_subject``, only subjects with steps left to do are started.
+    Returns whether all of them succeeded.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    units = list()
+    for combo in combos:
+        if not per_subject:
+            units.append((combo, None))
+            continue
+        params = make_params(combo)
+        digest = params_hash(combo)
+        units.extend((combo, subject) for subject in params.subjects
+                     if from_step is not None or
+                     first_missing(params, subject, digest) < len(STEPS))
+    if not units:
+        print('nothing to do')
+        return True
+    jobs = max(1, min(jobs, len(units)))
+    if cpus is None:
+        cpus = fft_n_jobs(cuda=False)
+    n_jobs = max(1, cpus // jobs)
+    failed = list()
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(_run_unit, unit, n_jobs, log_dir,
+                                   from_step): unit for unit in units}
+        print(f'{len(units)} runs, {jobs} at a time with n_jobs={n_jobs}')
+        for future in as_completed(futures):
+            unit = futures[future]
+            code, dur, log_fname = future.result()
+            status = 'done' if code == 0 else f'FAILED ({code})'
+            print(f'[{time.time() - t0:7.0f} s] {status} {_label(unit)} '
+                  f'in {dur:.0f} s')
+            if code:
+                failed.append((unit, log_fname))
+    for unit, log_fname in failed:
+        print(f'{_label(unit)} failed, see {log_fname}')
+    return not failed
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='mnefun preprocessing of the PRE-K recordings.')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of combinations (or subjects) to '
+                        'process at once, in separate processes')
+    parser.add_argument('--cpus', type=int,
+                        help='CPUs to share among the processes (default: '
+                        'all)')
+    parser.add_argument('--per-subject', action='store_true',
+                        help='split each combination into one process per '
+                        'subject')
+    parser.add_argument('--log-dir', default=os.path.join(here,
+                                                          'mnefun-logs'))
+    parser.add_argument('--combination', nargs=3,
+                        metavar=('PREPOST', 'HEADPOS', 'EXPERIMENT'),
+                        help='process just this combination, in this process')
+    parser.add_argument('--n-jobs', type=int,
+                        help="override the params' n_jobs")
+    parser.add_argument('--from-step', choices=STEPS,
+                        help='rerun this step and the ones after it, even '
+                        'if they are done')
+    parser.add_argument('--list', action='store_true',
+                        help='list the combinations')
+    parser.add_argument('--status', action='store_true',
+                        help='print the steps left to do, per subject')
+    args = parser.parse_args()
+    if args.list:
+        print('\n'.join(' '.join(combo) for combo in combinations()))
+        sys.exit()
+    combos = ([Combination(*args.combination)] if args.combination else
+              combinations())
+    if args.status:
+        for combo in combos:
+            print_status(combo)
+    elif args.combination or not (args.jobs > 1 or args.per_subject):
+        for combo in combos:
+            process(combo, args.n_jobs, args.from_step)
+    else:
+        sys.exit(0 if run_parallel(combos, args.jobs, args.cpus,
+                                   args.per_subject, args.log_dir,
+                                   args.from_step) else 1)
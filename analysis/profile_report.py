@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Summarize (and compare) the profiling records of pipeline runs.
+
+Records are written when ``PREK_PROFILE`` is set (``run_pipeline.py
+--profile`` sets it to ``pipeline-logs/profile.jsonl``); see
+``StageProfiler`` in ``sswef_helpers/aux_functions.py``. For each run this
+prints, per stage, the number of processes, summed wall & CPU time, peak
+memory, GB read & written, and files read & written. Given two or more runs
+it also prints each stage's wall time, CPU time and peak memory side by side,
+relative to the first run.
+
+    python profile_report.py pipeline-logs/profile.jsonl
+    python profile_report.py profile.jsonl --runs 20211102-0930 20211103-1010
+    python profile_report.py profile.jsonl --units  # per-subject breakdown
+"""
+
+import pandas as pd
+
+totals = dict(n_procs=('pid', 'nunique'), wall_s=('wall_s', 'sum'),
+              cpu_s=('cpu_s', 'sum'), peak_rss_gb=('peak_rss_gb', 'max'),
+              read_gb=('read_gb', 'sum'), written_gb=('written_gb', 'sum'),
+              files_read=('files_read', 'sum'),
+              files_written=('files_written', 'sum'),
+              errors=('status', lambda x: (x != 'ok').sum()))
+per_unit = dict(n_units=('unit', 'nunique'),
+                median_wall_s=('wall_s', 'median'),
+                max_wall_s=('wall_s', 'max'), max_cpu_s=('cpu_s', 'max'),
+                peak_rss_gb=('peak_rss_gb', 'max'),
+                median_read_gb=('read_gb', 'median'))
+compared = ('wall_s', 'cpu_s', 'peak_rss_gb')
+
+
+def load_records(fname, runs=None):
+    df = pd.read_json(fname, lines=True, dtype=dict(run_id=str))
+    if runs:
+        df = df.loc[df['run_id'].isin(runs)]
+    df['cpu_s'] = df['cpu_user_s'] + df['cpu_sys_s'] + df['cpu_children_s']
+    df['peak_rss_gb'] = df['peak_rss'] / 1e9
+    df['read_gb'] = df['bytes_read'] / 1e9
+    df['written_gb'] = df['bytes_written'] / 1e9
+    return df
+
+
+def summarize(df, units=False):
+    """Per-stage totals (or per-unit statistics) of each run."""
+    kind, agg = ('unit', per_unit) if units else ('stage', totals)
+    df = df.loc[df['kind'] == kind]
+    # keep runs in the order they were made, and stages in pipeline order
+    order = dict(run_id=df['run_id'].unique(), stage=df['stage'].unique())
+    summary = df.groupby(['run_id', 'stage'], sort=False).agg(**agg)
+    return summary.reindex(pd.MultiIndex.from_product(
+        order.values(), names=order.keys())).dropna(how='all')
+
+
+def compare(summary):
+    """Side-by-side stage totals of each run, and ratios to the first run."""
+    wide = summary[list(compared)].unstack('run_id')
+    runs = summary.index.unique('run_id')
+    for col in compared:
+        for run in runs[1:]:
+            wide[(f'{col}_ratio', run)] = (wide[(col, run)] /
+                                           wide[(col, runs[0])])
+    return wide
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Summarize profiling records of pipeline runs.')
+    parser.add_argument('fname', help='JSON-lines file of profiling records')
+    parser.add_argument('--runs', nargs='+', metavar='RUN_ID',
+                        help='runs to include (default: all)')
+    parser.add_argument('--units', action='store_true',
+                        help='summarize the per-subject records instead')
+    parser.add_argument('--csv', help='also save the summary to this file')
+    args = parser.parse_args()
+    df = load_records(args.fname, args.runs)
+    summary = summarize(df, args.units)
+    with pd.option_context('display.width', 200, 'display.max_rows', None,
+                           'display.max_columns', None,
+                           'display.float_format', '{:.3g}'.format):
+        for run_id, this_run in summary.groupby(level='run_id', sort=False):
+            print(f'\nrun {run_id}\n')
+            print(this_run.droplevel('run_id'))
+        if not args.units and summary.index.unique('run_id').size > 1:
+            print('\ncomparison (ratios are relative to the first run)\n')
+            print(compare(summary))
+    if args.csv:
+        summary.to_csv(args.csv)
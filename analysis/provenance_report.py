@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Tell which pipeline outputs are stale.
+
+Outputs carry a provenance record (see ``stamp`` in
+``sswef_helpers/aux_functions.py``): the parameter files, code, package
+versions and inputs they were made from. For each output (folders are
+searched recursively) this prints why it is out of date: parameters that
+changed since, inputs, scripts or helper functions that changed or are gone,
+or no record at all. With ``--recursive`` the inputs' own records are checked
+too, so an output made from a stale input is reported even if that input did
+not change. Only the helpers that an output's script used count, unless
+``--module`` is given (then any change to ``aux_functions.py`` does).
+
+    python provenance_report.py /mnt/scratch/prek/results/pskt
+    python provenance_report.py ssvef/ --recursive --versions
+    python provenance_report.py cluster-results.h5 --show
+
+The exit status is 1 if anything is stale, so this can gate a rerun.
+"""
+
+import json
+import os
+import sys
+
+# the helpers find the params relative to the working directory, which is
+# meant to be a folder below this one
+here = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault('PREK_PARAMS', os.path.join(here, '..', 'params'))
+from sswef_helpers.aux_functions import (  # noqa E402
+    check_provenance, read_provenance)
+
+# files that are part of another output, or are not outputs at all
+skip = ('.prov.json', '-rh.stc', '.yaml', '.yml', '.py', '.pyc', '.log')
+
+
+def find_outputs(targets):
+    """The outputs in ``targets`` (files, STC stems, or folders)."""
+    for target in targets:
+        if not os.path.isdir(target):
+            yield target
+            continue
+        for root, dirs, files in os.walk(target):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if not (name.startswith('.') or name.endswith(skip)):
+                    yield os.path.join(root, name)
+
+
+def stale_outputs(targets, recursive=False, versions=False, module=False):
+    """Map each stale output in ``targets`` to the reasons it is stale."""
+    cache = dict()
+
+    def reasons_stale(fname):
+        key = os.path.abspath(fname)
+        if key not in cache:
+            cache[key] = list()  # guards against cycles
+            reasons = check_provenance(fname, versions=versions,
+                                       module=module)
+            record = read_provenance(fname) if recursive else None
+            # inputs without records (raw data etc.) are only hash-checked
+            for path in (record or dict(inputs=()))['inputs']:
+                if (os.path.exists(path) and
+                        read_provenance(path) is not None and
+                        reasons_stale(path)):
+                    reasons.append(f'input {path} is stale')
+            cache[key] = reasons
+        return cache[key]
+
+    stale = dict()
+    for fname in find_outputs(targets):
+        try:
+            reasons = reasons_stale(fname)
+        except FileNotFoundError:
+            reasons = ['no such file']
+        if reasons:
+            stale[fname] = reasons
+    return stale
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Tell which pipeline outputs are stale.')
+    parser.add_argument('targets', nargs='+',
+                        help='output files or folders of outputs')
+    parser.add_argument('--recursive', action='store_true',
+                        help="also check the inputs' own records")
+    parser.add_argument('--versions', action='store_true',
+                        help='treat changed package versions as stale')
+    parser.add_argument('--module', action='store_true',
+                        help='treat any change to aux_functions.py as stale '
+                        '(not just to the helpers an output used)')
+    parser.add_argument('--show', action='store_true',
+                        help='print the provenance record of each output')
+    args = parser.parse_args()
+    if args.show:
+        for fname in find_outputs(args.targets):
+            print(f'\n{fname}\n')
+            print(json.dumps(read_provenance(fname), indent=2))
+    stale = stale_outputs(args.targets, args.recursive, args.versions,
+                          args.module)
+    for fname, reasons in stale.items():
+        print(f'\n{fname}')
+        for reason in reasons:
+            print(f'    {reason}')
+    print(f'\n{len(stale)} stale output(s)')
+    sys.exit(int(bool(stale)))
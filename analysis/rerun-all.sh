@@ -10,6 +10,7 @@ python plot-test-retest-correlations.py
 
 cd ../erp
 python prek_make_stcs.py
+python prek_make_stc_store.py
 python prek_make_group_averages.py
 python prek_do_contrasts.py
 python prek_extract_ROI_time_courses.py
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Run the analysis pipeline (or part of it) in dependency order.
+
+Each stage below is one of the existing scripts, with the stages it needs
+the outputs of. Every script is run from its own folder (they find the
+params and each other's files by relative paths), in its own process, with
+its output going to ``--log-dir``. Stages (or subjects) whose dependencies
+are done run at the same time, up to ``--jobs`` processes, so e.g. the ERP
+and SSVEF branches run side by side. Per-subject stages are split into one
+process per subject (via ``PREK_SUBJECTS``), and a subject's next
+per-subject stage can start as soon as that subject is done.
+
+    python run_pipeline.py --list
+    python run_pipeline.py --until ssvep_clustering --jobs 16
+    python run_pipeline.py --only ssvep_calc_tvals ssvep_plot_tvals
+
+Without ``--until`` or ``--only`` everything except the optional stages
+(extra plots & checks, which run only when named) is run. With ``--profile``
+the time, memory & I/O of every step (and subject) are recorded in
+``LOG_DIR/profile.jsonl``; summarize them with ``profile_report.py``. The
+outputs get provenance records (``PREK_PROVENANCE``), so
+``provenance_report.py`` can tell which of them are stale.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+here = os.path.dirname(os.path.abspath(__file__))
+TASKS = dict()
+
+
+def add_task(name, script, deps=(), per_subject=None, optional=False):
+    """Register a pipeline stage.
+
+    ``script`` is relative to this folder. ``per_subject`` is the experiment
+    ('erp' or 'pskt') whose subjects the stage can be split over, if any.
+    """
+    for dep in deps:
+        assert dep in TASKS, f'{name}: unknown dependency {dep}'
+    TASKS[name] = dict(script=script, deps=tuple(deps),
+                       per_subject=per_subject, optional=optional)
+
+
+# preprocessing
+add_task('run_mnefun', 'preprocessing/run_mnefun.py')
+add_task('find-optimal-reject-thresh',
+         'preprocessing/find-optimal-reject-thresh.py', ['run_mnefun'])
+add_task('check-epoch-drop-counts', 'preprocessing/check-epoch-drop-counts.py',
+         ['find-optimal-reject-thresh'])
+add_task('plot-test-retest-correlations',
+         'preprocessing/plot-test-retest-correlations.py',
+         ['check-epoch-drop-counts'])
+# SSVEF
+add_task('ssvep_make_epochs', 'ssvef/ssvep_make_epochs.py', ['run_mnefun'],
+         per_subject='pskt')
+add_task('ssvep_compare_epoching', 'ssvef/ssvep_compare_epoching.py',
+         ['run_mnefun'], optional=True)
+add_task('ssvep_plot_sensor_psds', 'ssvef/ssvep_plot_sensor_psds.py',
+         ['ssvep_make_epochs'], optional=True)
+add_task('ssvep_epochs_to_evoked_fft', 'ssvef/ssvep_epochs_to_evoked_fft.py',
+         ['ssvep_make_epochs'], per_subject='pskt')
+add_task('ssvep_plot_phases', 'ssvef/ssvep_plot_phases.py',
+         ['ssvep_epochs_to_evoked_fft'], optional=True)
+add_task('ssvep_fft_evk_to_stc_fsaverage',
+         'ssvef/ssvep_fft_evk_to_stc_fsaverage.py',
+         ['ssvep_epochs_to_evoked_fft'], per_subject='pskt')
+add_task('ssvep_plot_stcs', 'ssvef/ssvep_plot_stcs.py',
+         ['ssvep_fft_evk_to_stc_fsaverage'], optional=True)
+add_task('ssvep_make_stc_store', 'ssvef/ssvep_make_stc_store.py',
+         ['ssvep_fft_evk_to_stc_fsaverage'])
+add_task('ssvep_group_level_aggregate_stcs',
+         'ssvef/ssvep_group_level_aggregate_stcs.py', ['ssvep_make_stc_store'])
+add_task('ssvep_group_level_plot_stcs', 'ssvef/ssvep_group_level_plot_stcs.py',
+         ['ssvep_group_level_aggregate_stcs'], optional=True)
+add_task('ssvep_prep_data_for_stats', 'ssvef/ssvep_prep_data_for_stats.py',
+         ['ssvep_make_stc_store'])
+add_task('ssvep_calc_tvals', 'ssvef/ssvep_calc_tvals.py',
+         ['ssvep_prep_data_for_stats', 'ssvep_group_level_aggregate_stcs'])
+add_task('ssvep_plot_tvals', 'ssvef/ssvep_plot_tvals.py',
+         ['ssvep_calc_tvals'])
+add_task('ssvep_to_dataframe', 'ssvef/ssvep_to_dataframe.py',
+         ['ssvep_fft_evk_to_stc_fsaverage'])
+add_task('ssvep_make_roi', 'ssvef/ssvep_make_roi.py',
+         ['ssvep_group_level_aggregate_stcs'])
+add_task('ssvep_clustering', 'ssvef/ssvep_clustering.py',
+         ['ssvep_calc_tvals'])
+add_task('ssvep_plot_clusters', 'ssvef/ssvep_plot_clusters.py',
+         ['ssvep_clustering'])
+add_task('ssvep_precision_audit', 'ssvef/ssvep_precision_audit.py',
+         ['ssvep_clustering'], optional=True)
+# ERP
+add_task('prek_make_stcs', 'erp/prek_make_stcs.py',
+         ['check-epoch-drop-counts'], per_subject='erp')
+add_task('prek_make_stc_store', 'erp/prek_make_stc_store.py',
+         ['prek_make_stcs'])
+add_task('prek_check_batch_inverse', 'erp/prek_check_batch_inverse.py',
+         ['run_mnefun'], per_subject='erp', optional=True)
+add_task('prek_make_group_averages', 'erp/prek_make_group_averages.py',
+         ['prek_make_stc_store'])
+add_task('prek_do_contrasts', 'erp/prek_do_contrasts.py',
+         ['prek_make_group_averages'])
+add_task('prek_extract_ROI_time_courses',
+         'erp/prek_extract_ROI_time_courses.py',
+         ['prek_make_stc_store', 'ssvep_make_roi'])
+add_task('prek_clustering', 'erp/prek_clustering.py', ['prek_make_stc_store'],
+         optional=True)
+add_task('prek_plot_clusters', 'erp/prek_plot_clusters.py',
+         ['prek_clustering'], optional=True)
+# final figures
+add_task('plot-ROI-label', 'final-figs/plot-ROI-label.py')
+add_task('erp-spatial-and-temporal-ROIs',
+         'final-figs/erp-spatial-and-temporal-ROIs.py',
+         ['prek_extract_ROI_time_courses'])
+add_task('erp-postcamp-lineplot-by-intervention-and-condition',
+         'final-figs/erp-postcamp-lineplot-by-intervention-and-condition.py',
+         ['erp-spatial-and-temporal-ROIs'])
+add_task('erp-lineplot-grid-intervention-by-condition-by-timepoint',
+         'final-figs/erp-lineplot-grid-intervention-by-condition-by-'
+         'timepoint.py', ['prek_extract_ROI_time_courses'])
+add_task('erp-rejection-thresholds', 'final-figs/erp-rejection-thresholds.py',
+         ['check-epoch-drop-counts'])
+add_task('pskt-grandavg-brains-2Hz-6Hz',
+         'final-figs/pskt-grandavg-brains-2Hz-6Hz.py',
+         ['ssvep_fft_evk_to_stc_fsaverage'], optional=True)
+add_task('pskt-lower-vs-upper-2Hz', 'final-figs/pskt-lower-vs-upper-2Hz.py',
+         ['ssvep_fft_evk_to_stc_fsaverage'], optional=True)
+add_task('pskt-dataframe-from-label',
+         'final-figs/pskt-dataframe-from-label.py',
+         ['ssvep_fft_evk_to_stc_fsaverage'], optional=True)
+add_task('pskt-spectra-and-median-split-barplots',
+         'final-figs/pskt-spectra-and-median-split-barplots.py',
+         ['pskt-dataframe-from-label'], optional=True)
+
+
+def select_tasks(until=None, only=None):
+    """Names of the tasks to run, in registration order."""
+    for name in (until or []) + (only or []):
+        if name not in TASKS:
+            raise ValueError(f'unknown task {repr(name)}; see --list')
+    if only:
+        selected = set(only)
+    elif until:
+        selected = set()
+        stack = list(until)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(TASKS[name]['deps'])
+    else:
+        selected = {name for name, task in TASKS.items()
+                    if not task['optional']}
+    return [name for name in TASKS if name in selected]
+
+
+def list_subjects(experiment):
+    """The subjects a script of ``experiment`` will loop over."""
+    code = ('from sswef_helpers.aux_functions import load_params; '
+            f'print(" ".join(load_params(experiment={repr(experiment)})[2]))')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                         text=True, check=True,
+                         cwd=os.path.join(here, 'ssvef'))
+    return out.stdout.split()
+
+
+def make_units(names, split=True):
+    """Split tasks into units (one per subject for per-subject tasks).
+
+    Returns a dict mapping each unit ``(task, subject)`` (``subject`` is None
+    for whole-task units) to the set of units it has to wait for. A
+    per-subject unit waits only for the same subject of a per-subject
+    dependency (of the same experiment).
+    """
+    subjects = dict()
+    units = dict()
+    for name in names:
+        task = TASKS[name]
+        exp = task['per_subject'] if split else None
+        if exp is not None and exp not in subjects:
+            subjects[exp] = list_subjects(exp)
+        these = subjects[exp] if exp is not None else [None]
+        deps = [dep for dep in task['deps'] if dep in names]
+        for subject in these:
+            waits = set()
+            for dep in deps:
+                dep_units = [unit for unit in units if unit[0] == dep]
+                if subject is not None and (dep, subject) in units:
+                    waits.add((dep, subject))
+                else:
+                    waits.update(dep_units)
+            units[(name, subject)] = waits
+    return units
+
+
+def _run_unit(unit, log_dir):
+    name, subject = unit
+    script = os.path.join(here, TASKS[name]['script'])
+    env = dict(os.environ)
+    env.setdefault('MPL_BACKEND', 'Agg')
+    if subject is not None:
+        env['PREK_SUBJECTS'] = subject
+    log_fname = os.path.join(
+        log_dir, name + ('' if subject is None else f'-{subject}') + '.log')
+    start = time.time()
+    with open(log_fname, 'w') as log:
+        proc = subprocess.run([sys.executable, os.path.basename(script)],
+                              cwd=os.path.dirname(script), env=env,
+                              stdout=log, stderr=subprocess.STDOUT)
+    return proc.returncode, time.time() - start, log_fname
+
+
+def _label(unit):
+    return unit[0] + ('' if unit[1] is None else f' ({unit[1]})')
+
+
+def run(units, jobs=1, log_dir='pipeline-logs'):
+    """Run the units, ``jobs`` at a time; stop at the first failure."""
+    os.makedirs(log_dir, exist_ok=True)
+    waiting = {unit: set(deps) for unit, deps in units.items()}
+    running = dict()
+    failed = list()
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while waiting or running:
+            ready = [unit for unit, deps in waiting.items() if not deps]
+            while ready and len(running) < jobs and not failed:
+                unit = ready.pop(0)
+                del waiting[unit]
+                print(f'[{time.time() - t0:7.0f} s] start {_label(unit)}')
+                running[executor.submit(_run_unit, unit, log_dir)] = unit
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                unit = running.pop(future)
+                code, dur, log_fname = future.result()
+                status = 'done' if code == 0 else f'FAILED ({code})'
+                print(f'[{time.time() - t0:7.0f} s] {status} {_label(unit)} '
+                      f'in {dur:.0f} s')
+                if code:
+                    failed.append((unit, log_fname))
+                    continue
+                for deps in waiting.values():
+                    deps.discard(unit)
+    for unit, log_fname in failed:
+        print(f'{_label(unit)} failed, see {log_fname}')
+    if waiting and not failed:
+        raise RuntimeError('could not schedule: ' +
+                           ', '.join(map(_label, waiting)))
+    return not failed
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Run the analysis pipeline in dependency order.')
+    parser.add_argument('--until', nargs='+', metavar='TASK',
+                        help='run these tasks and everything they need')
+    parser.add_argument('--only', nargs='+', metavar='TASK',
+                        help='run just these tasks (not their dependencies)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of scripts to run at once')
+    parser.add_argument('--no-split', action='store_true',
+                        help="don't split per-subject tasks by subject")
+    parser.add_argument('--log-dir', default=os.path.join(here,
+                                                          'pipeline-logs'))
+    parser.add_argument('--profile', action='store_true',
+                        help='record time, memory & I/O of each step to '
+                        'LOG_DIR/profile.jsonl (see profile_report.py)')
+    parser.add_argument('--list', action='store_true',
+                        help='list the tasks and their dependencies')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print what would be run')
+    args = parser.parse_args()
+    if args.list:
+        for name, task in TASKS.items():
+            flags = [flag for flag, value in (
+                (f'per-subject ({task["per_subject"]})', task['per_subject']),
+                ('optional', task['optional'])) if value]
+            flags = f' [{", ".join(flags)}]' if flags else ''
+            deps = ', '.join(task['deps']) or '-'
+            print(f'{name}{flags}\n    {task["script"]} <- {deps}')
+        sys.exit()
+    names = select_tasks(args.until, args.only)
+    if args.dry_run:
+        print('\n'.join(f'{name} <- {", ".join(TASKS[name]["deps"]) or "-"}'
+                        for name in names))
+        sys.exit()
+    # one run ID for the profiling records of all the steps
+    os.environ.setdefault('PREK_RUN_ID', time.strftime('%Y%m%d-%H%M%S'))
+    # stamp the outputs with provenance records (see provenance_report.py)
+    os.environ.setdefault('PREK_PROVENANCE', '1')
+    if args.profile:
+        os.environ.setdefault('PREK_PROFILE', os.path.join(
+            os.path.abspath(args.log_dir), 'profile.jsonl'))
+    units = make_units(names, split=not args.no_split)
+    sys.exit(0 if run(units, args.jobs, args.log_dir) else 1)
@@ -3,10 +3,12 @@ export DISPLAY=:1.0
 export MPL_BACKEND=Agg
 
 python ssvep_make_epochs.py && \
+#python ssvep_compare_epoching.py &&              `# optional` \
 python ssvep_epochs_to_evoked_fft.py && \
 #python ssvep_plot_sensor_psds.py &&              `# optional` \
 #python ssvep_plot_phases.py &&                   `# optional` \
 python ssvep_fft_evk_to_stc_fsaverage.py && \
+python ssvep_make_stc_store.py && \
 #python ssvep_plot_stcs.py &&                     `# optional` \
 python ssvep_group_level_aggregate_stcs.py && \
 #python ssvep_group_level_plot_stcs.py &&         `# optional` \
@@ -17,4 +19,5 @@ python ssvep_to_dataframe.py && \
 python ssvep_make_roi.py && \
 python ssvep_clustering.py && \
 python ssvep_plot_clusters.py && \
+#python ssvep_precision_audit.py &&               `# optional` \
 echo "finished"
@@ -10,9 +10,10 @@ import os
 import numpy as np
 from nibabel.freesurfer.io import write_morph_data
 import mne
-from mne.stats import ttest_ind_no_p, ttest_1samp_no_p
 from sswef_helpers.aux_functions import (load_paths, load_params, load_cohorts,
-                                         load_inverse_params)
+                                         load_inverse_params, get_dtypes,
+                                         ttest_ind_no_p, ttest_1samp_no_p,
+                                         PRECISION, stamp)
 
 # load params
 brain_plot_kwargs, _, subjects, cohort = load_params(experiment='pskt')
@@ -42,6 +43,8 @@ for _dir in (tval_dir,):
 timepoints = ('pre', 'post')
 conditions = ('all', 'ps', 'kt')
 sigma = 1e-3  # hat adjustment for low variance
+real_dtype, _ = get_dtypes()  # float32 if PRECISION == 'single'
+rtol = 1e-7 if PRECISION == 'double' else 1e-5  # grand avg sanity check
 src = mne.read_source_spaces(src_fname)
 morph = mne.compute_source_morph(
     src, subjects_dir=subjects_dir, spacing=None, smooth='nearest')
@@ -54,10 +57,11 @@ offsets = dict(lh=offsets[:-1],
                rh=offsets[1:])
 
 
-def save_tvals(fname, tvals, freqs):
+def save_tvals(fname, tvals, freqs, inputs):
     """Save tvals along with freesurfer overlays."""
     assert tvals.shape == (20484, len(freqs))
     np.save(fname, tvals)
+    stamp(fname, inputs=inputs, sigma=sigma)
     for f, t in zip(freqs, tvals.T):
         if f in write_freqs:
             vals = morph.morph_mat @ t
@@ -69,6 +73,8 @@ def save_tvals(fname, tvals, freqs):
 
 for condition in conditions:
     print(f'Computing t-vals for {condition}')
+    inputs = [os.path.join(npz_dir, f'{kind}-{condition}.npz')
+              for kind in ('snr', 'data', 'noise')]
     # load in all the data, making mutable (NpzFile is not)
     with np.load(os.path.join(npz_dir, f'snr-{condition}.npz')) as snr_npz:
         snr_dict = dict(snr_npz.items())
@@ -82,9 +88,9 @@ for condition in conditions:
         snr_ = np.array([snr_dict[f'{s}-{tpt}'] for s in groups['GrandAvg']])
         data = np.array([data_dict[f'{s}-{tpt}'] for s in groups['GrandAvg']])
         nois = np.array([noise_dict[f'{s}-{tpt}'] for s in groups['GrandAvg']])
-        assert snr_.dtype == np.float64
-        assert data.dtype == np.float64
-        assert nois.dtype == np.float64
+        assert snr_.dtype == real_dtype
+        assert data.dtype == real_dtype
+        assert nois.dtype == real_dtype
         freq_ix = np.nonzero(freqs == 6.)[0]  # 6 Hz
         x = data[:, :, freq_ix] - nois[:, :, freq_ix]
         bad = np.where(np.percentile(x, 75, axis=-1) < 0)[0]
@@ -101,7 +107,7 @@ for condition in conditions:
         tvals = np.array([ttest_1samp_no_p(_dmn, sigma=sigma) for _dmn in
                           (data - nois).transpose(2, 0, 1)]).T
         fname = f'DataMinusNoise1samp-{tpt}_camp-{condition}-tvals.npy'
-        save_tvals(os.path.join(tval_dir, fname), tvals, freqs)
+        save_tvals(os.path.join(tval_dir, fname), tvals, freqs, inputs)
         # compute grand avg of SNR, and sanity check it
         ave = np.mean(snr_, axis=0)
         check_fname = os.path.join(
@@ -109,9 +115,9 @@ for condition in conditions:
             f'original-GrandAvg-{tpt}_camp-pskt-{condition}'
             '-fft-snr-stc.h5')
         check_stc = mne.read_source_estimate(check_fname)
-        np.testing.assert_allclose(ave, check_stc.data)
+        np.testing.assert_allclose(ave, check_stc.data, rtol=rtol)
         fname = f'GrandAvg-{tpt}_camp-{condition}-grandavg.npy'
-        save_tvals(os.path.join(tval_dir, fname), ave, freqs)
+        save_tvals(os.path.join(tval_dir, fname), ave, freqs, inputs)
         if condition == 'all' and tpt == 'pre':
             print(check_fname)
             print(os.path.join(tval_dir, fname))
@@ -121,7 +127,7 @@ for condition in conditions:
     median_split = list()
     for group in ('UpperKnowledge', 'LowerKnowledge'):
         snr = np.array([snr_dict[f'{s}-pre'] for s in groups[group]])
-        assert snr.dtype == np.float64
+        assert snr.dtype == real_dtype
         median_split.append(snr)
     median_split_tvals = np.array([
         ttest_ind_no_p(a, b, sigma=sigma) for a, b in zip(
@@ -138,7 +144,7 @@ for condition in conditions:
         for group in ('LetterIntervention', 'LanguageIntervention'):
             snr = np.array([snr_dict[f'{s}-post'] - snr_dict[f'{s}-pre']
                             for s in groups[group]])
-            assert snr.dtype == np.float64
+            assert snr.dtype == real_dtype
             intervention.append(snr)
         intervention_tvals = np.array([
             ttest_ind_no_p(a, b, sigma=sigma) for a, b in zip(
@@ -150,4 +156,4 @@ for condition in conditions:
                  'LetterVsLanguageIntervention-PostMinusPre_camp': intervention_tvals}  # noqa E501
     for fname, tvals in tval_dict.items():
         save_tvals(os.path.join(tval_dir, f'{fname}-{condition}-tvals.npy'),
-                   tvals, freqs)
+                   tvals, freqs, inputs)
@@ -12,11 +12,11 @@ import time
 import numpy as np
 import mne
 from scipy import stats
-from mne.stats import (permutation_cluster_test, ttest_ind_no_p,
-                       permutation_cluster_1samp_test, ttest_1samp_no_p)
+from mne.stats import permutation_cluster_test, permutation_cluster_1samp_test
 from sswef_helpers.aux_functions import (
     load_paths, load_params, load_cohorts, prep_cluster_stats,
-    load_inverse_params, load_fsaverage_src)
+    load_inverse_params, load_fsaverage_src, ttest_ind_no_p, ttest_1samp_no_p,
+    stamp)
 ppf = stats.t.ppf
 del stats
 
@@ -71,7 +71,7 @@ all_freqs = stc.times
 del stc
 
 
-def find_clusters(X, fpath, qc_tvals, onesamp=False, **kwargs):
+def find_clusters(X, fpath, qc_tvals, inputs, onesamp=False, **kwargs):
     if onesamp:
         stat_fun = ttest_1samp_no_p
         cluster_fun = permutation_cluster_1samp_test
@@ -99,6 +99,8 @@ def find_clusters(X, fpath, qc_tvals, onesamp=False, **kwargs):
     stats['tfce'] = tfce
     stats['threshold'] = kwargs['threshold']
     np.savez(fpath, **stats)
+    stamp(fpath, inputs=inputs, sigma=cluster_sigma,
+          n_permutations=kwargs['n_permutations'])
 
 
 t0 = time.time()
@@ -171,7 +173,11 @@ for condition in conditions:
                           step_down_p=0.05,
                           out_type='indices', verbose=True)
             tval_fname = f'{prefix}-{condition}-tvals.npy'
-            qc_tvals = np.load(os.path.join(tval_dir, tval_fname))[:, bin_idx]
+            tval_fpath = os.path.join(tval_dir, tval_fname)
+            qc_tvals = np.load(tval_fpath)[:, bin_idx]
+            inputs = [os.path.join(npz_dir, f'{kind}-{condition}.npz')
+                      for kind in ('snr', 'data', 'noise')]
+            inputs += [stc_path, tval_fpath]
             find_clusters(X, os.path.join(cluster_dir, fname), qc_tvals,
-                          onesamp, **kwargs)
+                          inputs, onesamp, **kwargs)
 print(f'Completed in {time.time() - t0:0.1f} seconds')
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Check that epoching before resampling gives the same FFT bins as resampling
+whole recordings.
+
+For each subject & timepoint the PS/KT epochs are made three ways:
+
+- ``epoch-first``: what ``ssvep_make_epochs.py`` does (only the data around
+  the epochs is read and resampled);
+- ``whole``: each whole recording resampled in one go, on the same sample
+  grid (``make_resampled_epochs`` with ``margin=None``);
+- ``legacy``: ``raw.resample()`` then ``mne.Epochs()``, as before.
+
+The evoked FFTs (as in ``ssvep_epochs_to_evoked_fft.py``) of each condition
+are compared, relative to the largest bin. ``epoch-first`` vs ``whole``
+isolates the effect of resampling only the stretches around the epochs, and
+should agree to ``tol`` below the low-pass cutoff. ``legacy`` differs by more:
+``raw.resample(npad='auto')`` pads each recording to a power of 2, which puts
+its new samples slightly off the nominal grid (by up to half a sample,
+growing along the recording).
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from scipy.fft import rfft, rfftfreq
+import mne
+from sswef_helpers.aux_functions import (load_paths, load_params, yamload,
+                                         make_resampled_epochs, fft_n_jobs,
+                                         fft_threads, PREPROCESS_JOINTLY,
+                                         stamp)
+
+n_jobs = fft_n_jobs()  # CUDA if available, else CPU threads
+
+# flags
+tol = 1e-4
+
+# config paths
+data_root, subjects_dir, results_dir = load_paths()
+epo_dir = os.path.join(results_dir, 'pskt', 'epochs')
+os.makedirs(epo_dir, exist_ok=True)
+subfolder = 'combined' if PREPROCESS_JOINTLY else 'pskt'
+
+# load params
+*_, subjects, cohort = load_params(experiment='pskt')
+paramfile = os.path.join('..', 'preprocessing', 'mnefun_common_params.yaml')
+with open(paramfile, 'r') as f:
+    params = yamload(f)
+lp_cut = params['preprocessing']['filtering']['lp_cut']
+resamp_sfreq = np.rint(2.1 * lp_cut).astype(int)
+
+# config other (same as ssvep_make_epochs.py)
+timepoints = ('pre', 'post')
+runs = (1, 2)
+tmax = 5
+event_dict = dict(ps=60, kt=70)
+methods = ('epoch-first', 'whole', 'legacy')
+
+
+def make_epochs(raw_path, events, method):
+    raw = mne.io.read_raw_fif(raw_path, preload=(method == 'legacy'))
+    ann_to_del = [idx for idx, ann in enumerate(raw.annotations)
+                  if ann['description'] == 'BAD_EOG_MANUAL']
+    raw.annotations.delete(ann_to_del)
+    with fft_threads(n_jobs):
+        if method == 'legacy':
+            raw, events = raw.resample(sfreq=resamp_sfreq, events=events,
+                                       n_jobs=n_jobs)
+            epo = mne.Epochs(raw, events, event_dict, tmin=0, tmax=tmax,
+                             baseline=None, proj=True,
+                             reject_by_annotation=True, preload=True)
+        else:
+            margin = None if method == 'whole' else 10.
+            epo = make_resampled_epochs(raw, events, event_dict, tmin=0,
+                                        tmax=tmax, sfreq=resamp_sfreq,
+                                        margin=margin, n_jobs=n_jobs)
+    epo.crop(tmax=tmax, include_tmax=False)
+    return epo
+
+
+def evoked_fft(epochs, condition):
+    evoked = epochs[condition].average()
+    freqs = rfftfreq(evoked.times.size, 1. / evoked.info['sfreq'])
+    picks = mne.pick_types(evoked.info, meg=True)
+    return freqs, rfft(evoked.data[picks])
+
+
+rows = list()
+for s in subjects:
+    for timepoint in timepoints:
+        this_subj = os.path.join(data_root, f'{timepoint}_camp', 'twa_hp',
+                                 subfolder, s)
+        epochs = {method: list() for method in methods}
+        for run in runs:
+            this_fname = f'ALL_{s}_pskt_{run:02}_{timepoint}-eve.lst'
+            events = mne.read_events(os.path.join(this_subj, 'lists',
+                                                  this_fname))
+            this_fname = f'{s}_pskt_{run:02}_{timepoint}_allclean_fil{lp_cut}_raw_sss.fif'  # noqa E501
+            raw_path = os.path.join(this_subj, 'sss_pca_fif', this_fname)
+            for method in methods:
+                epochs[method].append(make_epochs(raw_path, events, method))
+        epochs = {method: mne.concatenate_epochs(epochs[method])
+                  for method in methods}
+        # same epochs kept, same events
+        for method in ('whole', 'legacy'):
+            np.testing.assert_array_equal(epochs['epoch-first'].events,
+                                          epochs[method].events)
+        for condition in list(event_dict) + ['all']:
+            cond = list(event_dict) if condition == 'all' else condition
+            freqs, spectrum = evoked_fft(epochs['epoch-first'], cond)
+            below = freqs < lp_cut
+            for method in ('whole', 'legacy'):
+                _, ref = evoked_fft(epochs[method], cond)
+                err = np.abs(spectrum - ref).max(axis=0) / np.abs(ref).max()
+                rows.append(dict(subject=s, timepoint=timepoint,
+                                 condition=condition, reference=method,
+                                 n_epochs=len(epochs[method][cond]),
+                                 max_err=err.max(),
+                                 max_err_below_lp=err[below].max()))
+                print(f'{s} {timepoint} {condition:3} vs {method:6}: '
+                      f'max rel. error {err.max():.2e} '
+                      f'({err[below].max():.2e} below {lp_cut} Hz)')
+
+df = pd.DataFrame(rows)
+csv_fpath = os.path.join(epo_dir, 'epoching-comparison.csv')
+df.to_csv(csv_fpath, index=False)
+stamp(csv_fpath)
+whole = df.loc[df['reference'] == 'whole', 'max_err_below_lp']
+print(f'epoch-first vs whole: worst error below {lp_cut} Hz {whole.max():.2e}'
+      f' ({"OK" if whole.max() < tol else "EXCEEDS"} tol={tol})')
@@ -10,10 +10,11 @@ import os
 import numpy as np
 from scipy.fft import rfft, rfftfreq
 import mne
-from sswef_helpers.aux_functions import load_paths, load_params
+from sswef_helpers.aux_functions import (load_paths, load_params, fft_n_jobs,
+                                         profile_units)
 
 # flags
-mne.cuda.init_cuda()
+workers = fft_n_jobs(cuda=False)  # CPU threads for the FFTs
 
 # config paths
 data_root, subjects_dir, results_dir = load_paths()
@@ -30,7 +31,7 @@ for _dir in (evk_dir, fft_dir):
 timepoints = ('pre', 'post')
 
 # loop over subjects
-for s in subjects:
+for s in profile_units(subjects):
     # loop over timepoints
     for timepoint in timepoints:
         stub = f'{s}-{timepoint}_camp-pskt'
@@ -45,7 +46,7 @@ for s in subjects:
             evoked.save(os.path.join(evk_dir, fname))
             # FFT
             spacing = 1. / evoked.info['sfreq']
-            spectrum = rfft(evoked.data, workers=-2)
+            spectrum = rfft(evoked.data, workers=workers)
             freqs = rfftfreq(evoked.times.size, spacing)
             # convert to fake evoked object and save
             evoked_spect = mne.EvokedArray(spectrum, evoked.info,
@@ -10,7 +10,8 @@ import os
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (
-    load_paths, load_params, load_fsaverage_src, load_inverse_params, yamload)
+    load_paths, load_params, load_fsaverage_src, load_inverse_params, yamload,
+    as_precision, profile_units, stamp)
 
 # flags
 mne.cuda.init_cuda()
@@ -52,14 +53,14 @@ fsaverage_src = load_fsaverage_src()
 fsaverage_vertices = [s['vertno'] for s in fsaverage_src]
 
 # loop over subjects
-for s in subjects:
+for s in profile_units(subjects):
     has_morph = False
     # loop over timepoints
     for timepoint in timepoints:
         for condition in ('ps', 'kt', 'all'):
             stub = f'{s}-{timepoint}_camp-pskt'
-            fname = f'{stub}-{condition}-fft-ave.fif'
-            evoked_spect = mne.read_evokeds(os.path.join(fft_dir, fname))
+            evk_path = os.path.join(fft_dir, f'{stub}-{condition}-fft-ave.fif')
+            evoked_spect = mne.read_evokeds(evk_path)
             assert len(evoked_spect) == 1
             evoked_spect = evoked_spect[0]
             # loop over cortical estimate orientation constraints
@@ -85,10 +86,12 @@ for s in subjects:
                     stc = mne.minimum_norm.apply_inverse(
                         evoked_spect, inverse, lambda2, pick_ori=estim_type,
                         method=inverse_method)
+                    stc.data = as_precision(stc.data)  # complex64 if single
                     assert stc.tstep == np.diff(evoked_spect.times[:2])
                     fname = f'{stub}-{condition}-fft'
                     fpath = os.path.join(stc_dir, out_dir, fname)
                     stc.save(fpath, ftype='h5')
+                    stamp(fpath, inputs=(evk_path, inv_path), snr=snr)
                     # compute morph for this subject
                     if not has_morph:
                         morph = mne.compute_source_morph(
@@ -101,7 +104,10 @@ for s in subjects:
                         has_morph = True
                     # morph to fsaverage & save
                     morphed_stc = morph.apply(stc)
+                    morphed_stc.data = as_precision(morphed_stc.data)
                     fname = f'{s}FSAverage-{timepoint}_camp-pskt-{condition}-fft'  # noqa E501
                     fpath = os.path.join(morph_dir, out_dir, fname)
                     print('Saving stc to %s' % fpath)
                     morphed_stc.save(fpath, ftype='h5')
+                    stamp(fpath, inputs=(evk_path, inv_path), snr=snr,
+                          smoothing_steps=smoothing_steps)
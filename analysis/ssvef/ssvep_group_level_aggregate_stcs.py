@@ -10,7 +10,11 @@ import os
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params, load_cohorts,
-                                         div_by_adj_bins)
+                                         load_inverse_params, div_by_adj_bins,
+                                         stc_store_fname, STCStore, stamp)
+
+# flags
+use_stc_store = True  # read subject STCs from ssvep_make_stc_store.py's store
 
 # config paths
 _, _, results_dir = load_paths()
@@ -27,6 +31,7 @@ groups.update(intervention_group)
 groups.update(letter_knowledge_group)
 
 # inverse params
+method = load_inverse_params()['method']
 constraints = ('free',)  # 'loose', 'fixed')
 estim_types = ('magnitude',)  # 'vector' 'normal')
 
@@ -48,6 +53,9 @@ for constr in constraints:
         # make the output directory if needed
         out_dir = f'{constr}-{estim_type}'
         os.makedirs(os.path.join(stc_dir, out_dir), exist_ok=True)
+        if use_stc_store:
+            store_fname = stc_store_fname('pskt', out_dir)
+            store = STCStore(store_fname)
         # loop over timepoints
         for timepoint in timepoints:
             print(f'    {timepoint}')
@@ -61,12 +69,18 @@ for constr in constraints:
                     # aggregate over group members
                     abs_data = 0.
                     snr_data = 0.
+                    inputs = [store_fname] if use_stc_store else list()
                     for s in members:
-                        fname = (f'{s}FSAverage-{timepoint}_camp-pskt-'
-                                 f'{condition}-fft-stc.h5')
-                        fpath = os.path.join(in_dir, out_dir, fname)
-                        stc = mne.read_source_estimate(
-                            fpath, subject='fsaverage')
+                        if use_stc_store:
+                            stc = store.get_stc(s, timepoint, condition,
+                                                method)
+                        else:
+                            fname = (f'{s}FSAverage-{timepoint}_camp-pskt-'
+                                     f'{condition}-fft-stc.h5')
+                            fpath = os.path.join(in_dir, out_dir, fname)
+                            stc = mne.read_source_estimate(
+                                fpath, subject='fsaverage')
+                            inputs.append(fpath)
                         # convert complex values to magnitude
                         abs_data += np.abs(stc.data)
                         # divide each bin by neighbors to get "SNR"
@@ -82,3 +96,4 @@ for constr in constraints:
                                  f'-{condition}-fft-{kind}')
                         fpath = os.path.join(stc_dir, out_dir, fname)
                         this_stc.save(fpath, ftype='h5')
+                        stamp(fpath, inputs=inputs, members=members)
@@ -10,7 +10,7 @@ import os
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params, load_cohorts,
-                                         div_by_adj_bins)
+                                         div_by_adj_bins, LogHistogram, stamp)
 
 # config paths
 _, _, results_dir = load_paths()
@@ -54,24 +54,29 @@ for constr in constraints:
         # loop over trial types
         for condition in conditions:
             print(f'    {condition}')
-            # load in all individual subject data first, to get colormap lims.
-            # Not very memory efficient but shouldn't be too bad
-            all_data = list()
+            # stream the individual subject data through histograms to get
+            # colormap lims (separate lims for untransformed data and SNR),
+            # one STC at a time
+            cmap_percentiles = (91, 95, 99)
+            abs_hist = LogHistogram(rel_err=1e-3)
+            snr_hist = LogHistogram(rel_err=1e-3)
+            hist_inputs = list()
             for s in groups['GrandAvg']:
                 for timepoint in timepoints:
                     fname = (f'{s}FSAverage-{timepoint}_camp-pskt-'
                              f'{condition}-fft-stc.h5')
                     fpath = os.path.join(in_dir, out_dir, fname)
                     stc = mne.read_source_estimate(fpath, subject='fsaverage')
-                    all_data.append(stc.data)
-            abs_data = np.abs(all_data)
-            snr_data = div_by_adj_bins(abs_data)
-            # compute separate lims for untransformed data and SNR
-            cmap_percentiles = (91, 95, 99)
-            abs_lims = tuple(np.percentile(abs_data, cmap_percentiles))
-            snr_lims = tuple(np.percentile(snr_data, cmap_percentiles))
+                    hist_inputs.append(fpath)
+                    abs_data = np.abs(stc.data)
+                    abs_hist.update(abs_data)
+                    snr_hist.update(div_by_adj_bins(abs_data))
+            abs_lims = tuple(abs_hist.percentile(cmap_percentiles))
+            snr_lims = tuple(snr_hist.percentile(cmap_percentiles))
+            print(f'      lims within {abs_hist.rel_err:.1%} of exact '
+                  f'percentiles: amp {abs_lims}, snr {snr_lims}')
             # clean up
-            del all_data, abs_data, snr_data
+            del stc, abs_data
 
             # unify appearance of surface/vector plots
             kwargs = (dict(surface='inflated') if estim_type != 'vector' else
@@ -89,9 +94,9 @@ for constr in constraints:
                         # load stc
                         fname = (f'{cohort}-{group}-{timepoint}_camp-pskt'
                                  f'-{condition}-fft-{kind}')
-                        fpath = os.path.join(stc_dir, out_dir, fname)
+                        stc_fpath = os.path.join(stc_dir, out_dir, fname)
                         stc = mne.read_source_estimate(
-                            fpath, subject='fsaverage')
+                            stc_fpath, subject='fsaverage')
                         # plot stc
                         clim = dict(kind='value', lims=lims)
                         brain = stc.plot(subject='fsaverage', clim=clim,
@@ -101,5 +106,7 @@ for constr in constraints:
                             fpath = os.path.join(fig_dir, out_dir,
                                                  f'{fname}-{freq:02}_Hz.png')
                             brain.save_image(fpath)
+                            stamp(fpath, inputs=[stc_fpath] + hist_inputs,
+                                  cmap_percentiles=cmap_percentiles)
                         brain.close()
                         del brain
@@ -4,20 +4,28 @@
 @author: Daniel McCloy
 
 Extract SSVEP epochs, downsample, and save to disk.
+
+By default only the data around the epochs is read and resampled (see
+``make_resampled_epochs``); set ``epoch_first = False`` to resample each whole
+recording before epoching. ``ssvep_compare_epoching.py`` checks that the two
+give the same FFT bins.
 """
 
 import os
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params, yamload,
-                                         PREPROCESS_JOINTLY)
+                                         make_resampled_epochs, fft_n_jobs,
+                                         fft_threads, profile_units,
+                                         PREPROCESS_JOINTLY, PRECISION)
 
-mne.cuda.init_cuda()
+n_jobs = fft_n_jobs()  # CUDA if available, else CPU threads
 
 # flags
 compute_psds = True
 plot_psds = True
 plot_topomaps = True
+epoch_first = True
 
 # config paths
 data_root, subjects_dir, results_dir = load_paths()
@@ -40,7 +48,7 @@ tmax = 5  # seconds. Orig trial dur was 20 s but the score func subdivided it
 event_dict = dict(ps=60, kt=70)
 
 # loop over subjects
-for s in subjects:
+for s in profile_units(subjects):
     for timepoint in timepoints:
         this_subj = os.path.join(data_root, f'{timepoint}_camp', 'twa_hp',
                                  subfolder, s)
@@ -53,10 +61,7 @@ for s in subjects:
             # load the raw file
             this_fname = f'{s}_pskt_{run:02}_{timepoint}_allclean_fil{lp_cut}_raw_sss.fif'  # noqa E501
             raw_path = os.path.join(this_subj, 'sss_pca_fif', this_fname)
-            raw = mne.io.read_raw_fif(raw_path, preload=True)
-            # downsample
-            raw, events = raw.resample(sfreq=resamp_sfreq, events=events,
-                                       n_jobs='cuda')
+            raw = mne.io.read_raw_fif(raw_path, preload=not epoch_first)
             # remove the `BAD_EOG_MANUAL` annotations (we don't want to reject
             # based on those, but do want to reject on, e.g., `BAD_ACQ_SKIP`)
             ann_to_del = list()
@@ -64,10 +69,20 @@ for s in subjects:
                 if ann['description'] == 'BAD_EOG_MANUAL':
                     ann_to_del.append(idx)
             raw.annotations.delete(ann_to_del)
-            # epoch
-            epo = mne.Epochs(raw, events, event_dict, tmin=0, tmax=tmax,
-                             baseline=None, proj=True,
-                             reject_by_annotation=True, preload=True)
+            with fft_threads(n_jobs):
+                if epoch_first:
+                    # epoch & downsample
+                    epo = make_resampled_epochs(
+                        raw, events, event_dict, tmin=0, tmax=tmax,
+                        sfreq=resamp_sfreq, n_jobs=n_jobs)
+                else:
+                    # downsample
+                    raw, events = raw.resample(sfreq=resamp_sfreq,
+                                               events=events, n_jobs=n_jobs)
+                    # epoch
+                    epo = mne.Epochs(raw, events, event_dict, tmin=0,
+                                     tmax=tmax, baseline=None, proj=True,
+                                     reject_by_annotation=True, preload=True)
             # trim last samp from epochs so our FFT bins come out nicely spaced
             epo.crop(tmax=tmax, include_tmax=False)
             assert len(epo.times) % 10 == 0
@@ -76,4 +91,5 @@ for s in subjects:
         epochs = mne.concatenate_epochs(epochs_list)
         # save epochs
         fname = f'{s}-{timepoint}_camp-pskt-epo.fif'
-        epochs.save(os.path.join(epo_dir, fname), fmt='double', overwrite=True)
+        epochs.save(os.path.join(epo_dir, fname), fmt=PRECISION,
+                    overwrite=True)
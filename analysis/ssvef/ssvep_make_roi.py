@@ -11,7 +11,8 @@ import yaml
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (
-    load_paths, load_params, load_fsaverage_src, load_inverse_params)
+    load_paths, load_params, load_fsaverage_src, load_inverse_params,
+    make_threshold_labels, BrainRenderer, stamp)
 
 
 # flags
@@ -42,10 +43,11 @@ fsaverage_src = load_fsaverage_src()
 
 # average the SNR data across pre/post timepoints
 avg_stc = None
+inputs = list()
 for timepoint in timepoints:
     fname = f'{cohort}-GrandAvg-{timepoint}_camp-pskt-all-fft-snr'
-    fpath = os.path.join(stc_dir, fname)
-    stc = mne.read_source_estimate(fpath, subject='fsaverage')
+    inputs.append(os.path.join(stc_dir, fname))
+    stc = mne.read_source_estimate(inputs[-1], subject='fsaverage')
     if avg_stc is None:
         avg_stc = stc.copy()
     else:
@@ -53,35 +55,31 @@ for timepoint in timepoints:
         avg_stc.data /= 2
 del stc
 
-bin_idx = avg_stc.time_as_index(roi_freq)
-hemi_n_verts = avg_stc.vertices[0].size
+bin_idx = avg_stc.time_as_index(roi_freq)[0]
 hz = f'{roi_freq}_Hz'
 
-# plot stc
+# define ROI labels (all thresholds at once)
 clim = dict(kind='percent', lims=(95, 99, 99.9))
-brain = avg_stc.plot(subject='fsaverage', clim=clim, initial_time=roi_freq,
-                     **brain_plot_kwargs)
-# define ROI labels
-for threshold in np.linspace(1.5, 2.5, 11):
-    labels = dict()
-    for hemi in ('lh', 'rh'):
-        data = (avg_stc.data[:hemi_n_verts] if hemi == 'lh' else
-                avg_stc.data[hemi_n_verts:])
-        verts = np.where(data[:, bin_idx] >= threshold)[0]
-        label = mne.Label(verts, hemi=hemi, subject=avg_stc.subject)
-        labels[hemi] = label.fill(fsaverage_src)
+thresholds = np.linspace(1.5, 2.5, 11)
+all_labels = make_threshold_labels(avg_stc, fsaverage_src, thresholds,
+                                   time_idx=bin_idx)
+frames = list()
+for threshold, labels in all_labels.items():
+    for hemi, label in labels.items():
         fname = f'{chosen_constraints}-{hz}-SNR_{threshold:3.1f}-{hemi}'
-        labels[hemi].save(os.path.join(roi_dir, fname))
+        label.save(os.path.join(roi_dir, fname))
     # save label verts also as YAML for easy dataframe filtering
     label_verts = {key: val.vertices.tolist() for key, val in labels.items()}
     fname = f'{hz}-SNR_{threshold:3.1f}.yaml'
     with open(os.path.join(roi_dir, fname), 'w') as outfile:
         yaml.dump(label_verts, outfile)
-    # add labels to brain
-    for hemi in ('lh', 'rh'):
-        brain.add_label(labels[hemi], borders=False, color='c')
+    # queue up an image of the labels on the brain
     fname = ('GrandAvg-pre_and_post_camp-pskt-fft-snr-'
              f'{chosen_constraints}-{hz}-thresh_{threshold:3.1f}.png')
-    fpath = os.path.join(fig_dir, fname)
-    brain.save_image(fpath)
-    brain.remove_labels()
+    frames.append(dict(img_path=os.path.join(fig_dir, fname), time=roi_freq,
+                       labels=[(labels[hemi], dict(borders=False, color='c'))
+                               for hemi in ('lh', 'rh')]))
+# plot stc with labels (one Brain for all thresholds)
+with BrainRenderer(**brain_plot_kwargs) as renderer:
+    for img_path in renderer.render(frames, stc=avg_stc, clim=clim):
+        stamp(img_path, inputs=inputs, roi_freq=roi_freq)
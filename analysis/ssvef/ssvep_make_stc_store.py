@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Collect the morphed subject frequency-domain STCs into one chunked,
+compressed store (see ``write_stc_store``), so that scripts that read many
+subjects at once make sliced reads of one file instead of opening thousands
+of small ones. Re-run after ``ssvep_fft_evk_to_stc_fsaverage.py``.
+"""
+
+from sswef_helpers.aux_functions import (load_params, load_inverse_params,
+                                         stc_store_fname, write_stc_store,
+                                         stamp)
+
+# load params
+*_, subjects, cohort = load_params(experiment='pskt')
+method = load_inverse_params()['method']
+
+# config other
+timepoints = ('pre', 'post')
+conditions = ('ps', 'kt', 'all')
+
+fname = stc_store_fname('pskt')
+write_stc_store(fname, subjects, timepoints, conditions, methods=(method,),
+                overwrite=True)
+stamp(fname)
+print(f'Wrote {fname}')
@@ -13,7 +13,8 @@ import re
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params,
-                                         load_inverse_params)
+                                         load_inverse_params, BrainRenderer,
+                                         stamp)
 import faulthandler
 faulthandler.enable()
 
@@ -53,6 +54,9 @@ vertices = stc.vertices
 stc_tstep_hz = stc.tstep  # in hertz
 stc_dur = stc.times[-1] - stc.times[0]
 
+# re-use the same (offscreen) Brain for every image
+renderer = BrainRenderer(**brain_plot_kwargs)
+
 for condition in conditions:
     print(f'{condition}')
     for freq in freqs:
@@ -89,15 +93,16 @@ for condition in conditions:
             lims = (1, 1.3, 5)  # equivalent to p=0.1, 0.05, 0.00001
             clim_dict = dict(kind='value', pos_lims=lims)
             # save the STC
-            stc.save(os.path.join(stc_dir, fname.replace('.npz', '')))
-            brain = stc.plot(smoothing_steps='nearest',
-                             clim=clim_dict,
-                             time_unit='s',
-                             time_label=f'-np.log10(p) ({freq} Hz)',
-                             initial_time=0,
-                             **brain_plot_kwargs)
+            inputs = (fpath, stc_fpath)
+            out_fpath = os.path.join(stc_dir, fname.replace('.npz', ''))
+            stc.save(out_fpath)
+            stamp(out_fpath, inputs=inputs)
             img_fname = re.sub(r'\.npz$', '.png', fname)
             img_path = os.path.join(img_dir, img_fname)
-            brain.save_image(img_path)
-            brain.close()
-            del brain
+            img_paths = renderer.render(
+                [dict(img_path=img_path, time=0)], stc=stc, clim=clim_dict,
+                data_kwargs=dict(smoothing_steps='nearest',
+                                 time_label=f'-np.log10(p) ({freq} Hz)'))
+            for img_path in img_paths:
+                stamp(img_path, inputs=inputs)
+renderer.close()
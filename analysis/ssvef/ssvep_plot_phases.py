@@ -11,7 +11,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params,
-                                         div_by_adj_bins)
+                                         div_by_adj_bins, stamp)
 
 # config paths
 data_root, subjects_dir, results_dir = load_paths()
@@ -32,8 +32,8 @@ for subj in subjects:
     for timepoint in timepoints:
         for condition in ('ps', 'kt', 'all'):
             stub = f'{subj}-{timepoint}_camp-pskt'
-            fname = f'{stub}-{condition}-fft-ave.fif'
-            evoked_spect = mne.read_evokeds(os.path.join(fft_dir, fname))
+            evk_path = os.path.join(fft_dir, f'{stub}-{condition}-fft-ave.fif')
+            evoked_spect = mne.read_evokeds(evk_path)
             assert len(evoked_spect) == 1
             evoked = evoked_spect[0]
             # convert to magnitude/phase
@@ -114,6 +114,7 @@ for subj in subjects:
             fig.suptitle(subj, size=16)
             fig.tight_layout()
             fig.subplots_adjust(top=0.95, left=0.05, hspace=0.5)
-            fname = f'{stub}-{condition}-phases.pdf'
-            fig.savefig(os.path.join(fig_dir, fname))
+            fpath = os.path.join(fig_dir, f'{stub}-{condition}-phases.pdf')
+            fig.savefig(fpath)
+            stamp(fpath, inputs=(evk_path,))
             plt.close('all')
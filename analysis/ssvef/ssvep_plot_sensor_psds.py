@@ -9,7 +9,7 @@ Load SSVEP epochs and plot PSDs / scalp topographies for each subject.
 import os
 import matplotlib.pyplot as plt
 import mne
-from sswef_helpers.aux_functions import load_paths, load_params
+from sswef_helpers.aux_functions import load_paths, load_params, stamp
 
 # flags
 plot_psd = True
@@ -36,15 +36,16 @@ for s in subjects:
     for timepoint in timepoints:
         stub = f'{s}-{timepoint}_camp-pskt'
         # load epochs (TODO: separately for "ps" and "kt" trials)
-        fname = f'{stub}-epo.fif'
-        epochs = mne.read_epochs(os.path.join(in_dir, fname), proj=True)
+        epo_path = os.path.join(in_dir, f'{stub}-epo.fif')
+        epochs = mne.read_epochs(epo_path, proj=True)
         # plot the sensor-space PSD
         if plot_psd:
             fig = epochs.plot_psd(fmin=0, fmax=20, bandwidth=bandwidth,
                                   spatial_colors=True, average=False)
             fig.axes[0].set_xticks(range(0, 21, 2))
-            fname = f'{stub}-sensor_psd.pdf'
-            fig.savefig(os.path.join(fig_dir, fname))
+            fpath = os.path.join(fig_dir, f'{stub}-sensor_psd.pdf')
+            fig.savefig(fpath)
+            stamp(fpath, inputs=(epo_path,), bandwidth=bandwidth)
         # plot topomap
         if plot_topo:
             bands = [(freq, f'{freq} Hz') for freq in (2, 4, 6, 12)]
@@ -55,6 +56,7 @@ for s in subjects:
                                         axes=row)
             fig.suptitle(f'Power-normalized field maps ({bandwidth} Hz '
                          'multitaper bandwidth)\ntop: mags; bottom: grads')
-            fname = f'{stub}-psd_topomap.pdf'
-            fig.savefig(os.path.join(topo_dir, fname))
+            fpath = os.path.join(topo_dir, f'{stub}-psd_topomap.pdf')
+            fig.savefig(fpath)
+            stamp(fpath, inputs=(epo_path,), bandwidth=bandwidth)
         plt.close('all')
@@ -10,7 +10,7 @@ import os
 import mne
 from sswef_helpers.aux_functions import (
     load_paths, load_params, load_inverse_params, load_fsaverage_src,
-    get_dataframe_from_label, plot_label, plot_label_and_timeseries)
+    get_dataframe_from_label, plot_label, plot_label_and_timeseries, stamp)
 
 # load params
 brain_plot_kwargs, _, subjects, cohort = load_params(experiment='pskt')
@@ -61,7 +61,9 @@ df = get_dataframe_from_label(label, fsaverage_src, methods=methods,
                               conditions=conditions, unit='freq',
                               experiment='pskt')
 df['roi'] = region
-df.to_csv(os.path.join(spectrum_dir, f'roi-{region}-frequencies-long.csv'))
+csv_fpath = os.path.join(spectrum_dir, f'roi-{region}-frequencies-long.csv')
+df.to_csv(csv_fpath)
+stamp(csv_fpath)
 
 # plot
 for groups in group_lists:
@@ -81,3 +83,4 @@ for groups in group_lists:
                                   cluster=None,
                                   lineplot_kwargs=lineplot_kwargs,
                                   unit='freq')
+        stamp(img_path)
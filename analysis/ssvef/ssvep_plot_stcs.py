@@ -10,7 +10,7 @@ import os
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params,
-                                         div_by_adj_bins)
+                                         div_by_adj_bins, stamp)
 
 # flags
 mne.cuda.init_cuda()
@@ -71,4 +71,6 @@ for timepoint in timepoints:
                             brain.set_time(freq)
                             bname = f'{fname}-{kind}-{freq:02}_Hz.png'
                             brain.save_image(os.path.join(out_dir, bname))
+                            stamp(os.path.join(out_dir, bname),
+                                  inputs=(fpath,))
                         del brain
@@ -10,7 +10,7 @@ import os
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params,
-                                         load_inverse_params)
+                                         load_inverse_params, stamp)
 
 # flags
 save_movie = False
@@ -47,7 +47,8 @@ for condition in conditions:
     print(f'Plotting t-vals for {condition}')
     # load an STC as a template
     fname = f'{cohort}-GrandAvg-pre_camp-pskt-{condition}-fft-amp'
-    stc = mne.read_source_estimate(os.path.join(stc_dir, fname))
+    stc_fpath = os.path.join(stc_dir, fname)
+    stc = mne.read_source_estimate(stc_fpath)
 
     for prefix in (precamp_fname,
                    postcamp_fname,
@@ -57,7 +58,8 @@ for condition in conditions:
                    intervention_fname):
         suffix = 'grandavg' if prefix.startswith('GrandAvg') else 'tvals'
         fname = f'{prefix}-{condition}-{suffix}.npy'
-        tvals = np.load(os.path.join(tval_dir, fname))
+        inputs = (stc_fpath, os.path.join(tval_dir, fname))
+        tvals = np.load(inputs[1])
         stc.data = tvals
         # sanity check against the group_level_aggregate_stcs step
         if prefix.startswith('GrandAvg'):
@@ -90,16 +92,19 @@ for condition in conditions:
                 img_fname = f'{prefix}-{condition}-{freq:04.1f}_Hz.png'
                 img_path = os.path.join(movie_dir, img_fname)
                 brain.save_image(img_path)
+                stamp(img_path, inputs=inputs)
                 # also save to main directory
                 if freq in freqs_of_interest:
                     img_fname = f'{prefix}-{condition}-{freq:04.1f}_Hz.png'
                     img_path = os.path.join(fig_dir, img_fname)
                     brain.save_image(img_path)
+                    stamp(img_path, inputs=inputs)
         else:
             for freq in freqs_of_interest:
                 brain.set_time(freq)
                 img_fname = f'{prefix}-{condition}-{freq:04.1f}_Hz.png'
                 img_path = os.path.join(fig_dir, img_fname)
                 brain.save_image(img_path)
+                stamp(img_path, inputs=inputs)
         brain.close()
         del brain
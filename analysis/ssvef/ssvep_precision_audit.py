@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Daniel McCloy
+
+Compare the stats of the single-precision pipeline against double precision.
+
+Run the pipeline once as usual and once with ``PREK_PRECISION=single`` (which
+writes float32/complex64 files to a separate results folder), then run this
+script. For every t-value map and cluster file it reports the largest
+deviation of the single-precision t-values (and cluster p-values) from the
+double-precision ones, how many vertices change significance, and the disk
+space used by each version of the group-level stats inputs.
+"""
+
+import os
+from glob import glob
+import numpy as np
+import pandas as pd
+from sswef_helpers.aux_functions import (load_paths, load_inverse_params,
+                                         stamp)
+
+# config paths
+inverse_params = load_inverse_params()
+chosen_constraints = ('{orientation_constraint}-{estimate_type}'
+                      ).format_map(inverse_params)
+precisions = ('double', 'single')
+group_dirs = {precision: os.path.join(load_paths(precision)[2], 'pskt',
+                                      'group-level')
+              for precision in precisions}
+
+# config other
+alpha = 0.05
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(fname)
+               for fname in glob(os.path.join(path, '*')))
+
+
+def _load(precision, kind, fname):
+    fpath = os.path.join(group_dirs[precision], kind, chosen_constraints,
+                         fname)
+    if fname.endswith('.npy'):
+        return dict(tvals=np.load(fpath))
+    with np.load(fpath, allow_pickle=True) as npz:
+        return dict(tvals=npz['tvals'], pvals=npz['pvals'])
+
+
+rows = list()
+for kind, pattern in (('tvals', '*-tvals.npy'), ('cluster', '*.npz')):
+    ref_dir = os.path.join(group_dirs['double'], kind, chosen_constraints)
+    for fpath in sorted(glob(os.path.join(ref_dir, pattern))):
+        fname = os.path.basename(fpath)
+        ref = _load('double', kind, fname)
+        try:
+            new = _load('single', kind, fname)
+        except FileNotFoundError:
+            print(f'{fname}: no single-precision version, skipping')
+            continue
+        if not ref['tvals'].size:
+            continue
+        row = dict(kind=kind, fname=fname)
+        tval_err = np.abs(new['tvals'].astype(np.float64) - ref['tvals'])
+        row['max_tval_err'] = tval_err.max()
+        row['max_tval_rel_err'] = tval_err.max() / np.abs(ref['tvals']).max()
+        if 'pvals' in ref:
+            # with TFCE there is one "cluster" (& p-value) per vertex
+            row['max_pval_err'] = np.abs(new['pvals'] - ref['pvals']).max()
+            row['n_sig_changed'] = int(((new['pvals'] < alpha) !=
+                                        (ref['pvals'] < alpha)).sum())
+        rows.append(row)
+
+df = pd.DataFrame(rows)
+out_fname = os.path.join(group_dirs['single'], 'precision-audit.csv')
+df.to_csv(out_fname, index=False)
+stamp(out_fname, alpha=alpha)
+with pd.option_context('display.width', 200, 'display.max_rows', None):
+    print(df.to_string(index=False, float_format='{:.2e}'.format))
+
+# disk space of the signal/noise/SNR arrays that the stats are run on
+sizes = {precision: _dir_size(os.path.join(group_dirs[precision], 'npz',
+                                           chosen_constraints))
+         for precision in precisions}
+print('\n'.join(f'{precision:>6} npz: {size / 1e9:.2f} GB'
+                for precision, size in sizes.items()))
+worst = {col: df[col].max() if col in df else np.nan
+         for col in ('max_tval_err', 'max_pval_err')}
+print(f'worst t-value error {worst["max_tval_err"]:.2e}; worst cluster '
+      f'p-value error {worst["max_pval_err"]:.2e}; results saved to '
+      f'{out_fname}')
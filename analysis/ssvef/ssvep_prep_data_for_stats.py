@@ -10,7 +10,11 @@ import os
 import numpy as np
 import mne
 from sswef_helpers.aux_functions import (
-    load_paths, load_params, div_by_adj_bins, load_inverse_params)
+    load_paths, load_params, div_by_adj_bins, load_inverse_params,
+    stc_store_fname, STCStore, stamp)
+
+# flags
+use_stc_store = True  # read subject STCs from ssvep_make_stc_store.py's store
 
 # load params
 brain_plot_kwargs, _, subjects, cohort = load_params(experiment='pskt')
@@ -31,24 +35,34 @@ for _dir in (npz_dir,):
 # config other
 timepoints = ('pre', 'post')
 conditions = ('ps', 'kt', 'all')
+method = inverse_params['method']
+store_fname = stc_store_fname('pskt')
+store = STCStore(store_fname) if use_stc_store else None
 
 # load in all the data
 for condition in conditions:
     data_dict = dict()
     noise_dict = dict()
     snr_dict = dict()
+    inputs = [store_fname] if use_stc_store else list()
     for s in subjects:
         print(f'Working on subject {s}.')
         for timepoint in timepoints:
-            stub = f'{s}FSAverage-{timepoint}_camp-pskt-{condition}-fft'
-            stc = mne.read_source_estimate(
-                os.path.join(in_dir, f'{stub}-stc.h5'), subject='fsaverage')
+            if use_stc_store:
+                stc = store.get_stc(s, timepoint, condition, method)
+            else:
+                stub = f'{s}FSAverage-{timepoint}_camp-pskt-{condition}-fft'
+                inputs.append(os.path.join(in_dir, f'{stub}-stc.h5'))
+                stc = mne.read_source_estimate(inputs[-1],
+                                               subject='fsaverage')
             # compute magnitude (signal) & avg of adjacent bins on either side
             # (noise), & save for later group comparisons
             data_dict[f'{s}-{timepoint}'] = np.abs(stc.data)
             noise_dict[f'{s}-{timepoint}'] = div_by_adj_bins(
                 np.abs(stc.data), return_noise=True)
             snr_dict[f'{s}-{timepoint}'] = div_by_adj_bins(np.abs(stc.data))
-    np.savez(os.path.join(npz_dir, f'data-{condition}.npz'), **data_dict)
-    np.savez(os.path.join(npz_dir, f'noise-{condition}.npz'), **noise_dict)
-    np.savez(os.path.join(npz_dir, f'snr-{condition}.npz'), **snr_dict)
+    for kind, _dict in dict(data=data_dict, noise=noise_dict,
+                            snr=snr_dict).items():
+        fpath = os.path.join(npz_dir, f'{kind}-{condition}.npz')
+        np.savez(fpath, **_dict)
+        stamp(fpath, inputs=inputs)
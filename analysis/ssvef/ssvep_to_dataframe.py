@@ -11,7 +11,7 @@ import numpy as np
 import pandas as pd
 import mne
 from sswef_helpers.aux_functions import (load_paths, load_params,
-                                         load_inverse_params)
+                                         load_inverse_params, stamp)
 
 # load params
 _, _, subjects, cohort = load_params(experiment='pskt')
@@ -36,14 +36,15 @@ conditions = ('ps', 'kt', 'all')
 for condition in conditions:
     # container
     df = pd.DataFrame()
+    inputs = list()
     # loop over timepoints
     for timepoint in timepoints:
         # loop over cohort groups
         for s in subjects:
             fname = (f'{s}FSAverage-{timepoint}_camp-pskt-'
                      f'{condition}-fft-stc.h5')
-            stc = mne.read_source_estimate(os.path.join(in_dir, fname),
-                                           subject='fsaverage')
+            inputs.append(os.path.join(in_dir, fname))
+            stc = mne.read_source_estimate(inputs[-1], subject='fsaverage')
             # convert complex values to magnitude
             stc.data = np.abs(stc.data)
             # convert to dataframe
@@ -58,3 +59,4 @@ for condition in conditions:
     fname = (f'all_subjects-fsaverage-{condition}-{chosen_constraints}-'
              'freq_domain-stc.csv')
     df.to_csv(os.path.join(out_dir, fname), index=False)
+    stamp(os.path.join(out_dir, fname), inputs=inputs)
@@ -1,79 +1,37 @@
 #!/usr/bin/env python
 
+import os
 import yaml
 
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 
 from h5io import write_hdf5
 from mne.stats import permutation_cluster_test
+from sswef_helpers.aux_functions import (load_paths, load_roi_contrast_arrays,
+                                         stamp)
 
 rng = np.random.default_rng(seed=15485863)  # the one millionth prime
 
 rois = ('CoS_lh', 'CoS_rh', 'mFus_lh', 'mFus_rh', 'pFus_lh', 'pFus_rh',
         'IOS_IOG_lh', 'pOTS_lh', 'IOS_IOG_pOTS_lh')
 
-# prepare to load raw data
-dtypes = dict(
-    time=float,
-    value=float,
-    roi=pd.StringDtype(),
-    subj=pd.StringDtype(),
-    method=pd.StringDtype(),
-    pretest=pd.CategoricalDtype(categories=['lower', 'upper'], ordered=True),
-    timepoint=pd.CategoricalDtype(categories=['pre', 'post'], ordered=True),
-    condition=pd.CategoricalDtype(categories=['words', 'faces', 'cars']),
-    intervention=pd.CategoricalDtype(categories=['letter', 'language']),
-)
+# written by erp/prek_extract_ROI_time_courses.py
+_, _, results_dir = load_paths()
+timeseries_store = os.path.join(results_dir, 'roi', 'time-series',
+                                'roi-timeseries-long')
 cluster_results = dict()
+inputs = dict()
 
 for roi in rois:
-    # load raw data
-    fname = f'roi-MPM_{roi}-timeseries-long.csv'
-    rawdata = pd.read_csv(fname, index_col=0, dtype=dtypes)
-
-    # filter to just what we want
-    modeldata = rawdata.loc[
-        (rawdata['roi'] == f'MPM_{roi}') &
-        (rawdata['method'] == 'dSPM') &  # drop "MNE"
-        (rawdata['condition'].notna())  # drops "aliens"
-    ]
-
-    # simplify to look at the interactions we want
-    modeldata = modeldata.pivot(
-        columns='timepoint', values='value',
-        index=['time', 'condition', 'subj', 'intervention']
-    )
-    modeldata['post_minus_pre'] = modeldata['post'] - modeldata['pre']
-    modeldata = (modeldata.drop(['pre', 'post'], axis='columns')
-                          .reset_index('condition')
-                          .pivot(columns='condition', values='post_minus_pre')
-                          .rename_axis(None, axis='columns'))
-    modeldata['words_minus_faces'] = modeldata['words'] - modeldata['faces']
-    modeldata['words_minus_cars'] = modeldata['words'] - modeldata['cars']
-    modeldata = (modeldata.drop(['words', 'faces', 'cars'], axis='columns')
-                          .reset_index()
-                          .sort_values(by=['intervention', 'subj', 'time'])
-                          .reset_index(drop=True))
-
-    # extract the arrays
-    arrays = dict()
-    contrasts = ('cars', 'faces')
-    for contrast in contrasts:
-        keep = f'words_minus_{contrast}'
-        drop = f'words_minus_{list(set(contrasts) - set([contrast]))[0]}'
-        arrays[keep] = dict()
-        for intervention in ('letter', 'language'):
-            arrays[keep][intervention] = dict()
-            df = (modeldata[modeldata['intervention'] == intervention]
-                  .drop(['intervention', drop], axis='columns')
-                  .pivot(columns='time', values=keep, index='subj')
-                  .rename_axis(None, axis='columns'))
-            arrays[keep][intervention]['subjs'] = df.index.to_list()
-            # add extra dimension for "vertex/channel"
-            arrays[keep][intervention]['data'] = df.to_numpy()[..., np.newaxis]
-    times = df.columns.to_numpy()
+    # load post-minus-pre, words-minus-(cars|faces) subj × time arrays
+    # (drops "MNE" and "aliens")
+    arrays, times = load_roi_contrast_arrays(
+        timeseries_store, roi=f'MPM_{roi}', method='dSPM',
+        baseline='words', contrasts=('cars', 'faces'),
+        groups=('letter', 'language'))
+    inputs[roi] = [os.path.join(timeseries_store, f'roi=MPM_{roi}',
+                                'method=dSPM')]
 
     # clustering setup
     n_jobs = 6
@@ -150,5 +108,9 @@ for roi in rois:
     fig.subplots_adjust(left=0.15, right=0.95, hspace=0.4, top=0.88)
     fig.suptitle(f'MPM_{roi}')
     fig.savefig(f'cluster-results-{roi}.png')
+    stamp(f'cluster-results-{roi}.png', inputs=inputs[roi],
+          n_permutations=n_permutations, threshold=threshold)
 # save all results
 write_hdf5('cluster-results.h5', cluster_results, overwrite=True)
+stamp('cluster-results.h5', inputs=sum(inputs.values(), []),
+      n_permutations=n_permutations, threshold=threshold)
@@ -0,0 +1,25 @@
+"""Shared set-up for the benchmarks (see ``asv.conf.json``)."""
+
+import os
+from importlib.util import find_spec
+
+
+def project_dir():
+    """Root of the checkout being benchmarked.
+
+    asv installs each commit in editable mode, so that commit's analysis
+    scripts sit next to its ``sswef_helpers``; otherwise (e.g. ``asv run -E
+    existing`` with a non-editable install) use this checkout.
+    """
+    spec = find_spec('sswef_helpers')  # without importing it (nor params)
+    root = os.path.dirname(os.path.dirname(spec.origin))
+    if not os.path.isdir(os.path.join(root, 'analysis')):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return root
+
+
+def use_params(param_dir=None):
+    """Point the helpers at a params folder; call before importing them."""
+    if param_dir is None:
+        param_dir = os.path.join(project_dir(), 'params')
+    os.environ['PREK_PARAMS'] = param_dir
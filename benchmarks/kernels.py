@@ -0,0 +1,127 @@
+"""Benchmarks of the helpers that the pipeline spends its time in.
+
+Array sizes are those of the real data: fsaverage ico-5 source spaces (20484
+vertices), 48 subjects, and the 211 frequency bins of 5 s epochs at 84 Hz.
+"""
+
+import numpy as np
+from .common import use_params
+
+n_vertices = 20484
+n_subjects = 48
+n_bins = 211
+
+
+class DivByAdjBins:
+    params = (['float64', 'float32'],)
+    param_names = ['dtype']
+
+    def setup(self, dtype):
+        use_params()
+        from sswef_helpers.aux_functions import div_by_adj_bins
+        self.div_by_adj_bins = div_by_adj_bins
+        rng = np.random.RandomState(0)
+        self.data = np.abs(rng.randn(n_vertices, n_bins)).astype(dtype)
+
+    def time_div_by_adj_bins(self, dtype):
+        self.div_by_adj_bins(self.data)
+
+    def time_noise(self, dtype):
+        self.div_by_adj_bins(self.data, return_noise=True)
+
+
+class SubdivideEpochs:
+    params = ([2, 4, 5],)
+    param_names = ['divisions']
+
+    def setup(self, divisions):
+        use_params()
+        import mne
+        from sswef_helpers.aux_functions import subdivide_epochs
+        self.subdivide_epochs = subdivide_epochs
+        rng = np.random.RandomState(0)
+        info = mne.create_info(306, 200., 'mag')
+        self.epochs = mne.EpochsArray(1e-13 * rng.randn(24, 306, 1000), info,
+                                      verbose=False)
+
+    def time_subdivide_epochs(self, divisions):
+        self.subdivide_epochs(self.epochs, divisions)
+
+
+class HatTTests:
+    """t-tests with the "hat" variance adjustment, as used for clustering."""
+    params = (['float64', 'float32'],)
+    param_names = ['dtype']
+
+    def setup(self, dtype):
+        use_params()
+        from sswef_helpers.aux_functions import (ttest_1samp_no_p,
+                                                 ttest_ind_no_p)
+        self.ttest_1samp_no_p = ttest_1samp_no_p
+        self.ttest_ind_no_p = ttest_ind_no_p
+        rng = np.random.RandomState(0)
+        self.X = rng.randn(n_subjects, n_vertices).astype(dtype)
+
+    def time_ttest_1samp(self, dtype):
+        self.ttest_1samp_no_p(self.X, sigma=1e-3)
+
+    def time_ttest_ind(self, dtype):
+        half = n_subjects // 2
+        self.ttest_ind_no_p(self.X[:half], self.X[half:], sigma=1e-3)
+
+
+class PrepClusterStats:
+    """Output of a TFCE permutation test (one "cluster" per vertex)."""
+
+    def setup(self):
+        use_params()
+        from sswef_helpers.aux_functions import prep_cluster_stats
+        self.prep_cluster_stats = prep_cluster_stats
+        rng = np.random.RandomState(0)
+        clusters = [(np.array([idx]),) for idx in range(n_vertices)]
+        self.cluster_results = (rng.randn(n_vertices), clusters,
+                                rng.rand(n_vertices), rng.randn(1024))
+
+    def time_prep_cluster_stats(self):
+        self.prep_cluster_stats(self.cluster_results)
+
+
+class Events:
+    """Scoring events from stim channel transitions (as ``prek_score``)."""
+    params = ([6, 600],)
+    param_names = ['n_trials']
+
+    def setup(self, n_trials):
+        use_params()
+        from sswef_helpers.aux_functions import (find_events_from_steps,
+                                                 split_events)
+        self.find_events_from_steps = find_events_from_steps
+        self.split_events = split_events
+        rng = np.random.RandomState(0)
+        sfreq = 1000.
+        # ERP run: word/face/car/alien images, button presses after aliens
+        onsets = np.cumsum(rng.randint(1200, 1600, 100 * n_trials))
+        codes = rng.choice([1, 2, 3, 4], onsets.size)
+        presses = onsets[codes == 4] + 500
+        steps = list()
+        for samples, values in ((onsets, codes),
+                                (presses, np.full(presses.size, 16))):
+            steps += [np.c_[samples, np.zeros_like(values), values],
+                      np.c_[samples + 10, values, np.zeros_like(values)]]
+        steps = np.concatenate(steps)
+        self.stim_steps = dict(steps=[steps[np.argsort(steps[:, 0])]],
+                               initial=[0], ch_names=['STI101'],
+                               first_samp=0, sfreq=sfreq)
+        self.sfreq = sfreq
+        self.pskt_events = np.c_[np.arange(n_trials) * 30000,
+                                 np.zeros(n_trials, int),
+                                 np.resize([60, 70], n_trials)]
+
+    def time_find_events_from_steps(self, n_trials):
+        for mask in (240, 4, 3):
+            self.find_events_from_steps(self.stim_steps, shortest_event=1,
+                                        mask=mask)
+
+    def time_split_events(self, n_trials):
+        self.split_events(self.pskt_events, self.sfreq, 20, 5,
+                          event_ids=(60, 70))
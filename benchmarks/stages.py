@@ -0,0 +1,139 @@
+"""Benchmarks of whole pipeline stages, on a synthetic dataset.
+
+``setup_cache`` simulates 6 subjects (``analysis/make_synthetic_dataset.py``)
+and runs the stages below on them, one script after another, with
+``PREK_PROFILE`` on; the stages' wall time, CPU time and peak memory are
+then read from the profiling records. Label extraction and one clustering
+contrast (with fewer permutations) are timed on the stages' outputs.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+from .common import project_dir, use_params
+
+stages = ('ssvef/ssvep_make_epochs',
+          'ssvef/ssvep_epochs_to_evoked_fft',
+          'ssvef/ssvep_fft_evk_to_stc_fsaverage',
+          'ssvef/ssvep_make_stc_store',
+          'ssvef/ssvep_group_level_aggregate_stcs',
+          'ssvef/ssvep_prep_data_for_stats',
+          'erp/prek_make_stcs',
+          'erp/prek_make_stc_store')
+dataset = dict(n_subjects=6, n_channels=102, ico=5, duration=130.)
+
+
+class _SyntheticPipeline:
+    timeout = 3600
+
+    def setup_cache(self):
+        # the working directory is kept until the benchmarks have run
+        out_dir = os.path.abspath('synthetic')
+        analysis_dir = os.path.join(project_dir(), 'analysis')
+        sys.path.insert(0, analysis_dir)
+        from make_synthetic_dataset import make_dataset
+        make_dataset(out_dir, **dataset)
+        profile = os.path.join(out_dir, 'profile.jsonl')
+        env = dict(os.environ, PREK_PARAMS=os.path.join(out_dir, 'params'),
+                   PREK_PROFILE=profile, MPL_BACKEND='Agg')
+        for stage in stages:
+            folder, script = os.path.split(stage)
+            subprocess.run([sys.executable, f'{script}.py'], env=env,
+                           cwd=os.path.join(analysis_dir, folder),
+                           stdout=subprocess.DEVNULL, check=True)
+        with open(profile, 'r') as f:
+            records = [json.loads(line) for line in f]
+        records = {record['stage']: record for record in records
+                   if record['kind'] == 'stage'}
+        return dict(out_dir=out_dir, records=records)
+
+    def _use_dataset(self, cache):
+        use_params(os.path.join(cache['out_dir'], 'params'))
+
+
+class Stages(_SyntheticPipeline):
+    params = ([os.path.basename(stage) for stage in stages],)
+    param_names = ['stage']
+
+    def track_wall_time(self, cache, stage):
+        return cache['records'][stage]['wall_s']
+    track_wall_time.unit = 'seconds'
+
+    def track_cpu_time(self, cache, stage):
+        record = cache['records'][stage]
+        return sum(record[key] for key in ('cpu_user_s', 'cpu_sys_s',
+                                           'cpu_children_s'))
+    track_cpu_time.unit = 'seconds'
+
+    def track_peak_memory(self, cache, stage):
+        return cache['records'][stage]['peak_rss'] / 1e6
+    track_peak_memory.unit = 'MB'
+
+
+class LabelExtraction(_SyntheticPipeline):
+    """ERP time courses in early visual cortex (as for the ROI analyses)."""
+    params = ([False, True],)
+    param_names = ['use_stc_store']
+
+    def setup(self, cache, use_stc_store):
+        self._use_dataset(cache)
+        import mne
+        from sswef_helpers.aux_functions import (
+            load_paths, load_fsaverage_src, stc_store_fname)
+        _, subjects_dir, _ = load_paths()
+        labels = mne.read_labels_from_annot(
+            'fsaverage', 'HCPMMP1_combined', regexp='Early Visual Cortex',
+            subjects_dir=subjects_dir, verbose=False)
+        self.label = sum(labels[1:], labels[0])
+        self.src = load_fsaverage_src()
+        self.store = stc_store_fname('erp') if use_stc_store else None
+
+    def time_get_dataframe_from_label(self, cache, use_stc_store):
+        from sswef_helpers.aux_functions import get_dataframe_from_label
+        get_dataframe_from_label(self.label, self.src, methods=('dSPM',),
+                                 experiment='erp', store=self.store)
+
+
+class ClusterContrast(_SyntheticPipeline):
+    """LetterVsLanguageIntervention at 2 Hz, as in ``ssvep_clustering.py``
+    (TFCE, hat-adjusted t-test), with 100 permutations instead of 10000."""
+
+    def setup(self, cache):
+        self._use_dataset(cache)
+        import mne
+        from sswef_helpers.aux_functions import (
+            load_paths, load_params, load_cohorts, load_inverse_params,
+            load_fsaverage_src)
+        _, _, results_dir = load_paths()
+        constraints = ('{orientation_constraint}-{estimate_type}'
+                       ).format_map(load_inverse_params())
+        npz_dir = os.path.join(results_dir, 'pskt', 'group-level', 'npz',
+                               constraints)
+        with np.load(os.path.join(npz_dir, 'snr-all.npz')) as npz:
+            snr = dict(npz)
+        intervention_group, _ = load_cohorts(experiment='pskt')
+        # frequency bins, from a group-level STC (as ssvep_clustering.py)
+        *_, cohort = load_params(experiment='pskt')
+        stc = mne.read_source_estimate(os.path.join(
+            results_dir, 'pskt', 'group-level', 'stc', constraints,
+            f'{cohort}-GrandAvg-post_camp-pskt-all-fft-amp-stc.h5'))
+        bin_idx = np.argmin(np.abs(stc.times - 2))
+        self.X = [np.array([snr[f'{s}-post'] - snr[f'{s}-pre']
+                            for s in intervention_group[group]])[..., bin_idx]
+                  for group in ('LetterIntervention', 'LanguageIntervention')]
+        self.adjacency = mne.spatial_src_adjacency(load_fsaverage_src(),
+                                                   verbose=False)
+
+    def time_tfce_contrast(self, cache):
+        from functools import partial
+        from mne.stats import permutation_cluster_test
+        from sswef_helpers.aux_functions import (ttest_ind_no_p,
+                                                 prep_cluster_stats)
+        results = permutation_cluster_test(
+            self.X, stat_fun=partial(ttest_ind_no_p, sigma=0.001),
+            threshold=dict(start=0, step=0.2), adjacency=self.adjacency,
+            n_permutations=100, seed=15485863, buffer_size=None,
+            step_down_p=0.05, out_type='indices', verbose=False)
+        prep_cluster_stats(results)
@@ -0,0 +1,87 @@
+"""
+==========================
+Benchmark frame pacing without a display
+==========================
+Run a presentation-like loop against a stand-in controller and compare the
+old busy-wait pacing with FramePacer: how late each frame is released and how
+much CPU the wait burns.
+
+    python bench_frame_pacer.py --frames 600 --rate 60 --work 0.002
+"""
+import argparse
+import os
+
+import numpy as np
+
+from frame_pacer import FramePacer, clock
+
+
+class _NullController(object):
+    """Just enough of an ExperimentController for pacing."""
+
+    def check_force_quit(self):
+        pass
+
+
+def _work(duration):
+    # stand-in for the drawing/logging done each frame
+    end = clock() + duration
+    while clock() < end:
+        pass
+
+
+def run_spin(ec, n_frames, frame_rate, work):
+    """The original busy-wait loop from r21_ssvep_blocked.py."""
+    fr = 1. / frame_rate
+    late = np.empty(n_frames)
+    t0 = clock()
+    for frame in range(n_frames):
+        _work(work)
+        while clock() - t0 < (frame + 1) * fr - fr / 60:
+            ec.check_force_quit()
+        late[frame] = clock() - (t0 + (frame + 1) * fr - fr / 60)
+    return late
+
+
+def run_pacer(ec, n_frames, frame_rate, work):
+    """The same loop paced by FramePacer."""
+    fr = 1. / frame_rate
+    pacer = FramePacer(frame_rate, lead=fr / 60, poll=ec.check_force_quit)
+    late = np.empty(n_frames)
+    pacer.start()
+    for frame in range(n_frames):
+        _work(work)
+        late[frame] = pacer.wait(frame)
+    return late
+
+
+def benchmark(n_frames=600, frame_rate=60., work=2e-3):
+    """Return lateness stats (s) and CPU use (fraction of a core) per method."""
+    ec = _NullController()
+    results = dict()
+    for name, func in (('spin', run_spin), ('pacer', run_pacer)):
+        cpu = sum(os.times()[:2])
+        wall = clock()
+        late = func(ec, n_frames, frame_rate, work)
+        wall = clock() - wall
+        cpu = sum(os.times()[:2]) - cpu
+        results[name] = dict(median=np.median(late),
+                             p99=np.percentile(late, 99),
+                             max=late.max(), cpu=cpu / wall)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark frame pacing without a display.')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--rate', type=float, default=60.)
+    parser.add_argument('--work', type=float, default=2e-3,
+                        help='simulated work per frame (s)')
+    args = parser.parse_args()
+    results = benchmark(args.frames, args.rate, args.work)
+    for name in ('spin', 'pacer'):
+        res = results[name]
+        print('%6s: late median %6.1f us, p99 %6.1f us, max %7.1f us; '
+              'CPU %3.0f%%' % (name, 1e6 * res['median'], 1e6 * res['p99'],
+                               1e6 * res['max'], 100 * res['cpu']))
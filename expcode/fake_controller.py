@@ -0,0 +1,294 @@
+"""
+==========================
+Headless stand-in for the expyfun ExperimentController
+==========================
+FakeExperimentController (and the visual classes below) implement the parts
+of expyfun that the r21 scripts use, without a display. Flips wait for the
+next simulated vertical retrace at a configurable refresh rate, and every
+call is recorded with its timestamp so that schedules, image loading and
+per-frame loop overhead can be benchmarked anywhere.
+
+Run any of the r21 scripts headlessly with
+
+    python fake_controller.py r21_ssvep_blocked.py --rate 60 --fast \\
+        --profile r21.prof
+
+which puts fake ``expyfun``, ``expyfun.visual`` and ``expyfun.io`` modules
+in place before running the script. Away from the stimulus PC the scripts
+load their images from ``~/git/SSWEF/stim``.
+"""
+from os import path as op
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+from frame_pacer import clock
+
+
+class FakeExperimentController(object):
+    """Display-free ExperimentController that records every call.
+
+    Parameters
+    ----------
+
+    exp_name : str
+        Experiment name (used for the data file name).
+    refresh_rate : float
+        Simulated screen refresh rate (Hz).
+    vsync : bool
+        If True, ``flip`` blocks until the next simulated retrace like a real
+        display; if False it returns immediately.
+    skip_waits : bool
+        If True, ``wait_secs`` returns immediately.
+    data_dir : str | None
+        Where to write the data file; defaults to a temporary directory.
+    session : str
+        Session number reported to the script.
+    **kwargs : dict
+        Other ExperimentController arguments (ignored).
+
+    Attributes
+    ----------
+
+    calls : list of tuple
+        ``(method, timestamp, args)`` for every call made, in order.
+    """
+
+    defaults = dict(refresh_rate=60., vsync=True, skip_waits=False,
+                    data_dir=None, session='1')
+
+    def __init__(self, exp_name, **kwargs):
+        opts = dict(self.defaults)
+        opts.update((key, kwargs.pop(key)) for key in list(kwargs)
+                    if key in self.defaults)
+        self.exp_name = exp_name
+        self.refresh_rate = float(opts['refresh_rate'])
+        self.vsync = opts['vsync']
+        self.skip_waits = opts['skip_waits']
+        self.session = opts['session']
+        data_dir = opts['data_dir']
+        if data_dir is None:
+            data_dir = tempfile.mkdtemp(prefix='fake_ec_')
+        self.data_fname = op.join(data_dir, '%s_%s_%s.tab' % (
+            exp_name, self.session, time.strftime('%Y-%m-%d %H_%M_%S')))
+        self.calls = []
+        self._t0 = clock()
+        self._data_file = open(self.data_fname, 'w')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getattr__(self, name):
+        # anything else the scripts call is accepted and recorded
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def _record(*args, **kwargs):
+            self._record(name, args)
+        return _record
+
+    def _record(self, name, args=()):
+        self.calls.append((name, self.get_time(), args))
+
+    def close(self):
+        """Close the data file."""
+        if not self._data_file.closed:
+            self._data_file.close()
+
+    def get_time(self):
+        """Time (s) since the controller was created."""
+        return clock() - self._t0
+
+    current_time = property(get_time)
+
+    def estimate_screen_fs(self, n_rep=10):
+        self._record('estimate_screen_fs', (n_rep,))
+        return self.refresh_rate
+
+    def flip(self, when=None):
+        """Wait for the next simulated retrace and return its time."""
+        if when is not None:
+            self.wait_until(when)
+        now = self.get_time()
+        if self.vsync:
+            rate = self.refresh_rate
+            flip_time = (np.floor(now * rate) + 1) / rate
+            while self.get_time() < flip_time:
+                pass
+        else:
+            flip_time = now
+        self._record('flip', (flip_time,))
+        self.write_data_line('flip', flip_time)
+        return flip_time
+
+    def wait_secs(self, secs):
+        self._record('wait_secs', (secs,))
+        if not self.skip_waits:
+            time.sleep(secs)
+
+    def wait_until(self, timestamp):
+        self._record('wait_until', (timestamp,))
+        if not self.skip_waits:
+            time.sleep(max(timestamp - self.get_time(), 0))
+
+    def stamp_triggers(self, ids, check='binary', wait_for_last=True):
+        """Check trigger values the way expyfun does, then record them."""
+        if check not in ('int4', 'binary'):
+            raise ValueError('Check must be either "int4" or "binary"')
+        ids = [ids] if not isinstance(ids, list) else ids
+        if not all(isinstance(id_, int) and 1 <= id_ <= 15 for id_ in ids):
+            raise ValueError('ids must all be integers between 1 and 15')
+        if check == 'binary' and not all(id_ in (1, 2, 4, 8) for id_ in ids):
+            raise ValueError('with check="binary", ids must all be 1, 2, '
+                             '4, or 8: %s' % (ids,))
+        self._record('stamp_triggers', tuple(ids))
+
+    def write_data_line(self, event_type, value=None, timestamp=None):
+        if timestamp is None:
+            timestamp = self.get_time()
+        self._record('write_data_line', (event_type, value))
+        self._data_file.write('%s\t%s\t%s\n' % (timestamp, event_type, value))
+
+    def get_presses(self, *args, **kwargs):
+        self._record('get_presses')
+        return []
+
+    def check_force_quit(self):
+        self._record('check_force_quit')
+
+    def _convert_units(self, verts, fro, to):
+        return np.array(verts, float)
+
+    def summary(self):
+        """Count calls per method and describe the flip intervals."""
+        counts = dict()
+        for name, _, _ in self.calls:
+            counts[name] = counts.get(name, 0) + 1
+        flips = np.array([args[0] for name, _, args in self.calls
+                          if name == 'flip'])
+        summary = dict(counts=counts, n_flips=len(flips))
+        if len(flips) > 1:
+            intervals = np.diff(flips) * self.refresh_rate
+            summary.update(median_frames_per_flip=np.median(intervals),
+                           max_frames_per_flip=intervals.max())
+        return summary
+
+
+class _FakeVisual(object):
+    """Base for the stand-in visual stimuli: remember the ec, record draws."""
+
+    def __init__(self, ec, *args, **kwargs):
+        self._ec = ec
+        self._ec._record('create', (type(self).__name__,))
+
+    def draw(self):
+        self._ec._record('draw', (type(self).__name__, id(self)))
+
+
+class RawImage(_FakeVisual):
+    def __init__(self, ec, image_buffer, pos=(0, 0), scale=1., units='norm'):
+        image_buffer = np.asarray(image_buffer)
+        if image_buffer.dtype not in (np.float64, np.uint8):
+            raise TypeError('image_buffer must be np.float64 or np.uint8')
+        if image_buffer.ndim == 2:
+            image_buffer = np.tile(image_buffer[..., np.newaxis], (1, 1, 3))
+        if image_buffer.ndim != 3 or image_buffer.shape[2] not in (3, 4):
+            raise RuntimeError('image_buffer incorrect size: %s'
+                               % (image_buffer.shape,))
+        super(RawImage, self).__init__(ec)
+        self.shape = image_buffer.shape
+
+
+class FixationDot(_FakeVisual):
+    def set_colors(self, colors):
+        self._ec._record('set_colors', tuple(colors))
+
+    def set_radius(self, radius, idx, units='norm'):
+        pass
+
+
+class Text(_FakeVisual):
+    pass
+
+
+def install(**defaults):
+    """Make ``import expyfun`` give the stand-ins (for the rest of the run).
+
+    Parameters
+    ----------
+
+    **defaults : dict
+        Defaults for FakeExperimentController (refresh_rate, vsync,
+        skip_waits, data_dir, session).
+    """
+    FakeExperimentController.defaults.update(defaults)
+    expyfun = types.ModuleType('expyfun')
+    visual = types.ModuleType('expyfun.visual')
+    io = types.ModuleType('expyfun.io')
+    expyfun.ExperimentController = FakeExperimentController
+    for cls in (RawImage, FixationDot, Text):
+        setattr(visual, cls.__name__, cls)
+    io.write_hdf5 = lambda *args, **kwargs: None
+    expyfun.visual = visual
+    expyfun.io = io
+    sys.modules.update({'expyfun': expyfun, 'expyfun.visual': visual,
+                        'expyfun.io': io})
+    # keep the controllers the script creates, for reporting afterwards
+    controllers = []
+    init = FakeExperimentController.__init__
+
+    def _init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        controllers.append(self)
+    FakeExperimentController.__init__ = _init
+    return controllers
+
+
+if __name__ == '__main__':
+    import argparse
+    import cProfile
+    import pstats
+    import runpy
+    parser = argparse.ArgumentParser(
+        description='Run an r21 script against the headless controller.')
+    parser.add_argument('script')
+    parser.add_argument('--rate', type=float, default=60.,
+                        help='simulated refresh rate (Hz)')
+    parser.add_argument('--fast', action='store_true',
+                        help='no vsync waits, wait_secs or frame pacing')
+    parser.add_argument('--profile', default=None,
+                        help='write cProfile stats to this file')
+    args = parser.parse_args()
+
+    controllers = install(refresh_rate=args.rate, vsync=not args.fast,
+                          skip_waits=args.fast)
+    if args.fast:
+        import frame_pacer
+        frame_pacer.FramePacer.wait = lambda self, frame: 0.
+    script = op.abspath(args.script)
+    sys.path.insert(0, op.dirname(script))
+    sys.argv = [script]
+    profiler = cProfile.Profile()
+    t0 = clock()
+    if args.profile:
+        profiler.enable()
+    runpy.run_path(script, run_name='__main__')
+    if args.profile:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    elapsed = clock() - t0
+    for ec in controllers:
+        summary = ec.summary()
+        print('%s: %d flips in %0.2f s, data in %s'
+              % (op.basename(script), summary['n_flips'], elapsed,
+                 ec.data_fname))
+        for name in sorted(summary['counts']):
+            print('  %-18s %d' % (name, summary['counts'][name]))
+    if args.profile:
+        pstats.Stats(args.profile).sort_stats('cumulative').print_stats(20)
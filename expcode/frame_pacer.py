@@ -0,0 +1,114 @@
+"""
+==========================
+Frame pacing for the r21 experiments
+==========================
+Wait for the next frame deadline without pinning a core: sleep until a small
+safety margin before the deadline, then spin on a high-resolution monotonic
+clock for the remainder. If a sleep ever overshoots into the margin, the
+margin is widened so that later frames are not late. The starting margin is
+calibrated from a few short sleeps when the pacer is started. Where sleeps
+overshoot by more than the largest margin allowed (e.g. the 1-15 ms timer
+granularity of some Windows machines), the pacer warns and spins for the
+whole wait instead.
+"""
+import sys
+import time
+import warnings
+
+if hasattr(time, 'perf_counter'):
+    clock = time.perf_counter
+elif sys.platform == 'win32':
+    clock = time.clock  # high resolution wall clock on Windows (Python 2)
+else:
+    clock = time.time
+
+
+class FramePacer(object):
+    """Pace a presentation loop to a fixed frame rate.
+
+    Parameters
+    ----------
+
+    frame_rate : float
+        Frame rate (Hz) to pace to.
+    lead : float
+        How long (s) before each nominal frame boundary to release the loop.
+    margin : float
+        Initial time (s) before the deadline at which sleeping stops and
+        spinning starts.
+    max_margin : float
+        Largest the margin may grow to (s) after late wake-ups. If sleeps
+        overshoot by more than this, the pacer only spins.
+    poll : callable | None
+        Called once per frame before sleeping (e.g. ``ec.check_force_quit``).
+    """
+
+    def __init__(self, frame_rate, lead=0., margin=5e-4, max_margin=4e-3,
+                 poll=None):
+        self.period = 1. / frame_rate
+        self.lead = lead
+        self.margin = margin
+        self.max_margin = max_margin
+        self.poll = poll
+        self.spin_only = False
+        self.t0 = None
+
+    def _stop_sleeping(self, overshoot):
+        self.spin_only = True
+        self.margin = self.max_margin
+        warnings.warn('sleep overshoots by %.1f ms (more than the %.1f ms '
+                      'margin allowed), so frames will be paced by spinning '
+                      'only' % (1e3 * overshoot, 1e3 * self.max_margin))
+
+    def calibrate(self, n_sleeps=10, duration=1e-3):
+        """Set the margin from how far short sleeps overshoot on this machine.
+
+        If the margin needed is more than ``max_margin``, sleeping is turned
+        off (with a warning) and every wait spins.
+        """
+        overshoot = 0.
+        for _ in range(n_sleeps):
+            start = clock()
+            time.sleep(duration)
+            overshoot = max(overshoot, clock() - start - duration)
+        if 1.5 * overshoot > self.max_margin:
+            self._stop_sleeping(overshoot)
+        else:
+            self.margin = max(self.margin, 1.5 * overshoot)
+        return self.margin
+
+    def start(self):
+        """Calibrate, then start the clock; frame 0 ends one period from now.
+        """
+        self.calibrate()
+        self.t0 = clock()
+        return self.t0
+
+    def deadline(self, frame):
+        """Clock time at which ``frame`` is over."""
+        return self.t0 + (frame + 1) * self.period - self.lead
+
+    def wait(self, frame):
+        """Block until ``frame`` is over.
+
+        Returns
+        -------
+
+        late : float
+            How far past the deadline (s) the loop was released; negative
+            values cannot occur.
+        """
+        if self.poll is not None:
+            self.poll()
+        deadline = self.deadline(frame)
+        remaining = deadline - clock() - self.margin
+        if remaining > 0 and not self.spin_only:
+            time.sleep(remaining)
+            overshoot = clock() - (deadline - self.margin)
+            if overshoot > self.max_margin:
+                self._stop_sleeping(overshoot)
+            elif overshoot > self.margin:
+                self.margin = min(2 * self.margin, self.max_margin)
+        while clock() < deadline:
+            pass
+        return clock() - deadline
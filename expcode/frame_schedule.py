@@ -0,0 +1,226 @@
+"""
+==========================
+Frame schedules for the r21 experiments
+==========================
+Compile a block design into a per-frame action table before the
+ExperimentController opens, so the presentation loop only has to look up
+what to do on each frame. Nothing in here needs expyfun or a display.
+
+Each row of a schedule is one screen refresh, with fields (in this order):
+
+    image    index of the image to draw (-1: none)
+    onset    write the image log lines on this frame
+    blank    draw the blank image
+    flicker  index of the dot color to log as 'dotcolorFix' (-1: none)
+    color    index of the dot color to set (-1: leave unchanged)
+    trigger  trigger value to stamp (0: none)
+    marker   index into MARKERS of an extra log line (0: none)
+    flip     flip the screen on this frame
+"""
+import numpy as np
+
+FRAME_DTYPE = np.dtype([('image', np.int16),
+                        ('onset', np.bool_),
+                        ('blank', np.bool_),
+                        ('flicker', np.int16),
+                        ('color', np.int16),
+                        ('trigger', np.uint8),
+                        ('marker', np.uint8),
+                        ('flip', np.bool_)])
+MARKERS = (None, 'Start', 'End')
+
+
+def _empty_schedule(n_frames):
+    schedule = np.zeros(n_frames, FRAME_DTYPE)
+    for field in ('image', 'flicker', 'color'):
+        schedule[field] = -1
+    return schedule
+
+
+def draw_flicker_delays(n_flickers, realRR, rng):
+    """Draw a 0-200 ms jitter (in frames) for each dot color change.
+
+    Parameters
+    ----------
+
+    n_flickers : int
+        Number of dot color changes.
+    realRR : float
+        Screen refresh rate (Hz).
+    rng : instance of RandomState
+        Random number generator; it is used exactly as the r21 scripts always
+        have, so a given seed gives the same delays as before.
+    """
+    jitter = np.arange(0, realRR * 0.2)
+    delay = []
+    for _ in range(n_flickers):
+        rng.shuffle(jitter)
+        delay.append(jitter[0])
+    return np.array(delay)
+
+
+def compile_ssvep_schedule(realRR, total_time, base_rate, n_images,
+                           start_image, n_stim_images, n_flickers, rng):
+    """Compile one block of the blocked SSVEP design into a frame schedule.
+
+    Each image is shown for half an image period followed by a blank, at
+    ``base_rate`` images per second. The screen only flips on image and
+    blank frames, so dot color changes become visible on the next of these.
+    A trigger is stamped at the first non-padding image.
+
+    Parameters
+    ----------
+
+    realRR : float
+        Screen refresh rate (Hz).
+    total_time : float
+        Block duration (s), including padding.
+    base_rate : int
+        Images per second.
+    n_images : int
+        Number of images in the block, including padding.
+    start_image : int
+        Index of the first non-padding image (where 'Start' is logged).
+    n_stim_images : int
+        Number of non-padding images ('End' is logged after them).
+    n_flickers : int
+        Number of dot color changes, spread evenly over the block.
+    rng : instance of RandomState
+        Random number generator for the dot color jitter.
+
+    Returns
+    -------
+
+    schedule : ndarray, shape (n_frames,)
+        Structured array with dtype ``FRAME_DTYPE``.
+    """
+    n_frames = int(round(total_time * realRR))
+    img_frames = int(round(realRR / base_rate))
+    frame_img = np.arange(0, n_frames, img_frames)
+    blank_img = frame_img + int(img_frames / 2)
+    start_frame = start_image * img_frames
+    end_frame = start_frame + n_stim_images * img_frames
+    frame_flicker = (np.linspace(0, n_frames, n_flickers) +
+                     draw_flicker_delays(n_flickers, realRR, rng))
+    n_img = min(n_images, len(frame_img))
+
+    schedule = _empty_schedule(n_frames)
+    trial = 0
+    b_trial = 0
+    flicker = 0
+    for frame in range(n_frames):
+        if frame == frame_flicker[flicker]:
+            schedule['flicker'][frame] = flicker
+            schedule['color'][frame] = flicker
+            if flicker < len(frame_flicker) - 2:
+                flicker += 1
+        if frame == frame_img[trial]:
+            schedule['image'][frame] = trial
+            schedule['onset'][frame] = True
+            schedule['flip'][frame] = True
+            if frame == start_frame:
+                schedule['marker'][frame] = MARKERS.index('Start')
+                schedule['trigger'][frame] = 1
+            elif frame == end_frame:
+                schedule['marker'][frame] = MARKERS.index('End')
+            if trial < n_img - 1:
+                trial += 1
+        elif frame == blank_img[b_trial]:
+            schedule['blank'][frame] = True
+            schedule['flip'][frame] = True
+            if b_trial < n_img - 1:
+                b_trial += 1
+    return schedule
+
+
+def compile_event_related_schedule(realRR, total_time, imduration, isi,
+                                   imtype, rng):
+    """Compile the event-related design into a frame schedule.
+
+    Each image is shown for ``imduration`` plus its ISI, with the dot color
+    changing every 500 ms (plus jitter). The screen flips on every frame and
+    the image category is stamped as a trigger at each image onset.
+
+    Parameters
+    ----------
+
+    realRR : float
+        Screen refresh rate (Hz).
+    total_time : float
+        Run duration (s).
+    imduration : float
+        Image duration (s).
+    isi : array-like of float
+        Inter-stimulus interval (s) following each image.
+    imtype : array-like of int
+        Image category of each image (used as its trigger value).
+    rng : instance of RandomState
+        Random number generator for the dot color jitter.
+
+    Returns
+    -------
+
+    schedule : ndarray, shape (n_frames,)
+        Structured array with dtype ``FRAME_DTYPE``.
+    """
+    n_frames = int(round(total_time * realRR))
+    img_frames = [int(round(imduration * realRR)) + int(this_isi * realRR)
+                  for this_isi in isi]
+    temp_flicker = np.arange(0, n_frames, int(realRR / 2))
+    frame_flicker = temp_flicker + draw_flicker_delays(len(temp_flicker),
+                                                       realRR, rng)
+    frame_img = np.concatenate(([0], np.cumsum(img_frames)[:-1]))
+    n_img = len(imtype)
+
+    schedule = _empty_schedule(n_frames)
+    schedule['flip'] = True
+    trial = 0
+    flicker = 0
+    last_color = -1
+    for frame in range(n_frames):
+        if frame == frame_flicker[flicker]:
+            schedule['flicker'][frame] = flicker
+            if flicker < len(frame_flicker) - 1:
+                flicker += 1
+        if frame_img[trial] <= frame < frame_img[trial] + img_frames[trial]:
+            schedule['image'][frame] = trial
+            if frame == frame_img[trial]:
+                schedule['onset'][frame] = True
+                schedule['trigger'][frame] = imtype[trial]
+            if frame == frame_img[trial] + img_frames[trial] - 1:
+                if trial < n_img - 1:
+                    trial += 1
+        else:
+            schedule['blank'][frame] = True
+        # the dot always shows the color the flicker counter points at
+        if flicker != last_color:
+            schedule['color'][frame] = flicker
+            last_color = flicker
+    return schedule
+
+
+def summarize_schedule(schedule, realRR):
+    """Return a dict of counts and durations describing a frame schedule."""
+    return dict(n_frames=len(schedule),
+                duration=len(schedule) / float(realRR),
+                n_flips=int(schedule['flip'].sum()),
+                n_images=int((schedule['image'] >= 0).sum()),
+                n_onsets=int(schedule['onset'].sum()),
+                n_blanks=int(schedule['blank'].sum()),
+                n_flickers=int((schedule['flicker'] >= 0).sum()),
+                n_triggers=int((schedule['trigger'] > 0).sum()))
+
+
+if __name__ == '__main__':
+    # compile the default designs offline and report what they contain
+    rng = np.random.RandomState(0)
+    realRR = 60.
+    ssvep = compile_ssvep_schedule(realRR, total_time=24, base_rate=6,
+                                   n_images=144, start_image=12,
+                                   n_stim_images=120, n_flickers=13, rng=rng)
+    print('SSVEP block: %s' % summarize_schedule(ssvep, realRR))
+    isi = np.tile(np.arange(0.5, 1.01, 0.1), 17)[:100]
+    imtype = rng.randint(1, 5, 100)
+    erp = compile_event_related_schedule(realRR, isi.sum() + 100, 1, isi,
+                                         imtype, rng)
+    print('Event-related run: %s' % summarize_schedule(erp, realRR))
@@ -0,0 +1,202 @@
+"""
+==========================
+Frame timing telemetry for the r21 experiments
+==========================
+Record flip and trigger timestamps during a presentation loop into
+preallocated arrays, save them next to the expyfun data file, and report
+afterwards how well the run kept time: dropped frames, the effective refresh
+rate and stimulation frequencies, and the phase drift of each frequency tag
+relative to its nominal value.
+
+Report on saved runs with
+
+    python frame_timing.py data/*_timing*.npz
+
+``--check`` first reports on a simulated 75 Hz run, where the 6 Hz tag is
+really 6.25 Hz.
+"""
+import numpy as np
+
+
+class FrameTimer(object):
+    """Preallocated record of the flips and triggers of a presentation loop.
+
+    Parameters
+    ----------
+
+    n_frames : int
+        Number of frames in the loop.
+    frame_rate : float
+        Nominal screen refresh rate (Hz) that the loop was scheduled for.
+    onset_frames : array-like of int | None
+        Frames where a tagged stimulus (image) comes on, used to measure the
+        stimulation frequencies.
+    tags : tuple of float
+        Nominal tagging frequencies (Hz), e.g. ``(6., 2.)``.
+    """
+
+    def __init__(self, n_frames, frame_rate, onset_frames=None, tags=()):
+        self.frame_rate = float(frame_rate)
+        self.tags = np.array(tags, float)
+        self.flip_times = np.full(n_frames, np.nan)
+        self.trigger_times = np.full(n_frames, np.nan)
+        self.triggers = np.zeros(n_frames, np.uint8)
+        self.onsets = np.zeros(n_frames, bool)
+        if onset_frames is not None:
+            self.onsets[np.asarray(onset_frames, int)] = True
+
+    @classmethod
+    def from_schedule(cls, schedule, frame_rate, tags=()):
+        """Make a timer for a schedule from ``frame_schedule``."""
+        return cls(len(schedule), frame_rate,
+                   np.where(schedule['onset'])[0], tags)
+
+    def flip(self, frame, timestamp):
+        """Record the timestamp returned by ``ec.flip()``."""
+        self.flip_times[frame] = timestamp
+
+    def trigger(self, frame, value, timestamp):
+        """Record a trigger stamped on a frame (timestamp from the ec clock)."""
+        self.triggers[frame] = value
+        self.trigger_times[frame] = timestamp
+
+    def missed(self):
+        """Flag flips that came at least half a frame later than scheduled.
+
+        Each flip is compared with the previous one, so a single late flip is
+        flagged once rather than shifting everything after it.
+        """
+        frames = np.where(~np.isnan(self.flip_times))[0]
+        missed = np.zeros(len(self.flip_times), bool)
+        late = (np.diff(self.flip_times[frames]) -
+                np.diff(frames) / self.frame_rate)
+        missed[frames[1:]] = late > 0.5 / self.frame_rate
+        return missed
+
+    def save(self, fname):
+        """Save the record (and the missed-frame flags) to an ``.npz``."""
+        np.savez(fname, frame_rate=self.frame_rate, tags=self.tags,
+                 flip_times=self.flip_times, trigger_times=self.trigger_times,
+                 triggers=self.triggers, onsets=self.onsets,
+                 missed=self.missed())
+
+
+def frame_timing_report(fname):
+    """Summarize the timing of a run saved with ``FrameTimer.save``.
+
+    Parameters
+    ----------
+
+    fname : str
+        The ``.npz`` file.
+
+    Returns
+    -------
+
+    report : dict
+        Number of flips, missed flips and dropped frames; the effective
+        refresh rate; trigger-to-flip latencies (s); and for each tag its
+        effective frequency and its phase drift (degrees) at the last onset
+        and at worst, relative to an ideal clock at the nominal tag frequency
+        started at the first onset. Each tag is measured on every n-th image
+        onset, n being the ratio of the highest tag to it (e.g., every 3rd
+        onset for a 2 Hz oddball among 6 Hz images).
+    """
+    with np.load(fname) as npz:
+        data = dict((key, npz[key]) for key in npz.files)
+    frame_rate = float(data['frame_rate'])
+    flip_times = data['flip_times']
+    frames = np.where(~np.isnan(flip_times))[0]
+    times = flip_times[frames]
+    late = np.diff(times) - np.diff(frames) / frame_rate
+    report = dict(n_flips=len(frames),
+                  n_missed=int(data['missed'].sum()),
+                  n_dropped=int(np.maximum(np.round(late * frame_rate),
+                                           0).sum()),
+                  frame_rate=frame_rate)
+    if len(frames) > 1:
+        report['effective_frame_rate'] = ((frames[-1] - frames[0]) /
+                                          (times[-1] - times[0]))
+    # triggers are stamped just before the flip of the same frame
+    trig_frames = np.where(data['triggers'] > 0)[0]
+    latency = flip_times[trig_frames] - data['trigger_times'][trig_frames]
+    report['n_triggers'] = len(trig_frames)
+    if len(trig_frames):
+        report['trigger_latency_median'] = np.nanmedian(latency)
+        report['trigger_latency_max'] = np.nanmax(latency)
+    # frequency tags: compare the onset times against an ideal clock at the
+    # nominal frequency (not the schedule, which may itself be off-frequency)
+    onsets = np.where(data['onsets'])[0]
+    tags = data['tags']
+    for tag in tags:
+        step = max(int(round(tags.max() / tag)), 1)
+        cycles = np.arange(0, len(onsets), step)
+        actual = flip_times[onsets[cycles]]
+        flipped = ~np.isnan(actual)
+        if flipped.sum() < 2:
+            continue
+        cycles, actual = cycles[flipped] // step, actual[flipped]
+        actual = actual - actual[0]
+        ideal = (cycles - cycles[0]) / tag
+        slope = np.polyfit(ideal, actual, 1)[0]
+        drift = 360. * tag * (actual - ideal)
+        report['%g Hz' % tag] = dict(effective=tag / slope,
+                                     drift_end=drift[-1],
+                                     drift_max=drift[np.argmax(
+                                         np.abs(drift))])
+    return report
+
+
+def _print_report(fname, report):
+    print('%s' % fname)
+    print('  %d flips, %d missed, %d dropped frames'
+          % (report['n_flips'], report['n_missed'], report['n_dropped']))
+    if 'effective_frame_rate' in report:
+        print('  refresh rate: %0.4f Hz (nominal %0.4f Hz)'
+              % (report['effective_frame_rate'], report['frame_rate']))
+    if report['n_triggers']:
+        print('  %d triggers, flip latency median %0.2f ms, max %0.2f ms'
+              % (report['n_triggers'], 1e3 * report['trigger_latency_median'],
+                 1e3 * report['trigger_latency_max']))
+    for key in sorted(k for k in report if k.endswith(' Hz')):
+        tag = report[key]
+        print('  %s tag: effective %0.5f Hz, phase drift %0.1f deg at end, '
+              '%0.1f deg max' % (key, tag['effective'], tag['drift_end'],
+                                 tag['drift_max']))
+
+
+def _check(frame_rate=75.):
+    """Report on a simulated SSVEP block with perfect flips at ``frame_rate``.
+
+    At 75 Hz an image lasts 12 frames, so the 6 Hz tag is really 6.25 Hz
+    (and the 2 Hz oddball 2.083 Hz); the report has to show that.
+    """
+    import os
+    import tempfile
+    from frame_schedule import compile_ssvep_schedule
+    tags = (6., 2.)
+    schedule = compile_ssvep_schedule(frame_rate, 10., 6, 60, 0, 60, 6,
+                                      np.random.RandomState(0))
+    timer = FrameTimer.from_schedule(schedule, frame_rate, tags=tags)
+    for frame in np.where(schedule['flip'])[0]:
+        timer.flip(frame, frame / frame_rate)
+    img_frames = int(round(frame_rate / tags[0]))
+    fname = os.path.join(tempfile.mkdtemp(), 'check_timing.npz')
+    timer.save(fname)
+    report = frame_timing_report(fname)
+    _print_report(fname, report)
+    for tag in tags:
+        expected = frame_rate / (img_frames * tags[0] / tag)
+        effective = report['%g Hz' % tag]['effective']
+        assert abs(effective - expected) < 1e-6, (tag, effective, expected)
+        assert abs(report['%g Hz' % tag]['drift_end']) > 10.
+
+
+if __name__ == '__main__':
+    import sys
+    fnames = sys.argv[1:]
+    if '--check' in fnames:
+        fnames.remove('--check')
+        _check()
+    for fname in fnames:
+        _print_report(fname, frame_timing_report(fname))
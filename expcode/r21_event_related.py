@@ -3,6 +3,7 @@
 Display images for MEG
 ==========================
 """
+from __future__ import print_function
 import numpy as np
 from expyfun import visual, ExperimentController
 from expyfun.io import write_hdf5
@@ -12,6 +13,10 @@ import os
 from os import path as op
 import glob
 
+from frame_schedule import compile_event_related_schedule
+from frame_timing import FrameTimer
+from stim_cache import StimCache
+
 # background color
 bgcolor = [0.5, 0.5, 0.5, 1]
 
@@ -40,6 +45,9 @@ isis = np.arange(0.5, 1.01, 0.1) #np.arange(.62, .84, .02)
 imduration = 1  # Image duration 1000 ms
 s = .5  # Image scale
 
+# Decoded images for each stimulus directory, pre-scaled by s (stim_cache.py)
+stim_cache = StimCache([os.path.join(basedir, d) for d in imagedirs], scale=s)
+
 # Create a vector of ISIs in a random order. One ISI for each image
 rng = np.random.RandomState(int(time.time()))
 ISI = np.tile(isis, int(np.ceil(n_totalimages/len(isis)))+1)
@@ -99,7 +107,7 @@ while imtype[0] == 4:
 imagelist = []
 for imname in imtype: #imagedirs:
     # Temporary variable with image names in order
-    tmp = sorted(glob.glob(os.path.join(basedir, imagedirs[imname-1], '*')))
+    tmp = stim_cache.files(os.path.join(basedir, imagedirs[imname-1]))
     # Shuffle the list of images
     # temp_n = np.arange(0,len(tmp))
     # rng.shuffle(temp_n)
@@ -120,36 +128,22 @@ with ExperimentController('ShowImages', full_screen=True,version='dev') as ec:
     # Set the background color to gray
     ec.set_background_color(bgcolor)
 
-    n_frames = np.int(round(total_time * realRR))
-    img_frames = []
-    for i in np.arange(0,sum(nimages)):
-        img_frames.append(round(imduration*realRR) + int(ISI[i]*realRR))
-    jitter = np.arange(0,realRR*0.2) # 0~200 ms jitter
-    
-    temp_flicker = np.arange(0,n_frames,int(realRR/2)) # Get temp_flicker frames: every .5 s
-    delay = []
-    for i in np.arange(0,len(temp_flicker)):
-        rng.shuffle(jitter)
-        delay.append(jitter[0])
-    frame_flicker = temp_flicker + delay # 
-    frame_img = [0]
-    for i in np.arange(0,len(ISI)):
-        frame_img.append(frame_img[i] + img_frames[i]) # + int(ISI[i]*realRR))
-    frame_img = frame_img[:-1]
+    # Work out what happens on every frame (image onsets and triggers, dot
+    # color changes every .5 s with 0~200 ms jitter) before anything is drawn
+    schedule = compile_event_related_schedule(realRR, total_time, imduration,
+                                              ISI, imtype, rng)
     
     # load up the image stack. The images in img_buffer are in the sequential 
-    # non-shuffled order
+    # non-shuffled order. They come from the cache already scaled by s
     img = []
     for im in imagelist:
-        img_buffer = np.array(Image.open(im), np.uint8) / 255.
-        if img_buffer.ndim == 2:
-            img_buffer = np.tile(img_buffer[:, :, np.newaxis], [1, 1, 3])
-        img.append(visual.RawImage(ec, img_buffer, scale=s))
-        ec.check_force_quit()
+        img_buffer = stim_cache.get(im)
+        img.append(visual.RawImage(ec, img_buffer, scale=1.))
+    ec.check_force_quit()
 
     # make a blank image
-    blank = visual.RawImage(ec, np.tile(bgcolor[0], np.multiply([s, s, 1], img_buffer.shape).astype('int')))
-    bright = visual.RawImage(ec, np.tile([1.], np.multiply([s, s, 1], img_buffer.shape).astype('int')))
+    blank = visual.RawImage(ec, np.tile(bgcolor[0], img_buffer.shape))
+    bright = visual.RawImage(ec, np.tile([1.], img_buffer.shape))
     # Calculate stimulus size
     d_pix = -np.diff(ec._convert_units([[3., 0.], [3., 0.]], 'deg', 'pix'), axis=-1)
 
@@ -193,59 +187,38 @@ with ExperimentController('ShowImages', full_screen=True,version='dev') as ec:
     ec.write_data_line('dotcolorFix', 'k')
     last_flip = ec.flip()
 
-    # The iterable 'trial' randomizes the order of everything since it is
-    # drawn from imorder_shuf
-    trial = 0
-    frame = 0
-    flicker = 0
-#    imageframe = []
-#    stampframe = []
-#    frametimes = []
-    trigger = 0
+    # One row of the schedule per frame; see frame_schedule for the fields
+    actions = schedule.tolist()
+    timer = FrameTimer.from_schedule(schedule, realRR)
     t0 = time.time()
-    while frame < n_frames:
-        if frame == frame_flicker[flicker]:
-            fix.set_colors(colors=(fix_color[flicker],fix_color[flicker]))
+    for frame, (image, onset, show_blank, flicker, color, trig, marker,
+                flip) in enumerate(actions):
+        if flicker >= 0:
             ec.write_data_line('dotcolorFix', fix_color[flicker])
-            if flicker < len(frame_flicker)-1:
-                flicker += 1
-                
-        if frame >= frame_img[trial] and frame < frame_img[trial] + img_frames[trial]:
-            if frame == frame_img[trial]:
-                ec.write_data_line('imnumber', imagelist[trial])
-                ec.write_data_line('imtype', imtype[trial])
-                trig = imtype[trial]
-                trigger = 1
-#                ec.stamp_triggers(1, check='int4')
-            else:
-                trigger = 0
-            fix.set_colors(colors=(fix_color[flicker],fix_color[flicker]))
-            
-            img[trial].draw()
-#            bright.draw()
-            
-#            imageframe.append(frame)
-            if frame == frame_img[trial] + img_frames[trial] - 1:
-                if trial < len(imagelist)-1:
-                    trial += 1
-        else:
-            fix.set_colors(colors=(fix_color[flicker],fix_color[flicker]))
+        if color >= 0:
+            fix.set_colors(colors=(fix_color[color],fix_color[color]))
+        if image >= 0:
+            if onset:
+                ec.write_data_line('imnumber', imagelist[image])
+                ec.write_data_line('imtype', imtype[image])
+            img[image].draw()
+        elif show_blank:
             blank.draw()
         
         fix.draw()
-        if trigger:
+        if trig:
             ec.stamp_triggers(trig, check='int4',wait_for_last=False)
-#            stampframe.append(frame)
+            timer.trigger(frame, trig, ec.get_time())
         last_flip = ec.flip()
-        frame += 1
+        timer.flip(frame, last_flip)
         ec.get_presses()
-#        frametimes.append(last_flip)
         ec.check_force_quit()
 #        while time.time()-t0 < (frame+1)*fr:
 #            ec.check_force_quit()
     # Now the experiment is over and we show 5 seconds of blank
-    print "\n\n Elasped time: %0.4f secs" % (time.time()-t0)
-    print "\n\n Targeted time: %0.4f secs" % total_time
+    print("\n\n Elasped time: %0.4f secs" % (time.time()-t0))
+    print("\n\n Targeted time: %0.4f secs" % total_time)
+    timer.save(op.splitext(ec.data_fname)[0] + '_timing.npz')
     blank.draw(), fix.draw()
     ec.flip()
     ec.wait_secs(1.0)
@@ -3,6 +3,7 @@
 Display images for MEG
 ==========================
 """
+from __future__ import print_function
 import numpy as np
 from expyfun import visual, ExperimentController
 from expyfun.io import write_hdf5
@@ -25,6 +26,8 @@ else:
 basedir = os.path.join('C:\\Users\\neuromag\\Desktop\\jason\\wordStim')
 if not os.path.isdir(basedir):
     basedir = os.path.join('/mnt/diskArray/projects/MEG/wordStim')
+if not os.path.isdir(basedir):
+    basedir = os.path.join(op.expanduser("~"),'git','SSWEF','stim')
 
 """ Words, False fonts (Korean), Faces, Objects """
 imagedirs = ['falsefont', 'word_c254_p0']
@@ -259,8 +262,8 @@ with ExperimentController('ShowImages', full_screen=True, version='dev') as ec:
         frame += 1
         
     # Now the experiment is over and we show 5 seconds of blank
-    print "\n\n Elasped time: %0.4f secs" % (time.time()-t0)
-    print "\n\n Targeted time: %0.4f secs" % total_time
+    print("\n\n Elasped time: %0.4f secs" % (time.time()-t0))
+    print("\n\n Targeted time: %0.4f secs" % total_time)
 #    blank.draw(), fix.draw()
 #    ec.flip()
 #    ec.wait_secs(5.0)
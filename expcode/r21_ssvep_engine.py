@@ -0,0 +1,252 @@
+"""
+==========================
+Blocked SSVEP presentation for MEG
+==========================
+One engine for all of the blocked SSVEP conditions: carrier images at
+``base_rate`` Hz with an oddball image every ``odd_rate`` images, padded with
+carrier-only images at both ends, while the fixation dot changes color for
+the button-press task. The r21_ssvep_blocked*.py scripts just say which
+stimuli to use and call ``run_ssvep``.
+"""
+import os
+from os import path as op
+import time
+
+import numpy as np
+from expyfun import visual, ExperimentController
+from PIL import Image
+
+from frame_pacer import FramePacer
+from frame_schedule import compile_ssvep_schedule, MARKERS
+from frame_timing import FrameTimer
+from stim_cache import StimCache
+
+# background color
+bgcolor = [0.5, 0.5, 0.5, 1]
+
+
+def find_basedir():
+    """Stimulus directory on the MEG stimulus PC, else ~/git/SSWEF/stim."""
+    basedir = os.path.join('C:\\Users\\neuromag\\Desktop\\jason\\wordStim')
+    if not os.path.isdir(basedir):
+        basedir = os.path.join(op.expanduser("~"), 'git', 'SSWEF', 'stim')
+        print('Loading images from: ' + basedir)
+    return basedir
+
+
+def make_fix_colors(n_flickers, n_target, rng):
+    """Dot colors for one block: ``n_target`` greens, never two in a row."""
+    fix_seq = np.zeros(n_flickers)
+    fix_seq[:n_target] = 1
+    rng.shuffle(fix_seq)
+    for i in range(0, len(fix_seq) - 4):
+        if (fix_seq[i] + fix_seq[i + 1]) == 2:
+            fix_seq[i + 1] = 0
+            if fix_seq[i + 3] == 0:
+                fix_seq[i + 3] = 1
+            elif fix_seq[i + 4] == 0:
+                fix_seq[i + 4] = 1
+    # non-target colors cycle in a random order that never repeats a color
+    c = ['r', 'b', 'y']
+    k = 0
+    fix_color = []
+    for i in range(0, len(fix_seq)):
+        if fix_seq[i] == 1:
+            fix_color.append('g')
+        else:
+            fix_color.append(c[k])
+            k += 1
+            k = np.mod(k, 3)
+        if k == 0:
+            rng.shuffle(c)
+            while fix_color[i] == c[0]:
+                rng.shuffle(c)
+    return fix_color
+
+
+def make_image_list(carriers, oddballs, n_images, odd_rate, n_pad, rng):
+    """Image sequence for one block (and 'Base'/'Oddball' labels).
+
+    Parameters
+    ----------
+
+    carriers, oddballs : list of str
+        Available carrier and oddball images (shuffled in place).
+    n_images : int
+        Number of images in the stimulation period.
+    odd_rate : int
+        An oddball replaces every ``odd_rate``-th carrier.
+    n_pad : int
+        Number of carrier-only images before (and after) the stimulation.
+    rng : instance of RandomState
+        Random number generator.
+
+    Returns
+    -------
+
+    imagelist : list of str
+        ``n_pad + n_images + n_pad`` image paths.
+    imtype : list of str
+        The label of each image.
+    """
+    rng.shuffle(carriers)
+    baselist = carriers[:n_images]
+    rng.shuffle(oddballs)
+    templist = []
+    temptype = []
+    k = 0
+    for i in range(len(baselist)):
+        if np.mod(i, odd_rate) == odd_rate - 1:
+            templist.append(oddballs[k])
+            k += 1
+            temptype.append('Oddball')
+        else:
+            templist.append(baselist[i])
+            temptype.append('Base')
+    # the padding reuses the last carriers of the block
+    paddlist = baselist[len(baselist) - 2 * n_pad:]
+    imagelist = paddlist[:n_pad] + templist + paddlist[len(paddlist) - n_pad:]
+    imtype = ['Base'] * n_pad + temptype + ['Base'] * n_pad
+    return imagelist, imtype
+
+
+def run_ssvep(carrier_dir, oddball_dir, base_rate=6, odd_rate=3, n_blocks=3,
+              scale=.5, intro_image=None, stim_time=20, pad_time=2,
+              basedir=None):
+    """Run the blocked SSVEP experiment.
+
+    Parameters
+    ----------
+
+    carrier_dir : str
+        Directory (under ``basedir``) of the carrier images.
+    oddball_dir : str
+        Directory (under ``basedir``) of the oddball images.
+    base_rate : int
+        Images per second (the carrier frequency, Hz).
+    odd_rate : int
+        Every ``odd_rate``-th image is an oddball (e.g. 3 gives 2 Hz at a
+        6 Hz base rate).
+    n_blocks : int
+        Number of blocks.
+    scale : float
+        Image scale.
+    intro_image : str | None
+        Image file (under ``basedir``) shown as the instructions before the
+        first block; if None the instructions are shown as text.
+    stim_time : float
+        Duration of the stimulation period of each block (s).
+    pad_time : float
+        Duration of the carrier-only padding at each end of a block (s).
+    basedir : str | None
+        Stimulus directory; defaults to ``find_basedir()``.
+    """
+    if basedir is None:
+        basedir = find_basedir()
+    carrier_dir = op.join(basedir, carrier_dir)
+    oddball_dir = op.join(basedir, oddball_dir)
+    n_images = stim_time * base_rate
+    n_pad = pad_time * base_rate
+    total_time = stim_time + 2 * pad_time
+    n_flickers = int(total_time / 2) + 1
+    n_target = int(stim_time / 5)
+    tags = (base_rate, base_rate / float(odd_rate))
+    rng = np.random.RandomState(int(time.time()))
+    # Decoded images for each stimulus directory, pre-scaled (stim_cache.py)
+    stim_cache = StimCache([carrier_dir, oddball_dir], scale=scale)
+
+    with ExperimentController('ShowImages', full_screen=True,
+                              version='dev') as ec:
+        for block in range(n_blocks):
+            fix_color = make_fix_colors(n_flickers, n_target, rng)
+            imagelist, imtype = make_image_list(
+                stim_cache.files(carrier_dir), stim_cache.files(oddball_dir),
+                n_images, odd_rate, n_pad, rng)
+
+            realRR = round(ec.estimate_screen_fs(n_rep=20))
+            fr = 1. / realRR
+            ec.set_background_color(bgcolor)
+            # Work out what happens on every frame (image/blank flips, dot
+            # color changes with 0~200 ms jitter, triggers) up front
+            schedule = compile_ssvep_schedule(realRR, total_time, base_rate,
+                                              len(imagelist), n_pad,
+                                              len(imagelist) - 2 * n_pad,
+                                              n_flickers, rng)
+
+            # load up the image stack (already scaled in the cache)
+            img = [visual.RawImage(ec, stim_cache.get(im), scale=1.)
+                   for im in imagelist]
+            img_shape = stim_cache.get(imagelist[-1]).shape
+            blank = visual.RawImage(ec, np.tile(bgcolor[0], img_shape))
+            ec.check_force_quit()
+
+            ec.set_visible(True)
+            ec.listen_presses()
+
+            # Create a fixation dot
+            fix = visual.FixationDot(ec, colors=('k', 'k'))
+            fix.set_radius(5, 0, 'pix')
+            fix.set_radius(4, 1, 'pix')
+            fix.draw()
+
+            # Display instruction (5 seconds) before the first block
+            if block == 0:
+                if intro_image is None:
+                    t = visual.Text(ec, text='Button press when the dot '
+                                    'turns green.', pos=[0, .1],
+                                    font_size=40, color='k')
+                else:
+                    introimg_buffer = np.array(Image.open(
+                        op.join(basedir, intro_image)), np.uint8) / 255.
+                    t = visual.RawImage(ec, introimg_buffer, scale=0.5)
+                t.draw()
+                ec.flip()
+                ec.wait_secs(5.0)
+
+            # Initial blank
+            fix.set_colors(colors=('k', 'k'))
+            blank.draw(), fix.draw()
+            ec.write_data_line('dotcolorFix', 'k')
+            ec.flip()
+
+            # One row of the schedule per frame; see frame_schedule
+            actions = schedule.tolist()
+            timer = FrameTimer.from_schedule(schedule, realRR, tags=tags)
+            # Release each frame fr/60 early, sleeping rather than spinning
+            pacer = FramePacer(realRR, lead=fr / 60,
+                               poll=ec.check_force_quit)
+            pacer.start()
+            t0 = time.time()
+            for frame, (image, onset, show_blank, flicker, color, trig,
+                        marker, flip) in enumerate(actions):
+                if color >= 0:
+                    fix.set_colors(colors=([0, 0, 0], fix_color[color]))
+                if flicker >= 0:
+                    ec.write_data_line('dotcolorFix', fix_color[flicker])
+                if image >= 0:
+                    ec.write_data_line('imtype', imtype[image])
+                    if marker:
+                        ec.write_data_line(MARKERS[marker])
+                    img[image].draw()
+                elif show_blank:
+                    blank.draw()
+                fix.draw()
+                if trig:
+                    ec.stamp_triggers(trig, check='int4',
+                                      wait_for_last=False)
+                    timer.trigger(frame, trig, ec.get_time())
+                if flip:
+                    timer.flip(frame, ec.flip())
+                ec.get_presses()
+                pacer.wait(frame)
+
+            print('\n\n Elasped time: %0.4f secs' % (time.time() - t0))
+            print('\n\n Targeted time: %0.4f secs' % total_time)
+            timer.save(op.splitext(ec.data_fname)[0] +
+                       '_timing_block%d.npz' % block)
+            # blank screen between blocks
+            fix.set_colors(colors=([0, 0, 0], [0, 0, 0]))
+            blank.draw(), fix.draw()
+            ec.flip()
+            ec.wait_secs(1.0)
+            ec.get_presses()
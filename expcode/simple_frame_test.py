@@ -4,6 +4,7 @@
 Display images for MEG
 ==========================
 """
+from __future__ import print_function
 import numpy as np
 from expyfun import visual, ExperimentController
 from expyfun.io import write_hdf5
@@ -15,6 +16,8 @@ import os
 from os import path as op
 import glob
 
+from frame_timing import FrameTimer
+
 # background color2
 testing = True
 test_trig = [15]
@@ -28,6 +31,8 @@ else:
 basedir = os.path.join('C:\\Users\\neuromag\\Desktop\\jason\\wordStim')
 if not os.path.isdir(basedir):
     basedir = os.path.join('/home/jyeatman/git/wmdevo/megtools/stim/wordStim')
+if not os.path.isdir(basedir):
+    basedir = os.path.join(op.expanduser("~"),'git','SSWEF','stim')
 
 imagedirs = ['word_c254_p20', 'word_c254_p50', 'word_c137_p20',
              'word_c254_p80', 'word_c137_p80', 'bigram_c254_p20',
@@ -43,14 +48,14 @@ s = .5  # Image scale
 
 # Create a vector of ISIs in a random order. One ISI for each image
 rng = np.random.RandomState(int(time.time()))
-ISI = np.repeat(isis, sum(nimages)/len(isis))
+ISI = np.repeat(isis, sum(nimages)//len(isis))
 rng.shuffle(ISI)
 
 # Creat a vector of dot colors for each ISI
 c = ['g', 'b', 'y', 'c', '#6B8E23', '#F0E68C', '#8FBC8F']
-dcolor = np.tile(c, np.ceil(float(len(ISI))/len(c)))
-dcolor2 = np.tile(c, np.ceil(float(len(ISI))/len(c)))
-dcolor3 = np.tile(c, np.ceil(float(len(ISI))/len(c)))
+dcolor = np.tile(c, int(np.ceil(float(len(ISI))/len(c))))
+dcolor2 = np.tile(c, int(np.ceil(float(len(ISI))/len(c))))
+dcolor3 = np.tile(c, int(np.ceil(float(len(ISI))/len(c))))
 # Now insert the target trials
 dcolor[:7] = 'r'
 dcolor2[:7] = 'r'
@@ -72,7 +77,7 @@ for i in range(1, len(imagedirs)+1):
     imtype.extend(np.tile(i, nimages[i-1]))
 
 # Shuffle the image order
-ind_shuf = range(len(imtype))
+ind_shuf = list(range(len(imtype)))
 rng.shuffle(ind_shuf)
 imorder_shuf = []
 imtype_shuf = []
@@ -124,14 +129,13 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
         ec.check_force_quit()
 
     # make a blank image
-    blank = visual.RawImage(ec, np.tile(bgcolor[0], np.multiply([s, s, 1], img_buffer.shape)))
-    bright = visual.RawImage(ec, np.tile([1.], np.multiply([s, s, 1], img_buffer.shape)))
+    blank = visual.RawImage(ec, np.tile(bgcolor[0], np.multiply([s, s, 1], img_buffer.shape).astype(int)))
+    bright = visual.RawImage(ec, np.tile([1.], np.multiply([s, s, 1], img_buffer.shape).astype(int)))
     # Calculate stimulus size
     d_pix = -np.diff(ec._convert_units([[3., 0.], [3., 0.]], 'deg', 'pix'), axis=-1)
 
     # do the drawing, then flip
     ec.set_visible(True)
-    frametimes = []
     buttons = []
     ec.listen_presses()
     last_flip = -1
@@ -154,6 +158,8 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
     # Show images
     frame = 0
     trigger = 0
+    timer = FrameTimer(2400, 1. / fr, onset_frames=np.arange(0, 2400, 40),
+                       tags=(1. / (40 * fr),))
     # The iterable 'trial' randomizes the order of everything since it is
     # drawn from imorder_shuf
     t0 = time.time()
@@ -199,6 +205,7 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
         # The image is flipped ISI milliseconds after the blank
         if trigger:
             ec.stamp_triggers(1,check='int4',wait_for_last=False)
+            timer.trigger(frame, 1, ec.get_time())
         last_flip = ec.flip()
         
 #        last_flip - t1
@@ -211,11 +218,12 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
         
         ec.get_presses()
         ec.listen_presses()
-        frametimes.append(last_flip)
+        timer.flip(frame, last_flip)
         ec.check_force_quit()
         
         frame += 1
-print "\n\n Elasped time: %0.4f secs" % (time.time()-t0)
+    timer.save(op.splitext(ec.data_fname)[0] + '_timing.npz')
+print("\n\n Elasped time: %0.4f secs" % (time.time()-t0))
     # Now the experiment is over and we show 5 seconds of blank
 #    blank.draw(), fix.draw()
 #    ec.flip()
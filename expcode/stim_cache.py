@@ -0,0 +1,162 @@
+"""
+==========================
+Pre-decoded stimulus cache for the r21 experiments
+==========================
+Decode every image in a stimulus directory once, at the scale it will be
+shown at, into a single uint8 RGB(A) array on disk (plus an index of the
+file names). The experiment scripts memory-map that array, so loading the
+images for a block is a slice instead of hundreds of PIL decodes.
+
+Build the caches ahead of time with e.g.
+
+    python stim_cache.py --scale 0.5 ../stim/falsefont ../stim/word_c254_p0
+
+(they are also built on first use if missing or out of date).
+"""
+import glob
+import json
+import os
+from os import path as op
+
+import numpy as np
+from PIL import Image
+
+_RESAMPLE = getattr(Image, 'LANCZOS', getattr(Image, 'ANTIALIAS', None))
+
+
+def _cache_fnames(stim_dir, scale, cache_dir=None):
+    stim_dir = op.normpath(stim_dir)
+    if cache_dir is None:
+        cache_dir = op.join(op.dirname(stim_dir), '_cache')
+    stem = op.join(cache_dir, '%s_s%g' % (op.basename(stim_dir), scale))
+    return stem + '.npy', stem + '.json'
+
+
+def _decode_image(fname, scale):
+    img = Image.open(fname)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+    if scale != 1:
+        size = (int(round(img.size[0] * scale)),
+                int(round(img.size[1] * scale)))
+        img = img.resize(size, _RESAMPLE)
+    return np.array(img, np.uint8)
+
+
+def _is_current(stim_dir, scale, data_fname, index_fname):
+    if not (op.isfile(data_fname) and op.isfile(index_fname)):
+        return False
+    with open(index_fname) as fid:
+        index = json.load(fid)
+    names = sorted(op.basename(f) for f in glob.glob(op.join(stim_dir, '*')))
+    if index['scale'] != scale or index['fnames'] != names:
+        return False
+    built = op.getmtime(data_fname)
+    return all(op.getmtime(op.join(stim_dir, name)) <= built
+               for name in names)
+
+
+def build_stim_cache(stim_dir, scale=1., cache_dir=None):
+    """Decode all images in a directory into one uint8 array on disk.
+
+    Parameters
+    ----------
+
+    stim_dir : str
+        Directory of images (all must be the same size and number of
+        channels). Grayscale images are expanded to RGB.
+    scale : float
+        Scale the images are resized to (the ``scale`` that would otherwise
+        be passed to ``visual.RawImage``).
+    cache_dir : str | None
+        Where to write the cache; defaults to ``_cache`` next to
+        ``stim_dir``.
+
+    Returns
+    -------
+
+    data_fname : str
+        The ``.npy`` file holding an array of shape (n_images, height,
+        width, n_channels).
+    """
+    data_fname, index_fname = _cache_fnames(stim_dir, scale, cache_dir)
+    fnames = sorted(glob.glob(op.join(stim_dir, '*')))
+    if not len(fnames):
+        raise ValueError('No stimulus images found in %s' % stim_dir)
+    if not op.isdir(op.dirname(data_fname)):
+        os.makedirs(op.dirname(data_fname))
+    first = _decode_image(fnames[0], scale)
+    data = np.lib.format.open_memmap(data_fname, mode='w+', dtype=np.uint8,
+                                     shape=(len(fnames),) + first.shape)
+    data[0] = first
+    for ix, fname in enumerate(fnames[1:], 1):
+        img = _decode_image(fname, scale)
+        if img.shape != first.shape:
+            del data
+            os.remove(data_fname)
+            raise ValueError('Image %s has shape %s, expected %s (all images '
+                             'in a stimulus directory must match)'
+                             % (fname, img.shape, first.shape))
+        data[ix] = img
+    data.flush()
+    del data
+    with open(index_fname, 'w') as fid:
+        json.dump(dict(scale=scale,
+                       fnames=[op.basename(f) for f in fnames]), fid)
+    return data_fname
+
+
+class StimCache(object):
+    """Memory-mapped, pre-scaled images for a set of stimulus directories.
+
+    Parameters
+    ----------
+
+    stim_dirs : list of str
+        Stimulus directories to load (caches are built if missing or older
+        than the images).
+    scale : float
+        Scale to show the images at; pass ``scale=1.`` to ``visual.RawImage``
+        for images that come from the cache.
+    cache_dir : str | None
+        Where the caches live; defaults to ``_cache`` next to each directory.
+    """
+
+    def __init__(self, stim_dirs, scale=1., cache_dir=None):
+        self.scale = scale
+        self._files = dict()
+        self._lookup = dict()
+        for stim_dir in stim_dirs:
+            data_fname, index_fname = _cache_fnames(stim_dir, scale,
+                                                    cache_dir)
+            if not _is_current(stim_dir, scale, data_fname, index_fname):
+                build_stim_cache(stim_dir, scale, cache_dir)
+            with open(index_fname) as fid:
+                names = json.load(fid)['fnames']
+            data = np.load(data_fname, mmap_mode='r')
+            # same paths (and order) as sorted(glob.glob(stim_dir/*))
+            files = [op.join(stim_dir, name) for name in names]
+            self._files[stim_dir] = files
+            for ix, fname in enumerate(files):
+                self._lookup[fname] = (data, ix)
+
+    def files(self, stim_dir):
+        """Sorted image paths in a directory (like a sorted glob)."""
+        return list(self._files[stim_dir])
+
+    def get(self, fname):
+        """Return the (uint8, memory-mapped) image buffer for a path."""
+        data, ix = self._lookup[fname]
+        return data[ix]
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Build stimulus caches.')
+    parser.add_argument('stim_dirs', nargs='+')
+    parser.add_argument('--scale', type=float, default=1.)
+    parser.add_argument('--cache-dir', default=None)
+    args = parser.parse_args()
+    for stim_dir in args.stim_dirs:
+        print('Wrote %s' % build_stim_cache(stim_dir, args.scale,
+                                            args.cache_dir))
@@ -3,6 +3,7 @@
 Display images for MEG
 ==========================
 """
+from __future__ import print_function
 import numpy as np
 from expyfun import visual, ExperimentController
 from expyfun.io import write_hdf5
@@ -25,6 +26,8 @@ else:
 basedir = os.path.join('C:\\Users\\neuromag\\Desktop\\jason\\wordStim')
 if not os.path.isdir(basedir):
     basedir = os.path.join('/mnt/diskArray/projects/MEG/wordStim')
+if not os.path.isdir(basedir):
+    basedir = os.path.join(op.expanduser("~"),'git','SSWEF','stim')
 
 """ Words, False fonts (Korean), Faces, Objects """
 imagedirs = ['word_c254_p0', 'word_c254_p50', 'word_c254_p80', 'bigram_c254_p20']
@@ -152,8 +155,8 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
         ec.check_force_quit()
 
     # make a blank image
-    blank = visual.RawImage(ec, np.tile(bgcolor[0], np.multiply([s, s, 1], (121, 245, 3))))
-    bright = visual.RawImage(ec, np.tile([1.], np.multiply([s, s, 1], (121, 245, 3))))
+    blank = visual.RawImage(ec, np.tile(bgcolor[0], np.multiply([s, s, 1], (121, 245, 3)).astype(int)))
+    bright = visual.RawImage(ec, np.tile([1.], np.multiply([s, s, 1], (121, 245, 3)).astype(int)))
     # Calculate stimulus size
     d_pix = -np.diff(ec._convert_units([[3., 0.], [3., 0.]], 'deg', 'pix'), axis=-1)
 
@@ -205,7 +208,7 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
 #            if flicker < len(frame_flicker)-2:
 #                flicker += 1
                 
-        if frame == frame_img[trial]:
+        if trial < len(frame_img) and frame == frame_img[trial]:
 #                ec.write_data_line('imnumber', imnumber[trial])
 #                ec.write_data_line('imtype', imtype[trial])
 #                trig = imtype[trial]
@@ -239,8 +242,8 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
         frame += 1
 
     # Now the experiment is over and we show 5 seconds of blank
-    print "\n\n Elasped time: %0.4f secs" % (time.time()-t0)
-    print "\n\n Targeted time: %0.4f secs" % total_time
+    print("\n\n Elasped time: %0.4f secs" % (time.time()-t0))
+    print("\n\n Targeted time: %0.4f secs" % total_time)
     blank.draw(), fix.draw()
     ec.flip()
     ec.wait_secs(5.0)
@@ -3,6 +3,7 @@
 Display images for MEG
 ==========================
 """
+from __future__ import print_function
 import numpy as np
 from expyfun import visual, ExperimentController
 from expyfun.io import write_hdf5
@@ -25,6 +26,8 @@ else:
 basedir = os.path.join('C:\\Users\\neuromag\\Desktop\\jason\\wordStim')
 if not os.path.isdir(basedir):
     basedir = os.path.join('/mnt/diskArray/projects/MEG/wordStim')
+if not os.path.isdir(basedir):
+    basedir = os.path.join(op.expanduser("~"),'git','SSWEF','stim')
 
 """ Words, False fonts (Korean), Faces, Objects """
 imagedirs = ['falsefont', 'word_c254_p0']
@@ -162,8 +165,8 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
         ec.check_force_quit()
 
     # make a blank image
-    blank = visual.RawImage(ec, np.tile(bgcolor[0], np.multiply([s, s, 1], img_buffer.shape)))
-    bright = visual.RawImage(ec, np.tile([1.], np.multiply([s, s, 1], img_buffer.shape)))
+    blank = visual.RawImage(ec, np.tile(bgcolor[0], np.multiply([s, s, 1], img_buffer.shape).astype(int)))
+    bright = visual.RawImage(ec, np.tile([1.], np.multiply([s, s, 1], img_buffer.shape).astype(int)))
     # Calculate stimulus size
     d_pix = -np.diff(ec._convert_units([[3., 0.], [3., 0.]], 'deg', 'pix'), axis=-1)
 
@@ -248,8 +251,8 @@ with ExperimentController('ShowImages', full_screen=True) as ec:
             ec.check_force_quit()
         frame += 1
     # Now the experiment is over and we show 5 seconds of blank
-    print "\n\n Elasped time: %0.4f secs" % (time.time()-t0)
-    print "\n\n Targeted time: %0.4f secs" % total_time
+    print("\n\n Elasped time: %0.4f secs" % (time.time()-t0))
+    print("\n\n Targeted time: %0.4f secs" % total_time)
 #    blank.draw(), fix.draw()
 #    ec.flip()
 #    ec.wait_secs(5.0)
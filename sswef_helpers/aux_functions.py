@@ -1,18 +1,37 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import os
+import sys
+import json
+import time
+import hashlib
+import atexit
+import tempfile
 import yaml
+from contextlib import contextmanager
 from functools import partial
 import numpy as np
 from mne import read_source_spaces, add_source_space_distances
 
-paramdir = os.path.join('..', '..', 'params')
+# e.g. PREK_PARAMS=/tmp/prek-synth/params (see make_synthetic_dataset.py)
+paramdir = os.getenv('PREK_PARAMS', os.path.join('..', '..', 'params'))
 yamload = partial(yaml.load, Loader=yaml.FullLoader)
 
 with open(os.path.join(paramdir, 'current_cohort.yaml'), 'r') as f:
     cohort = yamload(f)
 
 PREPROCESS_JOINTLY = False  # controls folder path
+# 'single' keeps epochs, STCs & stats inputs as float32/complex64, in their
+# own results folder (see load_paths); e.g. PREK_PRECISION=single
+PRECISION = os.getenv('PREK_PRECISION', 'double')
+# JSON-lines file to record the time, memory & I/O of every script that
+# imports this module (see StageProfiler); e.g. PREK_PROFILE=run-log.jsonl
+PROFILE = os.getenv('PREK_PROFILE')
+# record how outputs are made (see stamp); run_pipeline.py turns this on
+PROVENANCE = os.getenv('PREK_PROVENANCE', '') not in ('', '0')
+# where the hashes of input files are kept between runs (see file_hash)
+HASH_CACHE = os.getenv('PREK_HASH_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'prek-file-hashes.json'))
 
 
 def load_params(skip=True, experiment=None):
@@ -36,6 +55,10 @@ def load_subjects(cohort, experiment=None, skip=True):
     if skip:
         skips = _get_skips(experiment)
         subjects = sorted(set(subjects) - skips)
+    # only run some subjects (e.g., one per process; see run_pipeline.py)
+    only = os.getenv('PREK_SUBJECTS')
+    if only:
+        subjects = [s for s in subjects if s in only.split(',')]
     return subjects
 
 
@@ -97,12 +120,14 @@ def load_cohorts(experiment=None):
     return intervention_groups, letter_knowledge_groups
 
 
-def load_paths():
+def load_paths(precision=None):
     """Load necessary filesystem paths."""
     with open(os.path.join(paramdir, 'paths.yaml'), 'r') as f:
         paths = yamload(f)
+    precision = PRECISION if precision is None else precision
+    suffix = '' if precision == 'double' else f'-{precision}'
     paths['results_dir'] = os.path.join(
-        paths['results_dir'], f'{cohort}-long-tsss')
+        paths['results_dir'], f'{cohort}-long-tsss{suffix}')
     return paths['data_root'], paths['subjects_dir'], paths['results_dir']
 
 
@@ -176,7 +201,8 @@ def define_labels(region, action, hemi, subjects_dir=None):
     return merged_label
 
 
-def get_stc_from_conditions(method, timepoint, condition, subject):
+def get_stc_from_conditions(method, timepoint, condition, subject,
+                            store=None):
     """Load an STC file for the given experimental conditions.
 
     Parameters
@@ -193,8 +219,25 @@ def get_stc_from_conditions(method, timepoint, condition, subject):
         Can be a subject identifier ('prek_1103'), a group name ('language',
         'letter', 'upper', or 'lower'), or `None` (to get grand average of all
         subjects).
+
+    store : str | STCStore | None
+        STC store (see ``write_stc_store``) to read subject STCs from. STCs
+        that are not in the store (e.g., group averages) are read from their
+        files.
     """
     from mne import read_source_estimate
+    if store is not None:
+        if isinstance(store, str):
+            store = _open_stc_store(store)
+        # SNR is computed from the STC of the inverse method that was used
+        store_method = (load_inverse_params()['method'] if method == 'snr'
+                        else method)
+        key = (subject, timepoint, condition, store_method)
+        if key in store:
+            stc = store.get_stc(*key)
+            if method == 'snr':
+                stc.data = div_by_adj_bins(np.abs(stc.data))
+            return stc
     data_root, _, results_dir = load_paths()
     # allow both groups and subjects as the "subject" argument
     group_map = {None: 'GrandAvg',
@@ -219,22 +262,122 @@ def get_stc_from_conditions(method, timepoint, condition, subject):
                               'morphed-to-fsaverage', chosen_constraints)
     stc_path = os.path.join(folder, fname)
     stc = read_source_estimate(stc_path)
+    _hdf5_read.append(stc_path)
     if method == 'snr':
         stc.data = div_by_adj_bins(np.abs(stc.data))
     return stc
 
 
+def _split_stc(stc, tmins, n_times):
+    """Split a time-concatenated STC back into separate STCs."""
+    bounds = np.cumsum([0] + list(n_times))
+    return [stc.__class__(stc.data[..., start:stop], stc.vertices, tmin=tmin,
+                          tstep=stc.tstep, subject=stc.subject)
+            for tmin, start, stop in zip(tmins, bounds[:-1], bounds[1:])]
+
+
+def apply_inverse_batch(evokeds, inverse, lambda2, method='dSPM',
+                        pick_ori=None, morph=None):
+    """Apply an inverse operator (and optionally a morph) to several evokeds.
+
+    Gives the same STCs as calling ``apply_inverse`` (and ``morph.apply``) on
+    each evoked, but evokeds are concatenated in time so that the inverse is
+    prepared, and the kernel and morph matrix applied, once per batch. The
+    noise normalization of dSPM / sLORETA depends on ``nave``, so there is
+    one batch per distinct ``nave`` (equalized conditions share a batch).
+
+    Returns
+    -------
+
+    stcs : list of SourceEstimate
+        One per evoked, in the same order.
+
+    morphed_stcs : list of SourceEstimate | None
+        The morphed STCs (``None`` if ``morph`` is ``None``).
+    """
+    from mne import EvokedArray
+    from mne.minimum_norm import apply_inverse, prepare_inverse_operator
+    stcs = [None] * len(evokeds)
+    morphed_stcs = [None] * len(evokeds)
+    for nave in sorted(set(evk.nave for evk in evokeds)):
+        idxs = [ix for ix, evk in enumerate(evokeds) if evk.nave == nave]
+        batch = [evokeds[ix] for ix in idxs]
+        assert all(evk.ch_names == batch[0].ch_names for evk in batch)
+        # stack along time & apply inverse (prepared once for this batch)
+        stacked = EvokedArray(np.concatenate([evk.data for evk in batch],
+                                             axis=-1),
+                              batch[0].info, tmin=batch[0].tmin, nave=nave)
+        prepared_inv = prepare_inverse_operator(inverse, nave, lambda2,
+                                                method=method)
+        stc = apply_inverse(stacked, prepared_inv, lambda2, method=method,
+                            pick_ori=pick_ori, prepared=True)
+        # split back into one STC per evoked
+        tmins = [evk.tmin for evk in batch]
+        n_times = [evk.times.size for evk in batch]
+        for ix, this_stc in zip(idxs, _split_stc(stc, tmins, n_times)):
+            stcs[ix] = this_stc
+        if morph is not None:
+            morphed = morph.apply(stc)
+            for ix, this_stc in zip(idxs, _split_stc(morphed, tmins,
+                                                     n_times)):
+                morphed_stcs[ix] = this_stc
+    return stcs, (None if morph is None else morphed_stcs)
+
+
 def get_dataframe_from_label(label, src, methods=('dSPM', 'MNE'),
                              timepoints=('pre', 'post'),
                              conditions=('words', 'faces', 'cars', 'aliens'),
                              subjects=None, unit='time',
-                             experiment=None):
+                             experiment=None, store=None):
     """Get average timecourse within label across all subjects."""
-    from pandas import DataFrame, concat, melt
-    from mne import Label, extract_label_time_course
-    # allow looping over single Label
-    if isinstance(label, Label):
-        label = [label]
+    # allow passing a single label wrapped in a list
+    if isinstance(label, (list, tuple)):
+        (label,) = label
+    dfs = get_dataframes_from_labels(
+        dict(label=label), src, methods=methods, timepoints=timepoints,
+        conditions=conditions, subjects=subjects, unit=unit,
+        experiment=experiment, store=store)
+    return dfs['label']
+
+
+def _extract_subject_time_courses(subj, labels, src, methods, timepoints,
+                                  conditions, store=None):
+    """Extract the mean time course in each label, for one subject."""
+    from mne import extract_label_time_course
+    n_read = len(_hdf5_read)
+    # shape: (n_labels, n_methods, n_timepoints, n_conditions, n_times)
+    time_courses = list()
+    for method in methods:
+        for timept in timepoints:
+            for cond in conditions:
+                # load STC once, extract all labels from it
+                stc = get_stc_from_conditions(method, timept, cond, subj,
+                                              store=store)
+                time_courses.append(extract_label_time_course(
+                    stc, labels, src=src, mode='mean'))
+    time_courses = np.stack(time_courses, axis=1)
+    new_shape = (len(labels), len(methods), len(timepoints), len(conditions),
+                 -1)
+    # the files read (for provenance records, if this is a joblib worker)
+    return time_courses.reshape(new_shape), stc.times, _hdf5_read[n_read:]
+
+
+def get_dataframes_from_labels(labels, src, methods=('dSPM', 'MNE'),
+                               timepoints=('pre', 'post'),
+                               conditions=('words', 'faces', 'cars',
+                                           'aliens'),
+                               subjects=None, unit='time', experiment=None,
+                               n_jobs=1, store=None):
+    """Get average timecourses within several labels across all subjects.
+
+    Each subject's STCs are loaded only once, no matter how many labels there
+    are. ``labels`` is a dict of labels; the returned dict of (long-format)
+    DataFrames has the same keys. Subjects are processed in parallel if
+    ``n_jobs > 1``. STCs are read from ``store`` (the file name of an STC
+    store; see ``write_stc_store``) where possible.
+    """
+    from pandas import DataFrame, MultiIndex
+    from mne.parallel import parallel_func
     # load subjects list
     if subjects is None:
         _, _, subjects, _ = load_params(experiment=experiment)
@@ -248,55 +391,390 @@ def get_dataframe_from_label(label, src, methods=('dSPM', 'MNE'),
     knowledge_map = {subj: group.lower()[:-9]
                      for group, members in letter_knowledge_group.items()
                      for subj in members}
+    # one pass over subjects, extracting all labels at once
+    parallel, run_func, _ = parallel_func(_extract_subject_time_courses,
+                                          n_jobs)
+    results = parallel(
+        run_func(subj, list(labels.values()), src, methods, timepoints,
+                 conditions, store) for subj in subjects)
+    # shape: (n_labels, n_subjects, n_methods, n_timepoints, n_conditions,
+    #         n_times)
+    time_courses = np.stack([tcs for tcs, _, _ in results], axis=1)
+    times = results[0][1]
+    if n_jobs != 1:
+        _hdf5_read.extend(fname for *_, fnames in results for fname in fnames)
+    # long format (same row order as melting a wide, subject-column table)
+    index = MultiIndex.from_product(
+        [subjects, methods, timepoints, conditions, times],
+        names=['subj', 'method', 'timepoint', 'condition', unit])
+    columns = [unit, 'condition', 'timepoint', 'method', 'subj', 'value']
+    dfs = dict()
+    for key, data in zip(labels, time_courses):
+        df = DataFrame(dict(value=data.ravel()), index=index).reset_index()
+        df = df[columns]
+        # add columns for intervention cohort and pretest letter knowledge
+        df['intervention'] = df['subj'].map(intervention_map)
+        df['pretest'] = df['subj'].map(knowledge_map)
+        dfs[key] = df
+    return dfs
 
-    time_courses = dict()
-    # loop over source localization algorithms
-    for method in methods:
-        time_courses[method] = dict()
-        # loop over pre/post measurement time
-        for timept in timepoints:
-            time_courses[method][timept] = dict()
-            # loop over conditions
-            for cond in conditions:
-                time_courses[method][timept][cond] = dict()
-                # loop over subjects
-                for subj in subjects:
-                    # load STC
-                    stc = get_stc_from_conditions(method, timept, cond, subj)
-                    # extract label time course
-                    time_courses[method][timept][cond][subj] = np.squeeze(
-                        extract_label_time_course(stc, label, src=src,
-                                                  mode='mean'))
-                # convert dict of each subj's time series to DataFrame
-                df = DataFrame(time_courses[method][timept][cond],
-                               index=range(len(stc.times)))
-                df[unit] = stc.times
-                time_courses[method][timept][cond] = df
-                # store current "condition" in a column before exiting loop
-                time_courses[method][timept][cond]['condition'] = cond
-            # combine DataFrames across conditions
-            dfs = (time_courses[method][timept][c] for c in conditions)
-            time_courses[method][timept] = concat(dfs)
-            # store current "timepoint" in a column before exiting loop
-            time_courses[method][timept]['timepoint'] = timept
-        # combine DataFrames across timepoints
-        dfs = (time_courses[method][t] for t in timepoints)
-        time_courses[method] = concat(dfs)
-        # store current "method" in a column before exiting loop
-        time_courses[method]['method'] = method
-    # combine DataFrames across methods
-    dfs = (time_courses[m] for m in methods)
-    time_courses = concat(dfs)
-
-    # reshape DataFrame
-    all_cols = time_courses.columns.values
-    subj_cols = time_courses.columns.str.startswith('prek')
-    id_vars = all_cols[np.logical_not(subj_cols)]
-    time_courses = melt(time_courses, id_vars=id_vars, var_name='subj')
-    # add columns for intervention cohort and pretest letter knowledge
-    time_courses['intervention'] = time_courses['subj'].map(intervention_map)
-    time_courses['pretest'] = time_courses['subj'].map(knowledge_map)
-    return time_courses
+
+def _roi_timeseries_dtypes():
+    """Dtypes of the long-format dataframes from get_dataframe_from_label."""
+    from pandas import CategoricalDtype, StringDtype
+    return dict(
+        value=float,
+        subj=StringDtype(),
+        pretest=CategoricalDtype(categories=['lower', 'upper'], ordered=True),
+        timepoint=CategoricalDtype(categories=['pre', 'post'], ordered=True),
+        condition='category',  # categories differ between ERP and PSKT
+        intervention=CategoricalDtype(categories=['letter', 'language']),
+    )
+
+
+def write_roi_timeseries(df, store_dir):
+    """Write ROI time series to a dataset partitioned by ROI and method.
+
+    Parameters
+    ----------
+
+    df : pandas.DataFrame
+        Long-format dataframe from ``get_dataframe_from_label``, with an added
+        ``roi`` column.
+
+    store_dir : str
+        Path to the (Parquet) dataset. Partitions for the ROI(s) and method(s)
+        present in ``df`` are replaced; other partitions are left alone.
+    """
+    df = df.reset_index(drop=True).astype(_roi_timeseries_dtypes())
+    df.to_parquet(store_dir, partition_cols=['roi', 'method'], index=False,
+                  existing_data_behavior='delete_matching')
+
+
+def load_roi_timeseries(store_dir, rois=None, methods=None):
+    """Load ROI time series written by ``write_roi_timeseries``.
+
+    Only the partitions matching ``rois`` and ``methods`` are read (``None``
+    means "all"). Categorical dtypes are restored.
+    """
+    from pandas import read_parquet
+    filters = list()
+    for column, values in dict(roi=rois, method=methods).items():
+        if values is None:
+            continue
+        if isinstance(values, str):
+            values = [values]
+        filters.append((column, 'in', list(values)))
+    df = read_parquet(store_dir, filters=filters or None)
+    return df.astype(_roi_timeseries_dtypes())
+
+
+def load_roi_contrast_arrays(store_dir, roi, method='dSPM',
+                             baseline='words', contrasts=('cars', 'faces'),
+                             groups=('letter', 'language'), unit='time'):
+    """Load post-minus-pre condition contrasts in a ROI, ready for clustering.
+
+    Returns
+    -------
+
+    arrays : dict
+        Keys are contrast names like ``'words_minus_cars'``; values are dicts
+        mapping each intervention group to ``dict(subjs=..., data=...)``,
+        where ``data`` has shape (n_subjects, n_times, 1).
+
+    times : np.ndarray
+        The time (or frequency) of each column of ``data``.
+    """
+    df = load_roi_timeseries(store_dir, rois=roi, methods=method)
+    df = df.loc[df['condition'].isin((baseline,) + tuple(contrasts))]
+    # one pivot gets us subj × (timepoint, condition, time)
+    wide = df.pivot(index=['intervention', 'subj'],
+                    columns=['timepoint', 'condition', unit], values='value')
+    post_minus_pre = wide['post'] - wide['pre']
+    arrays = dict()
+    for contrast in contrasts:
+        diff = post_minus_pre[baseline] - post_minus_pre[contrast]
+        arrays[f'{baseline}_minus_{contrast}'] = {
+            group: dict(subjs=diff.loc[group].index.to_list(),
+                        # add extra dimension for "vertex/channel"
+                        data=diff.loc[group].to_numpy()[..., np.newaxis])
+            for group in groups}
+    times = diff.columns.to_numpy()
+    return arrays, times
+
+
+def stc_store_fname(experiment, constraints=None):
+    """Path of the STC store of an experiment ('erp' or 'pskt').
+
+    ``constraints`` (e.g., 'free-magnitude') defaults to the one in
+    ``inverse_params.yaml``.
+    """
+    _, _, results_dir = load_paths()
+    if constraints is None:
+        constraints = ('{orientation_constraint}-{estimate_type}'
+                       ).format_map(load_inverse_params())
+    return os.path.join(results_dir, 'stc-store',
+                        f'{experiment}-{constraints}-stcs.h5')
+
+
+def write_stc_store(fname, subjects, timepoints, conditions, methods,
+                    chunk_subjects=1, chunk_mb=0.25, complevel=5,
+                    overwrite=False):
+    """Collect subject STCs (on fsaverage) into one chunked, compressed array.
+
+    The array has dimensions (subject, timepoint, condition, method, vertex,
+    time/freq). Each chunk holds ``chunk_subjects`` subjects × a block of
+    vertices × all times/freqs (about ``chunk_mb`` MB). Reading one subject's
+    map decompresses ``chunk_subjects`` maps, and reading one vertex (or a
+    label) across subjects decompresses the chunk's block of vertices for
+    every map; the defaults (one subject, ~100 vertices per chunk) keep both
+    small. Chunks are compressed with blosc (lz4, with byte shuffling). The
+    dtype is that of the STCs (float32 for ``.stc`` files, complex for the
+    SSVEP STCs).
+
+    Parameters
+    ----------
+
+    fname : str
+        The HDF5 file to write (see ``stc_store_fname``).
+
+    subjects, timepoints, conditions, methods : list of str
+        Labels of each dimension; the STCs are loaded with
+        ``get_stc_from_conditions``.
+
+    chunk_subjects : int
+        Number of subjects per chunk.
+
+    chunk_mb : float
+        Approximate chunk size (MB).
+
+    complevel : int
+        Compression level (0-9).
+
+    overwrite : bool
+        Whether to overwrite an existing store.
+    """
+    import tables
+    if os.path.exists(fname) and not overwrite:
+        raise FileExistsError(f'{fname} exists; use overwrite=True')
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    subjects, timepoints, conditions, methods = [
+        list(axis) for axis in (subjects, timepoints, conditions, methods)]
+    stc = get_stc_from_conditions(methods[0], timepoints[0], conditions[0],
+                                  subjects[0])
+    n_vertices, n_times = stc.data.shape
+    chunk_subjects = min(chunk_subjects, len(subjects))
+    chunk_vertices = int(chunk_mb * 2 ** 20 / (
+        chunk_subjects * n_times * stc.data.dtype.itemsize))
+    chunk_vertices = int(np.clip(chunk_vertices, 1, n_vertices))
+    shape = (len(subjects), len(timepoints), len(conditions), len(methods),
+             n_vertices, n_times)
+    filters = tables.Filters(complevel=complevel, complib='blosc:lz4',
+                             shuffle=True)
+    with tables.open_file(fname, 'w') as h5:
+        data = h5.create_carray(
+            '/', 'data', tables.Atom.from_dtype(stc.data.dtype), shape=shape,
+            chunkshape=(chunk_subjects, 1, 1, 1, chunk_vertices, n_times),
+            filters=filters)
+        for hemi, vertices in zip(('lh', 'rh'), stc.vertices):
+            h5.create_array('/', f'vertices_{hemi}', vertices)
+        data.attrs.subjects = subjects
+        data.attrs.timepoints = timepoints
+        data.attrs.conditions = conditions
+        data.attrs.methods = methods
+        data.attrs.tmin = stc.tmin
+        data.attrs.tstep = stc.tstep
+        data.attrs.subject = stc.subject or 'fsaverage'
+        # write whole chunks (all subjects of a chunk at once)
+        for start in range(0, len(subjects), chunk_subjects):
+            these_subjects = subjects[start:start + chunk_subjects]
+            for ti, timepoint in enumerate(timepoints):
+                for ci, condition in enumerate(conditions):
+                    for mi, method in enumerate(methods):
+                        block = list()
+                        for subject in these_subjects:
+                            stc = get_stc_from_conditions(
+                                method, timepoint, condition, subject)
+                            assert stc.data.shape == shape[-2:]
+                            block.append(stc.data)
+                        data[start:start + len(block), ti, ci, mi] = block
+
+
+class STCStore:
+    """Read access to an STC store written by ``write_stc_store``.
+
+    Parameters
+    ----------
+
+    fname : str
+        The store (HDF5 file).
+    """
+
+    def __init__(self, fname):
+        import tables
+        self.fname = fname
+        self._h5 = tables.open_file(fname, 'r')
+        _hdf5_read.append(fname)
+        atexit.register(self.close)  # if the script doesn't
+        self._data = self._h5.root.data
+        attrs = self._data.attrs
+        self.subjects = list(attrs.subjects)
+        self.timepoints = list(attrs.timepoints)
+        self.conditions = list(attrs.conditions)
+        self.methods = list(attrs.methods)
+        self.subject = attrs.subject
+        self.tmin = attrs.tmin
+        self.tstep = attrs.tstep
+        self.vertices = [self._h5.root.vertices_lh.read(),
+                         self._h5.root.vertices_rh.read()]
+        n_times = self._data.shape[-1]
+        self.times = self.tmin + self.tstep * np.arange(n_times)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __contains__(self, key):
+        """Whether a (subject, timepoint, condition, method) is stored."""
+        return all(value in axis for value, axis in zip(
+            key, (self.subjects, self.timepoints, self.conditions,
+                  self.methods)))
+
+    def close(self):
+        self._h5.close()
+
+    def get_data(self, subjects=None, timepoints=None, conditions=None,
+                 methods=None, vertices=None):
+        """Read a block of the store.
+
+        Parameters
+        ----------
+
+        subjects, timepoints, conditions, methods : list of str | None
+            Which entries of each dimension to read (``None`` means all).
+
+        vertices : slice | array of int | None
+            Rows of the STC data to read (e.g., ``slice(0, n_lh)`` for the
+            left hemisphere). Only the chunks spanned by the rows are read.
+
+        Returns
+        -------
+
+        data : np.ndarray
+            Shape (n_subjects, n_timepoints, n_conditions, n_methods,
+            n_vertices, n_times).
+        """
+        idx = list()
+        for values, axis in ((subjects, self.subjects),
+                             (timepoints, self.timepoints),
+                             (conditions, self.conditions),
+                             (methods, self.methods)):
+            if values is None:
+                values = axis
+            missing = [value for value in values if value not in axis]
+            if missing:
+                raise KeyError(f'{missing} not in the STC store {self.fname}')
+            idx.append([axis.index(value) for value in values])
+        rows = slice(None) if vertices is None else vertices
+        if not isinstance(rows, slice):
+            # read the span of the rows, then pick them out
+            rows = np.asarray(rows)
+            span = slice(rows.min(), rows.max() + 1)
+            rows = rows - span.start
+        else:
+            span, rows = rows, slice(None)
+        # a slice of subjects if possible (much faster than a list)
+        first = idx[0][0]
+        contiguous = idx[0] == list(range(first, first + len(idx[0])))
+        out = list()
+        for ti in idx[1]:
+            for ci in idx[2]:
+                for mi in idx[3]:
+                    if contiguous:
+                        block = self._data[first:first + len(idx[0]), ti, ci,
+                                           mi, span]
+                    else:
+                        block = np.stack([self._data[si, ti, ci, mi, span]
+                                          for si in idx[0]])
+                    out.append(block[:, rows])
+        shape = (len(idx[0]),) + tuple(len(ix) for ix in idx[1:])
+        out = np.stack(out, axis=1)
+        return out.reshape(shape + out.shape[-2:])
+
+    def get_stc(self, subject, timepoint, condition, method):
+        """Read one STC."""
+        from mne import SourceEstimate
+        data = self.get_data([subject], [timepoint], [condition], [method])
+        return SourceEstimate(data[0, 0, 0, 0], self.vertices, tmin=self.tmin,
+                              tstep=self.tstep, subject=self.subject)
+
+
+_stc_stores = dict()
+
+
+def _open_stc_store(fname):
+    """Open an STC store once per process."""
+    if fname not in _stc_stores:
+        _stc_stores[fname] = STCStore(fname)
+    return _stc_stores[fname]
+
+
+def make_threshold_labels(stc, src, thresholds, time_idx=0):
+    """Make filled labels of the vertices exceeding each of several thresholds.
+
+    Equivalent to making ``Label(np.where(data >= threshold))`` and calling
+    ``label.fill(src)`` for each threshold and hemisphere, but vertices are
+    sorted by value only once per hemisphere, and the filling uses the source
+    space's nearest-vertex map directly, so each extra threshold is cheap
+    (labels for higher thresholds are subsets of those for lower thresholds).
+
+    Parameters
+    ----------
+
+    stc : SourceEstimate
+        The data to threshold.
+
+    src : SourceSpaces
+        Source space of ``stc``, with patch information (see
+        ``load_fsaverage_src``).
+
+    thresholds : array-like
+        The thresholds to apply.
+
+    time_idx : int
+        Which time point (or frequency bin) of ``stc`` to threshold.
+
+    Returns
+    -------
+
+    labels : dict
+        Keys are the thresholds; values are dicts with keys ``'lh'`` and
+        ``'rh'`` and filled Labels as values.
+    """
+    from mne import Label
+    thresholds = np.asarray(thresholds)
+    labels = {threshold: dict() for threshold in thresholds}
+    hemi_data = (stc.lh_data[:, time_idx], stc.rh_data[:, time_idx])
+    for hemi, data, vertno, hemi_src in zip(('lh', 'rh'), hemi_data,
+                                            stc.vertices, src):
+        # sort once (descending), then each threshold is just a count
+        order = np.argsort(-data, kind='stable')
+        n_supra = np.searchsorted(-data[order], -thresholds, side='right')
+        # rank of each source vertex in the sorted order (or n_verts + 1 if
+        # not in the STC) mapped onto every surface vertex via its nearest
+        # source vertex
+        rank = np.full(hemi_src['np'], data.size + 1)
+        rank[vertno[order]] = np.arange(data.size)
+        surface_rank = rank[hemi_src['nearest']]
+        for threshold, n in zip(thresholds, n_supra):
+            vertices = np.flatnonzero(surface_rank < n)
+            labels[threshold][hemi] = Label(
+                vertices, pos=hemi_src['rr'][vertices],
+                values=np.ones(vertices.size), hemi=hemi,
+                subject=stc.subject)
+    return labels
 
 
 def set_brain_view_distance(brain, views, hemi, distance):
@@ -311,15 +789,187 @@ def set_brain_view_distance(brain, views, hemi, distance):
 
 
 def plot_label(label, img_path, alpha=1., **kwargs):
-    from mne.viz import Brain
-    defaults = dict(surf='inflated')
-    defaults.update(kwargs)
-    brain = Brain('fsaverage', **defaults)
-    brain.add_label(label, alpha=alpha)
-    brain.save_image(img_path)
+    renderer = get_brain_renderer()
+    frame = dict(img_path=img_path, labels=[(label, dict(alpha=alpha))])
+    renderer.render([frame], brain_kwargs=kwargs)
     return img_path
 
 
+def use_offscreen_rendering():
+    """Render figures without a display (e.g., in parallel workers)."""
+    import matplotlib
+    import pyvista
+    matplotlib.use('Agg')
+    pyvista.OFF_SCREEN = True
+
+
+# kwargs of SourceEstimate.plot that belong to Brain.add_data
+_ADD_DATA_KWARGS = ('colormap', 'transparent', 'smoothing_steps', 'time_label',
+                    'colorbar', 'time_label_size', 'initial_time')
+# kwargs of SourceEstimate.plot that are meaningless for a static image
+_INTERACTIVE_KWARGS = ('time_viewer', 'show_traces', 'time_unit')
+
+
+def _clim_to_add_data_kwargs(clim, data):
+    """Convert ``clim`` (as for ``SourceEstimate.plot``) to add_data kwargs."""
+    if clim == 'auto':
+        diverging = (data < 0).any()
+        lims = [96, 97.5, 99.95]
+        clim = dict(kind='percent')
+        clim['pos_lims' if diverging else 'lims'] = lims
+    diverging = 'pos_lims' in clim
+    lims = np.array(clim['pos_lims' if diverging else 'lims'], float)
+    if clim.get('kind', 'percent') == 'percent':
+        lims = np.percentile(np.abs(data) if diverging else data, lims)
+    return dict(fmin=lims[0], fmid=lims[1], fmax=lims[2],
+                center=0. if diverging else None,
+                colormap='mne' if diverging else 'hot', transparent=True)
+
+
+class BrainRenderer:
+    """Pool of re-usable, offscreen ``mne.viz.Brain`` instances.
+
+    Constructing a Brain (loading surfaces, building the scene) takes much
+    longer than drawing labels or data on an existing one, so a Brain is made
+    once per combination of constructor arguments (views, hemi, size...) and
+    cleaned up after each use, rather than re-made for every image. A Brain
+    that data were added to is closed after its batch instead (``Brain`` has
+    no public way to remove the colorbar and time label that come with the
+    data), so only the images of one batch share it.
+
+    Parameters
+    ----------
+
+    subject : str
+        The FreeSurfer subject whose surfaces are shown.
+
+    subjects_dir : str | None
+        FreeSurfer subjects directory (a ``subjects_dir`` in
+        ``brain_kwargs``, or in those passed to ``render``, overrides it).
+
+    **brain_kwargs
+        Default keyword arguments for ``Brain`` (or ``SourceEstimate.plot``,
+        e.g., from ``brain_plot_params.yaml``). Can be overridden in
+        ``render``.
+    """
+
+    def __init__(self, subject='fsaverage', subjects_dir=None,
+                 **brain_kwargs):
+        use_offscreen_rendering()
+        self.subject = subject
+        self.subjects_dir = subjects_dir
+        self.brain_kwargs = dict(surf='inflated')
+        self.brain_kwargs.update(brain_kwargs)
+        self._pool = dict()
+
+    def _split_kwargs(self, brain_kwargs):
+        """Separate Brain kwargs from add_data kwargs."""
+        kwargs = dict(subjects_dir=self.subjects_dir)
+        kwargs.update(self.brain_kwargs)
+        kwargs.update(brain_kwargs or dict())
+        if 'surface' in kwargs:
+            kwargs['surf'] = kwargs.pop('surface')
+        data_kwargs = {key: kwargs.pop(key) for key in _ADD_DATA_KWARGS
+                       if key in kwargs}
+        for key in _INTERACTIVE_KWARGS:
+            kwargs.pop(key, None)
+        return kwargs, data_kwargs
+
+    def _get_brain(self, **kwargs):
+        """Get a Brain (and its key) from the pool, making it if needed."""
+        from mne.viz import Brain
+        key = repr(sorted(kwargs.items()))
+        if key not in self._pool:
+            self._pool[key] = Brain(self.subject, show=False, **kwargs)
+        return self._pool[key], key
+
+    def render(self, frames, stc=None, clim='auto', brain_kwargs=None,
+               data_kwargs=None):
+        """Render a batch of images on a single Brain.
+
+        Parameters
+        ----------
+
+        frames : list of dict
+            One dict per image. Required key ``img_path``; optional keys
+            ``labels`` (list of Labels, or of ``(label, add_label_kwargs)``
+            tuples), ``time`` (which time/frequency of ``stc`` to show) and
+            ``view`` (dict of ``Brain.show_view`` kwargs).
+
+        stc : SourceEstimate | None
+            Data to show under the labels (added once for the whole batch).
+
+        clim : 'auto' | dict
+            Colormap limits for ``stc``, as in ``SourceEstimate.plot``.
+
+        brain_kwargs : dict | None
+            Overrides of the default Brain kwargs (determines which Brain
+            from the pool is used).
+
+        data_kwargs : dict | None
+            Extra kwargs for ``Brain.add_data`` (e.g., ``smoothing_steps``).
+
+        Returns
+        -------
+
+        img_paths : list of str
+        """
+        brain_kwargs, _data_kwargs = self._split_kwargs(brain_kwargs)
+        _data_kwargs.update(data_kwargs or dict())
+        brain, key = self._get_brain(**brain_kwargs)
+        shown_hemis = brain_kwargs.get('hemi', 'both')
+        shown_hemis = (('lh', 'rh') if shown_hemis in ('both', 'split') else
+                       (shown_hemis,))
+        if stc is not None:
+            _data_kwargs.update(_clim_to_add_data_kwargs(clim, stc.data))
+            for hemi, vertices in zip(('lh', 'rh'), stc.vertices):
+                if hemi in shown_hemis and len(vertices):
+                    brain.add_data(stc, hemi=hemi, **_data_kwargs)
+        try:
+            for frame in frames:
+                if 'time' in frame:
+                    brain.set_time(frame['time'])
+                for label in frame.get('labels', ()):
+                    label, kwargs = (label if isinstance(label, tuple) else
+                                     (label, dict()))
+                    brain.add_label(label, **kwargs)
+                if 'view' in frame:
+                    brain.show_view(**frame['view'])
+                brain.save_image(frame['img_path'])
+                # clean up for the next frame / next batch
+                brain.remove_labels()
+                if 'view' in frame:
+                    brain.reset_view()
+        finally:
+            if stc is not None:
+                del self._pool[key]
+                brain.close()
+        return [frame['img_path'] for frame in frames]
+
+    def close(self):
+        """Close all Brains in the pool."""
+        for brain in self._pool.values():
+            brain.close()
+        self._pool.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_brain_renderer = None
+
+
+def get_brain_renderer():
+    """Get this process's shared BrainRenderer, making it if needed."""
+    global _brain_renderer
+    if _brain_renderer is None:
+        _brain_renderer = BrainRenderer()
+    return _brain_renderer
+
+
 def plot_label_and_timeseries(label, img_path, df, method, groups, timepoints,
                               conditions, all_timepoints, all_conditions,
                               cluster=None, lineplot_kwargs=None, unit='time'):
@@ -404,6 +1054,324 @@ def plot_label_and_timeseries(label, img_path, df, method, groups, timepoints,
     plt.close(fig)
 
 
+def fft_n_jobs(n_jobs=None, cuda=True):
+    """Choose how to run MNE's FFT filtering and resampling on this machine.
+
+    Parameters
+    ----------
+
+    n_jobs : int | None
+        Number of CPU threads to use if there is no CUDA. If None, use every
+        CPU this process may run on.
+    cuda : bool
+        Whether to try CUDA at all (False for ``scipy.fft`` ``workers``).
+
+    Returns
+    -------
+
+    n_jobs : 'cuda' | int
+        'cuda' if CUDA can be initialized (``MNE_USE_CUDA`` is set, and cupy
+        finds a device); otherwise a number of threads, to pass to MNE inside
+        ``fft_threads``.
+    """
+    import mne.cuda
+    if cuda:
+        mne.cuda.init_cuda(verbose=False)
+        if mne.cuda._cuda_capable:
+            return 'cuda'
+    if n_jobs is None:
+        n_jobs = (len(os.sched_getaffinity(0))
+                  if hasattr(os, 'sched_getaffinity') else os.cpu_count())
+    return n_jobs
+
+
+@contextmanager
+def fft_threads(n_jobs):
+    """Run FFTs on ``n_jobs`` threads (does nothing if ``n_jobs='cuda'``).
+
+    Inside the context, MNE's ``n_jobs`` parallelism (one FFT per channel)
+    uses threads rather than worker processes, so the data are not copied to
+    each worker, and ``scipy.fft`` calls use ``n_jobs`` workers by default.
+    """
+    if n_jobs == 'cuda':
+        yield
+        return
+    from joblib import parallel_backend
+    from scipy.fft import set_workers
+    with parallel_backend('threading', n_jobs=n_jobs), set_workers(n_jobs):
+        yield
+
+
+def read_stim_steps(raw_fname, stim_channel=None, overwrite=False):
+    """Load the stim channel transitions of a raw file, decoding if needed.
+
+    Every change of value on each stim channel (sample, previous value, new
+    value) is cached in ``<raw>-stim-steps.npz`` next to the raw file, so the
+    stim channel is only read once; ``find_events_from_steps`` then gives any
+    masked variant of ``mne.find_events`` from the cache. The cache is remade
+    if the raw file is newer, or if it was made for other stim channels.
+
+    Parameters
+    ----------
+
+    raw_fname : str
+        Raw FIF file.
+    stim_channel : None | str | list of str
+        Stim channel(s), as for ``mne.find_events``.
+    overwrite : bool
+        Whether to decode the stim channel even if there is a cache.
+
+    Returns
+    -------
+
+    stim_steps : dict
+        ``steps`` (one array of shape (n_steps, 3) per stim channel, with a
+        final step back to zero if needed), ``initial`` (first value on each
+        channel), ``ch_names``, ``first_samp`` and ``sfreq``.
+    """
+    from mne.event import _find_stim_steps, _get_stim_channel
+    from mne.io import read_raw_fif
+    cache_fname = os.path.splitext(raw_fname)[0] + '-stim-steps.npz'
+    if stim_channel is not None and not isinstance(stim_channel, list):
+        stim_channel = [stim_channel]
+    if (not overwrite and os.path.isfile(cache_fname) and
+            os.path.getmtime(cache_fname) >= os.path.getmtime(raw_fname)):
+        with np.load(cache_fname) as cache:
+            ch_names = cache['ch_names'].tolist()
+            if cache['stim_channel'].tolist() == (stim_channel or []):
+                return dict(steps=[cache[f'steps_{ix}']
+                                   for ix in range(len(ch_names))],
+                            initial=cache['initial'], ch_names=ch_names,
+                            first_samp=int(cache['first_samp']),
+                            sfreq=float(cache['sfreq']))
+    raw = read_raw_fif(raw_fname, allow_maxshield=True, verbose=False)
+    ch_names = _get_stim_channel(stim_channel, raw.info)
+    picks = [raw.ch_names.index(ch) for ch in ch_names]
+    # same decoding as mne.find_events: integers, absolute value
+    data = np.abs(raw[picks, :][0].astype(np.int64))
+    steps = [_find_stim_steps(d[np.newaxis], raw.first_samp,
+                              pad_stop=0).astype(np.int64) for d in data]
+    stim_steps = dict(steps=steps, initial=data[:, 0], ch_names=ch_names,
+                      first_samp=raw.first_samp, sfreq=raw.info['sfreq'])
+    np.savez(cache_fname, stim_channel=np.array(stim_channel or [], str),
+             ch_names=ch_names, initial=data[:, 0],
+             first_samp=raw.first_samp, sfreq=raw.info['sfreq'],
+             **{f'steps_{ix}': s for ix, s in enumerate(steps)})
+    return stim_steps
+
+
+def find_events_from_steps(stim_steps, shortest_event=2, mask=None,
+                           mask_type='and', consecutive='increasing',
+                           output='onset', initial_event=False):
+    """Find events in cached stim channel transitions.
+
+    Gives the same events as ``mne.find_events`` with the same arguments
+    (``min_duration=0``, no ``uint_cast``), by masking the cached transitions
+    rather than the stim channel data.
+
+    Parameters
+    ----------
+
+    stim_steps : dict | str
+        Output of ``read_stim_steps``, or a raw file to pass to it.
+    shortest_event, mask, mask_type, consecutive, output, initial_event
+        As for ``mne.find_events``.
+
+    Returns
+    -------
+
+    events : array, shape (n_events, 3)
+        The events.
+    """
+    from mne.event import _find_unique_events
+    if isinstance(stim_steps, str):
+        stim_steps = read_stim_steps(stim_steps)
+    if mask_type not in ('and', 'not_and'):
+        raise ValueError(f"mask_type must be 'and' or 'not_and', got "
+                         f"{mask_type}")
+    if output not in ('onset', 'step', 'offset'):
+        raise ValueError(f"output must be 'onset', 'step' or 'offset', got "
+                         f"{output}")
+    if mask is not None and mask_type == 'not_and':
+        mask = np.bitwise_not(mask)
+    events_list = list()
+    for steps, initial in zip(stim_steps['steps'], stim_steps['initial']):
+        events = steps.copy()
+        if initial != 0 and initial_event:
+            events = np.insert(events, 0, [stim_steps['first_samp'], 0,
+                                           initial], axis=0)
+        if mask is not None:
+            events[:, 1:] = np.bitwise_and(events[:, 1:], mask)
+        events = events[events[:, 1] != events[:, 2]]
+        # onsets and offsets, as in mne.event._find_events
+        if consecutive == 'increasing':
+            onsets = events[:, 2] > events[:, 1]
+            offsets = ((onsets | (events[:, 2] == 0)) & (events[:, 1] > 0))
+        elif consecutive:
+            onsets = events[:, 2] > 0
+            offsets = events[:, 1] > 0
+        else:
+            onsets = events[:, 1] == 0
+            offsets = events[:, 2] == 0
+        onset_idx = np.where(onsets)[0]
+        offset_idx = np.where(offsets)[0]
+        if len(onset_idx) == 0 or len(offset_idx) == 0:
+            events_list.append(np.empty((0, 3), dtype=np.int64))
+            continue
+        # drop orphaned offset at the start / onset at the end
+        if onset_idx[0] > offset_idx[0]:
+            offset_idx = offset_idx[1:]
+        if onset_idx[-1] > offset_idx[-1]:
+            onset_idx = onset_idx[:-1]
+        if output == 'onset':
+            events = events[onset_idx]
+        elif output == 'step':
+            events = events[np.union1d(onset_idx, offset_idx)]
+        else:
+            event_id = events[onset_idx, 2]
+            events = events[offset_idx]
+            events[:, 1] = events[:, 2]
+            events[:, 2] = event_id
+            events[:, 0] -= 1
+        n_short_events = np.sum(np.diff(events[:, 0]) < shortest_event)
+        if n_short_events > 0:
+            raise ValueError(f'You have {n_short_events} events shorter than '
+                             'the shortest_event.')
+        events_list.append(events)
+    events = _find_unique_events(np.concatenate(events_list))
+    return events[np.argsort(events[:, 0])]
+
+
+def split_events(events, sfreq, orig_dur, new_dur, event_ids=None):
+    """Add events that split trials into shorter epochs.
+
+    Each event (or each of ``event_ids``) is followed by copies of itself
+    every ``new_dur`` seconds, up to ``orig_dur``: e.g. the 20 s PS/KT
+    trials get 3 more events, to make four 5 s epochs per trial.
+
+    Parameters
+    ----------
+
+    events : array, shape (n_events, 3)
+        The trial onsets.
+    sfreq : float
+        Sampling frequency of the events.
+    orig_dur, new_dur : float
+        Trial and epoch durations (in seconds).
+    event_ids : None | list of int
+        Which events to split (default: all).
+
+    Returns
+    -------
+
+    events : array, shape (n_new_events, 3)
+        The events, each followed by the events splitting it.
+    """
+    events = np.asarray(events)
+    n_splits = int(round(orig_dur / new_dur))
+    shifts = np.rint(np.arange(n_splits) * new_dur * sfreq).astype(int)
+    new_events = np.repeat(events[:, np.newaxis], n_splits, axis=1)
+    new_events[..., 0] += shifts
+    keep = np.ones(new_events.shape[:2], bool)
+    if event_ids is not None:
+        keep[~np.isin(events[:, 2], event_ids), 1:] = False
+    return new_events[keep]
+
+
+def make_resampled_epochs(raw, events, event_id, tmin, tmax, sfreq,
+                          margin=10., n_jobs=None):
+    """Epoch a raw file at a new sampling rate, resampling only the epochs.
+
+    Gives the same epochs as ``raw.resample(sfreq, events=events)`` followed
+    by ``mne.Epochs(..., baseline=None, proj=True,
+    reject_by_annotation=True)``, but only the stretches of data around the
+    epochs are read from disk and resampled. Each stretch is padded by
+    ``margin`` seconds on both sides and starts on a sample that the fully
+    resampled recording also has, so the epochs land on the same sample grid
+    and the edge effects of FFT resampling fall outside them.
+
+    Parameters
+    ----------
+
+    raw : Raw
+        The raw data (need not be preloaded).
+    events : array, shape (n_events, 3)
+        Events, at the original sampling rate.
+    event_id, tmin, tmax
+        As for ``mne.Epochs``.
+    sfreq : float
+        New sampling rate.
+    margin : float | None
+        Data (s) resampled either side of each stretch of epochs. If None,
+        the whole recording is resampled in one go (but still on the exact
+        sample grid).
+    n_jobs : int | 'cuda' | None
+        Passed to ``Raw.resample``.
+
+    Returns
+    -------
+
+    epochs : EpochsArray
+        The epochs (events, selection and drop log as for the full path).
+    """
+    from fractions import Fraction
+    from mne import Epochs, EpochsArray, pick_types
+    o_sfreq = raw.info['sfreq']
+    ratio = (Fraction(sfreq).limit_denominator(1000) /
+             Fraction(o_sfreq).limit_denominator(1000))
+    # every `step_new` new samples line up with every `step_old` old ones
+    step_new, step_old = ratio.numerator, ratio.denominator
+    # the stim channel(s) are resampled in full (cheap, no FFT): that gives
+    # the resampled events, which epochs survive the annotations, and the
+    # stim channel data of the epochs
+    stim = pick_types(raw.info, meg=False, stim=True)
+    ref = raw.copy().pick(stim if len(stim) else [0]).load_data()
+    ref, events = ref.resample(sfreq, events=events)
+    ref_epochs = Epochs(ref, events, event_id, tmin, tmax, baseline=None,
+                        reject_by_annotation=True, preload=True)
+    n_times = len(ref_epochs.times)
+    starts = (ref_epochs.events[:, 0] - ref.first_samp +
+              int(round(ref_epochs.tmin * sfreq)))
+    pad = ref.n_times if margin is None else int(np.ceil(margin * sfreq))
+    lows = np.maximum((starts - pad) // step_new * step_new, 0)
+    highs = np.minimum(-(-(starts + n_times + pad) // step_new) * step_new,
+                       ref.n_times // step_new * step_new)
+    assert (starts + n_times <= highs).all()
+    # pad by whole steps too, so that the FFT resampling puts the new samples
+    # exactly on the grid (``npad='auto'`` pads to a power of 2, which shifts
+    # and very slightly stretches the grid)
+    npad = step_old * int(np.ceil(100 / step_old))
+    # merge overlapping stretches (e.g. the sub-epochs of one PS/KT block)
+    stretches = list()
+    for ix, (low, high) in enumerate(zip(lows, highs)):
+        if len(stretches) and low <= stretches[-1][1]:
+            stretches[-1][1] = max(high, stretches[-1][1])
+            stretches[-1][2].append(ix)
+        else:
+            stretches.append([low, high, [ix]])
+    epochs_list = list()
+    for low, high, idx in stretches:
+        o_low, o_high = low * step_old // step_new, high * step_old // step_new
+        stretch = raw.copy().crop(o_low / o_sfreq, (o_high - 1) / o_sfreq)
+        stretch.load_data().resample(sfreq, npad=npad, n_jobs=n_jobs)
+        these_events = ref_epochs.events[idx].copy()
+        these_events[:, 0] += stretch.first_samp - ref.first_samp - low
+        epochs = Epochs(stretch, these_events, event_id, tmin, tmax,
+                        baseline=None, proj=True, reject_by_annotation=False,
+                        on_missing='ignore', preload=True)
+        assert len(epochs) == len(idx)
+        epochs_list.append(epochs)
+    data = np.concatenate([epochs.get_data() for epochs in epochs_list])
+    info = epochs_list[0].info
+    if len(stim):
+        stim_idx = [info['ch_names'].index(ch) for ch in ref_epochs.ch_names]
+        data[:, stim_idx] = ref_epochs.get_data()
+    epochs = EpochsArray(data, info, ref_epochs.events, ref_epochs.tmin,
+                         ref_epochs.event_id, selection=ref_epochs.selection)
+    epochs.drop_log = ref_epochs.drop_log
+    return epochs
+
+
 def subdivide_epochs(epochs, divisions):
     """Reshape epochs data to get different numbers of epochs."""
     from mne import EpochsArray
@@ -424,17 +1392,69 @@ def subdivide_epochs(epochs, divisions):
     return recut_epochs
 
 
+def get_dtypes(precision=None):
+    """Get the real & complex dtypes for 'double' or 'single' precision."""
+    precision = PRECISION if precision is None else precision
+    dtypes = dict(double=(np.float64, np.complex128),
+                  single=(np.float32, np.complex64))
+    if precision not in dtypes:
+        raise ValueError(f'precision must be "double" or "single", got '
+                         f'{repr(precision)}')
+    return dtypes[precision]
+
+
+def as_precision(data, precision=None):
+    """Cast real or complex data to the matching dtype for ``precision``."""
+    real_dtype, complex_dtype = get_dtypes(precision)
+    dtype = complex_dtype if np.iscomplexobj(data) else real_dtype
+    return data.astype(dtype, copy=False)
+
+
+def ttest_1samp_no_p(X, sigma=0):
+    """``mne.stats.ttest_1samp_no_p``, summing in double precision.
+
+    The t-values have the dtype of ``X``, so float32 data give float32
+    t-values without accumulating the means & variances in float32. For
+    float64 data the result is the same as from MNE.
+    """
+    var = np.var(X, axis=0, ddof=1, dtype=np.float64)
+    if sigma > 0:
+        var += sigma * np.max(var)
+    tvals = np.mean(X, axis=0, dtype=np.float64) / np.sqrt(var / X.shape[0])
+    return tvals.astype(X.dtype, copy=False)
+
+
+def ttest_ind_no_p(a, b, sigma=0):
+    """``mne.stats.ttest_ind_no_p`` (equal variances), summing in double.
+
+    See ``ttest_1samp_no_p``.
+    """
+    n1, n2 = a.shape[0], b.shape[0]
+    v1 = np.var(a, axis=0, ddof=1, dtype=np.float64)
+    v2 = np.var(b, axis=0, ddof=1, dtype=np.float64)
+    var = ((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2.)
+    var = var * (1. / n1 + 1. / n2)
+    if sigma > 0:
+        var += sigma * np.max(var)
+    diff = (np.mean(a, axis=0, dtype=np.float64) -
+            np.mean(b, axis=0, dtype=np.float64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tvals = np.divide(diff, np.sqrt(var))
+    return tvals.astype(np.result_type(a, b), copy=False)
+
+
 def div_by_adj_bins(data, n_bins=2, method='mean', return_noise=False):
     """
     data : np.ndarray
-        the data to enhance
+        the data to enhance (float64 or float32; the result has the same
+        dtype)
     n_bins : int
         number of bins on either side to include.
     method : 'mean' | 'sum'
         whether to divide by the sum or average of adjacent bins.
     """
     from scipy.ndimage import convolve1d
-    assert data.dtype == np.float64
+    assert data.dtype in (np.float64, np.float32)
     weights = np.ones(2 * n_bins + 1)
     weights[n_bins] = 0  # don't divide target bin by itself
     if method == 'mean':
@@ -446,3 +1466,682 @@ def div_by_adj_bins(data, n_bins=2, method='mean', return_noise=False):
 def nice_ticklabels(ticks, n=2):
     return list(
         map(str, [int(t) if t == int(t) else round(t, n) for t in ticks]))
+
+
+class LogHistogram:
+    """Streaming percentiles of non-negative data, in constant memory.
+
+    Values are counted in log-spaced bins that are each a factor
+    ``1 + rel_err`` wide, so the data can be added one array at a time and
+    never need to be held in memory together. A percentile is read off the
+    cumulative counts, interpolating within its bin; it is within ``rel_err``
+    (relative) of an order statistic adjacent to the exact ``np.percentile``
+    value, as long as the data lie within ``[vmin, vmax]``. NaN and infinite
+    values (e.g., 0 / 0 from ``div_by_adj_bins``) are not binned, only
+    counted in ``n_nonfinite``.
+
+    Parameters
+    ----------
+
+    rel_err : float
+        Relative width of the bins (and error bound of the percentiles).
+    vmin, vmax : float
+        Range of the bins; values outside it are counted in the end bins.
+    """
+
+    def __init__(self, rel_err=1e-3, vmin=1e-30, vmax=1e30):
+        self.rel_err = rel_err
+        self.vmin = vmin
+        self._log_ratio = np.log1p(rel_err)
+        n_bins = int(np.ceil(np.log(vmax / vmin) / self._log_ratio)) + 1
+        self.counts = np.zeros(n_bins, np.int64)
+        self.n_nonfinite = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def n(self):
+        return int(self.counts.sum())
+
+    def update(self, data):
+        """Add an array of values."""
+        data = np.asarray(data).ravel()
+        finite = np.isfinite(data)
+        if not finite.all():
+            self.n_nonfinite += int((~finite).sum())
+            data = data[finite]
+        if not data.size:
+            return
+        self.min = min(self.min, data.min())
+        self.max = max(self.max, data.max())
+        with np.errstate(divide='ignore'):
+            idx = np.floor(np.log(data / self.vmin) / self._log_ratio)
+        idx = np.clip(idx, 0, len(self.counts) - 1).astype(np.int64)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def percentile(self, q):
+        """Estimate percentile(s) ``q`` (0-100) of all the values added."""
+        q = np.asarray(q, float)
+        if not self.n:
+            return np.full(q.shape, np.nan)
+        cum = np.cumsum(self.counts)
+        # fractional rank, as for np.percentile's linear interpolation
+        rank = q / 100. * (cum[-1] - 1)
+        idx = np.searchsorted(cum, rank, side='right')
+        below = np.where(idx > 0, cum[idx - 1], 0)
+        frac = (rank - below + 0.5) / self.counts[idx]
+        values = self.vmin * np.exp((idx + frac) * self._log_ratio)
+        return np.clip(values, self.min, self.max)
+
+
+# files opened from Python, as (path, is_write) keys in the order first
+# opened, for profiling & provenance records (see the end of this module);
+# imports, /proc etc. are not counted, and each file is kept only once
+_opened = dict()
+_hdf5_read = list()  # STC files & stores read by the helpers above
+_PROFILE_SKIP_DIRS = tuple(os.path.join(path, '') for path in
+                           {sys.prefix, sys.base_prefix, sys.exec_prefix,
+                            '/proc', '/sys', '/dev'})
+_profilers = list()  # active StageProfilers
+_profile_logs = set()
+
+
+def _audit_open(event, args):
+    if event != 'open' or not isinstance(args[0], (str, bytes)):
+        return
+    path, mode, flags = args
+    path = os.path.abspath(os.fsdecode(path))
+    if (path.startswith(_PROFILE_SKIP_DIRS) or path in _profile_logs or
+            path.startswith(os.path.abspath(HASH_CACHE))):
+        return
+    if mode is None:
+        is_write = bool(flags & (os.O_WRONLY | os.O_RDWR))
+    else:
+        is_write = any(char in mode for char in 'wax+')
+    _opened[(path, is_write)] = None
+    for profiler in _profilers:
+        profiler._opened.add((path, is_write))
+
+
+def _read_proc(fname):
+    """Parse a ``/proc`` file of ``key: value`` lines ({} if unavailable)."""
+    try:
+        with open(fname, 'r') as f:
+            lines = [line.split(':', 1) for line in f]
+    except OSError:
+        return dict()
+    return {key: int(val.split()[0]) for key, val in lines
+            if val.split() and val.split()[0].isdigit()}
+
+
+def _peak_rss():
+    """Peak resident memory of this process (bytes) since the last reset."""
+    status = _read_proc('/proc/self/status')
+    if 'VmHWM' in status:
+        return status['VmHWM'] * 1024
+    import resource
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _reset_peak_rss():
+    """Restart the peak memory count (Linux), telling active profilers."""
+    peak = _peak_rss()
+    for profiler in _profilers:
+        profiler._peak = max(profiler._peak, peak)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass  # peaks of units will be those of the process so far
+
+
+def _resource_counters():
+    times = os.times()
+    io = _read_proc('/proc/self/io')
+    if not io:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        io = dict(rchar=usage.ru_inblock * 512, wchar=usage.ru_oublock * 512)
+    return dict(wall_s=time.perf_counter(), cpu_user_s=times.user,
+                cpu_sys_s=times.system,
+                cpu_children_s=times.children_user + times.children_system,
+                bytes_read=io.get('rchar', 0),
+                bytes_written=io.get('wchar', 0),
+                disk_read=io.get('read_bytes', 0),
+                disk_written=io.get('write_bytes', 0))
+
+
+class StageProfiler:
+    """Record the time, memory & I/O of a script (or part of one).
+
+    On ``stop()`` one JSON line is appended to ``fname``, with the wall time,
+    CPU time (of this process, and of child processes that have finished),
+    peak resident memory, bytes read & written (all reads/writes, and those
+    that reached the disk), and the number of distinct files opened for
+    reading & writing. Only files opened from Python are counted (not e.g.
+    HDF5 files opened by PyTables or h5py), but their bytes are. Memory & I/O
+    are only this process's, not those of joblib worker processes.
+
+    When ``PREK_PROFILE`` is set, every script that imports this module is
+    profiled from import to exit (``kind='stage'``), and loops over
+    ``profile_units()`` record each iteration (``kind='unit'``). Records of
+    one ``run_pipeline.py`` run share a ``run_id`` (``PREK_RUN_ID``);
+    ``analysis/profile_report.py`` summarizes and compares runs.
+
+    Parameters
+    ----------
+
+    fname : str
+        JSON-lines file to append the record to.
+    stage : str | None
+        Name of the stage. If None, the name of the script being run.
+    unit : str | None
+        Name of the unit of work within the stage (e.g., the subject).
+    kind : 'stage' | 'unit'
+        What is being profiled.
+    """
+
+    def __init__(self, fname, stage=None, unit=None, kind='unit'):
+        self.fname = os.path.abspath(fname)
+        _profile_logs.add(self.fname)
+        if stage is None:
+            stage = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        self.stage = stage or 'python'
+        self.unit = unit
+        self.kind = kind
+        self.status = 'ok'
+
+    def start(self):
+        if self.kind == 'unit':
+            _reset_peak_rss()
+        self._peak = 0
+        self._opened = set()
+        self._start = _resource_counters()
+        self._start_time = time.localtime()
+        _profilers.append(self)
+        return self
+
+    def stop(self, status=None):
+        """Append the record to ``fname``, and return it."""
+        end = _resource_counters()
+        _profilers.remove(self)
+        record = dict(run_id=RUN_ID, stage=self.stage, kind=self.kind,
+                      unit=self.unit, subjects=os.getenv('PREK_SUBJECTS'),
+                      precision=PRECISION, host=os.uname().nodename,
+                      pid=os.getpid(), status=status or self.status,
+                      start=time.strftime('%Y-%m-%dT%H:%M:%S',
+                                          self._start_time))
+        record.update({key: end[key] - self._start[key] for key in end})
+        record['peak_rss'] = max(self._peak, _peak_rss())
+        record['files_read'] = len({path for path, is_write in self._opened
+                                    if not is_write})
+        record['files_written'] = len({path for path, is_write
+                                       in self._opened if is_write})
+        with open(self.fname, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        return record
+
+
+def profile_units(units, stage=None):
+    """Loop over ``units`` (e.g. subjects), profiling each iteration.
+
+    Just yields the units unless ``PREK_PROFILE`` is set. An iteration left
+    early (by an error, or ``break``) is recorded with status
+    ``'incomplete'`` once the loop is cleaned up.
+
+    To measure each unit's own peak memory, the start of every unit resets
+    the peak memory of the whole process (``VmHWM`` in
+    ``/proc/self/status``, by writing to ``/proc/self/clear_refs``), so
+    anything else reading it afterwards only sees the peak since the last
+    unit started. Active StageProfilers carry the earlier peak over.
+    """
+    if not PROFILE:
+        yield from units
+        return
+    for unit in units:
+        profiler = StageProfiler(PROFILE, stage, str(unit)).start()
+        try:
+            yield unit
+        except GeneratorExit:
+            profiler.status = 'incomplete'
+            raise
+        finally:
+            profiler.stop()
+
+
+# an audit hook can't be removed, so only add it when something uses it
+if PROFILE or PROVENANCE:
+    sys.addaudithook(_audit_open)
+RUN_ID = os.getenv('PREK_RUN_ID') or time.strftime('%Y%m%d-%H%M%S')
+if PROFILE:
+    _stage_profiler = StageProfiler(PROFILE, kind='stage').start()
+    atexit.register(_stage_profiler.stop)
+    _excepthook = sys.excepthook
+
+    def _record_error(*args):
+        _stage_profiler.status = 'error'
+        _excepthook(*args)
+
+    sys.excepthook = _record_error
+
+
+# packages whose versions go in provenance records (if imported)
+_PROVENANCE_PACKAGES = ('mne', 'mnefun', 'numpy', 'scipy', 'pandas',
+                        'matplotlib', 'h5py', 'tables')
+_file_hashes = None  # path -> [size, mtime, SHA-1]; see _load_file_hashes
+_new_file_hashes = dict()  # those hashed by this process
+_git_info = dict()
+_stamped = set()  # outputs stamped by this process
+# helpers that don't change what an output contains (not hashed or followed)
+_BOOKKEEPING_HELPERS = ('stamp', 'profile_units')
+
+
+def _load_file_hashes():
+    global _file_hashes
+    if _file_hashes is None:
+        try:
+            with open(HASH_CACHE, 'r') as f:
+                _file_hashes = json.load(f)
+        except (OSError, ValueError):
+            _file_hashes = dict()
+    return _file_hashes
+
+
+def _save_file_hashes():
+    """Add the hashes made by this process to ``HASH_CACHE``."""
+    if not _new_file_hashes:
+        return
+    folder = os.path.dirname(os.path.abspath(HASH_CACHE))
+    try:
+        os.makedirs(folder, exist_ok=True)
+        try:  # other processes may have added hashes since it was loaded
+            with open(HASH_CACHE, 'r') as f:
+                hashes = json.load(f)
+        except (OSError, ValueError):
+            hashes = dict()
+        hashes.update(_new_file_hashes)
+        hashes = {path: entry for path, entry in hashes.items()
+                  if os.path.isfile(path)}
+        fd, tmp = tempfile.mkstemp(dir=folder,
+                                   prefix=os.path.basename(HASH_CACHE))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(hashes, f)
+        os.replace(tmp, HASH_CACHE)
+    except OSError:
+        return  # e.g. read-only home folder; they are hashed again next time
+    _new_file_hashes.clear()
+
+
+atexit.register(_save_file_hashes)
+
+
+def file_hash(fname):
+    """SHA-1 of a file's contents.
+
+    Hashes are cached (in ``HASH_CACHE``, across runs) while a file's size &
+    modification time are unchanged, so big inputs (raw files, epochs) are
+    only read again when they change. The hash of a folder (e.g., a Parquet
+    dataset) is that of the names & hashes of the files in it.
+    """
+    if os.path.isdir(fname):
+        sha = hashlib.sha1()
+        for root, dirs, files in sorted(os.walk(fname)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                sha.update(f'{os.path.relpath(path, fname)}:'
+                           f'{file_hash(path)}\n'.encode())
+        return sha.hexdigest()
+    path = os.path.abspath(fname)
+    stat = os.stat(path)
+    hashes = _load_file_hashes()
+    size, mtime, digest = hashes.get(path, (None, None, None))
+    if (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(partial(f.read, 2 ** 20), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        hashes[path] = _new_file_hashes[path] = [stat.st_size,
+                                                  stat.st_mtime_ns, digest]
+    return digest
+
+
+def _resolve_files(fname):
+    """The file(s) behind ``fname``, which can also be an STC's stem."""
+    if os.path.exists(fname):
+        return [os.path.abspath(fname)]
+    for suffixes in (('-stc.h5',), ('-lh.stc', '-rh.stc')):
+        fnames = [fname + suffix for suffix in suffixes]
+        if all(os.path.isfile(this_fname) for this_fname in fnames):
+            return [os.path.abspath(this_fname) for this_fname in fnames]
+    raise FileNotFoundError(f'No such file: {fname}')
+
+
+def _jsonable(obj):
+    """``obj`` as it reads back from a provenance record."""
+    return json.loads(json.dumps(obj, default=str))
+
+
+def _git_commit(path):
+    """Commit of the git checkout holding ``path``, and whether it is dirty.
+    """
+    folder = os.path.dirname(path)
+    if folder not in _git_info:
+        import subprocess
+        run = partial(subprocess.run, cwd=folder, capture_output=True,
+                      text=True)
+        try:
+            commit = run(['git', 'rev-parse', 'HEAD'])
+            status = run(['git', 'status', '--porcelain',
+                          '--untracked-files=no'])
+        except OSError:  # no git
+            commit = None
+        ok = commit is not None and commit.returncode == 0
+        _git_info[folder] = (dict(commit=commit.stdout.strip(),
+                                  dirty=bool(status.stdout.strip()))
+                             if ok else None)
+    return _git_info[folder]
+
+
+def _code_objects(obj):
+    """The code objects of a function (and the functions nested in it), or
+    of the methods of a class."""
+    import inspect
+    if inspect.isclass(obj):
+        for attr in vars(obj).values():
+            attr = getattr(attr, '__func__', getattr(attr, 'fget', attr))
+            if inspect.isfunction(attr):
+                yield from _code_objects(attr)
+        return
+    todo = [obj.__code__]
+    while todo:
+        code = todo.pop()
+        yield code
+        todo.extend(const for const in code.co_consts
+                    if inspect.iscode(const))
+
+
+def _source_hash(obj):
+    import inspect
+    return hashlib.sha1(inspect.getsource(obj).encode()).hexdigest()
+
+
+def helper_hashes(objs):
+    """SHA-1s of the source of helpers in this module, and of those they use.
+
+    Parameters
+    ----------
+
+    objs : list of function | class
+        Helpers from this module (e.g., those a script imported). Other
+        objects are ignored.
+
+    Returns
+    -------
+
+    hashes : dict
+        Maps the names of ``objs``, and of the helpers that they call
+        (directly or not), to the hashes of their source code. Module-level
+        constants, and the provenance & profiling helpers, are not followed.
+    """
+    import inspect
+    module = sys.modules[__name__]
+    hashes = dict()
+    todo = list(objs)
+    while todo:
+        obj = todo.pop()
+        if (getattr(obj, '__module__', None) != __name__ or
+                not (inspect.isfunction(obj) or inspect.isclass(obj)) or
+                obj.__name__ in hashes or
+                obj.__name__ in _BOOKKEEPING_HELPERS):
+            continue
+        hashes[obj.__name__] = _source_hash(obj)
+        for code in _code_objects(obj):
+            todo.extend(getattr(module, name) for name in code.co_names
+                        if hasattr(module, name))
+    return hashes
+
+
+def _files_read():
+    """Files read from Python so far, that are not params, code or outputs.
+    """
+    written = {path for path, is_write in _opened if is_write} | _stamped
+    files = {fname: None for fname in _hdf5_read}  # keeps the read order
+    for path, is_write in _opened:
+        hidden = any(part.startswith('.') for part in path.split(os.sep))
+        if not (is_write or hidden or path in written or
+                path.endswith(('.yaml', '.yml', '.py', '.pyc'))):
+            files[path] = None
+    return list(files)
+
+
+def provenance(inputs=None, **settings):
+    """Describe how the running script makes its outputs.
+
+    Parameters
+    ----------
+
+    inputs : list of str | None
+        Files (or STC stems) that the output is made from. If None, every
+        file read from Python so far (excluding parameter files, code, and
+        files this process wrote). Files read by h5py or PyTables (e.g.
+        ``-stc.h5`` files) are not seen, except by
+        ``get_stc_from_conditions`` and ``STCStore``, nor are files read by
+        joblib workers, so pass those explicitly.
+    **settings
+        Other settings that the output depends on (e.g., flags set at the top
+        of the script).
+
+    Returns
+    -------
+
+    record : dict
+        The script and its hash, the hashes of the helpers from this module
+        that it uses (see ``helper_hashes``) and of this whole module, the
+        git commit of the checkout (for information), package versions, the
+        contents of every YAML parameter file read so far, the settings
+        (including ``PREK_PRECISION`` and ``PREK_SUBJECTS``), and the hashes
+        of the inputs.
+    """
+    script = os.path.abspath(sys.argv[0]) if sys.argv[0] else ''
+    code = [path for path in (script,)
+            if path.endswith('.py') and os.path.isfile(path)]
+    main = sys.modules.get('__main__')
+    helpers = helper_hashes(vars(main).values() if main is not None else ())
+    # current_cohort.yaml is read before _audit_open is added
+    param_files = [os.path.abspath(os.path.join(paramdir,
+                                                'current_cohort.yaml'))]
+    param_files += [path for path, is_write in _opened if not is_write and
+                    path.endswith(('.yaml', '.yml'))]
+    params = dict()
+    for path in param_files:
+        if path not in params and os.path.isfile(path):
+            with open(path, 'r') as f:
+                params[path] = _jsonable(yamload(f))
+    if inputs is None:
+        inputs = _files_read()
+    inputs = [path for fname in inputs for path in _resolve_files(fname)]
+    versions = dict(python=sys.version.split()[0])
+    versions.update({name: getattr(sys.modules[name], '__version__', None)
+                     for name in _PROVENANCE_PACKAGES
+                     if name in sys.modules})
+    settings = dict(precision=PRECISION, subjects=os.getenv('PREK_SUBJECTS'),
+                    **settings)
+    return _jsonable(dict(
+        created=time.strftime('%Y-%m-%dT%H:%M:%S'),
+        script=script, host=os.uname().nodename,
+        git=_git_commit(os.path.abspath(__file__)),
+        code={path: file_hash(path) for path in code}, helpers=helpers,
+        module={os.path.abspath(__file__): file_hash(__file__)},
+        versions=versions, params=params, settings=settings,
+        inputs={path: file_hash(path) for path in inputs}))
+
+
+def _png_chunks(data):
+    pos = 8  # after the signature
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], 'big')
+        end = pos + 12 + length
+        yield data[pos + 4:pos + 8], data[pos:end]
+        pos = end
+
+
+def stamp(fname, inputs=None, **settings):
+    """Embed a provenance record (see ``provenance``) in output ``fname``.
+
+    Call this right after writing the output. The record is stored as a
+    ``provenance`` attribute of HDF5 files (``-stc.h5`` etc.), a
+    ``provenance`` array in ``.npz`` files, and a ``provenance`` text chunk
+    in ``.png`` files; other files (``.csv``, ``.stc``, ``.npy``,
+    ``.pdf``...) get a ``<fname>.prov.json`` file alongside, so their
+    readers need no changes. ``analysis/provenance_report.py`` uses the
+    records to tell which outputs are stale.
+
+    Records are only made when ``PREK_PROVENANCE`` is set (as it is by
+    ``run_pipeline.py``); otherwise this just removes the ``.prov.json``
+    file of an earlier run, if any, as it no longer describes the output.
+
+    Parameters
+    ----------
+
+    fname : str
+        The output file (or the stem that an STC was saved with).
+    inputs, **settings
+        See ``provenance``.
+
+    Returns
+    -------
+
+    record : dict | None
+        The provenance record (None if ``PREK_PROVENANCE`` is not set).
+    """
+    fnames = _resolve_files(fname)
+    _stamped.update(fnames)
+    if not PROVENANCE:
+        for fname in fnames:
+            if os.path.isfile(f'{fname}.prov.json'):
+                os.remove(f'{fname}.prov.json')
+        return None
+    record = provenance(inputs, **settings)
+    text = json.dumps(record)
+    for fname in fnames:
+        ext = os.path.splitext(fname)[1]
+        if ext in ('.h5', '.hdf5'):
+            import h5py
+            with h5py.File(fname, 'a') as h5:
+                h5.attrs['provenance'] = text
+        elif ext == '.npz':
+            import io
+            import zipfile
+            with zipfile.ZipFile(fname, 'r') as zf:
+                restamp = 'provenance.npy' in zf.namelist()
+            if restamp:  # rewrite the other arrays
+                with np.load(fname, allow_pickle=True) as npz:
+                    arrays = {key: npz[key] for key in npz.files
+                              if key != 'provenance'}
+                np.savez(fname, **arrays)
+            buffer = io.BytesIO()
+            np.save(buffer, np.array(text))
+            with zipfile.ZipFile(fname, 'a', zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr('provenance.npy', buffer.getvalue())
+        elif ext == '.png':
+            import zlib
+            with open(fname, 'rb') as f:
+                data = f.read()
+            chunks = [chunk for kind, chunk in _png_chunks(data)
+                      if not (kind == b'iTXt' and
+                              chunk[8:].startswith(b'provenance\0'))]
+            body = b'iTXt' + b'provenance\0\0\0\0\0' + text.encode()
+            new = ((len(body) - 4).to_bytes(4, 'big') + body +
+                   zlib.crc32(body).to_bytes(4, 'big'))
+            with open(fname, 'wb') as f:
+                f.write(b''.join([data[:8]] + chunks[:-1] + [new] +
+                                 chunks[-1:]))
+        else:
+            with open(f'{fname}.prov.json', 'w') as f:
+                f.write(text)
+    return record
+
+
+def read_provenance(fname):
+    """Read the provenance record of an output (None if there is none)."""
+    fname = _resolve_files(fname)[0]
+    ext = os.path.splitext(fname)[1]
+    text = None
+    if os.path.isfile(f'{fname}.prov.json'):
+        with open(f'{fname}.prov.json', 'r') as f:
+            text = f.read()
+    elif ext in ('.h5', '.hdf5'):
+        import h5py
+        with h5py.File(fname, 'r') as h5:
+            text = h5.attrs.get('provenance')
+    elif ext == '.npz':
+        with np.load(fname) as npz:
+            if 'provenance' in npz.files:
+                text = str(npz['provenance'])
+    elif ext == '.png':
+        with open(fname, 'rb') as f:
+            data = f.read()
+        for kind, chunk in _png_chunks(data):
+            if kind == b'iTXt' and chunk[8:].startswith(b'provenance\0'):
+                text = chunk[8 + len(b'provenance\0\0\0\0\0'):-4].decode()
+    return None if text is None else json.loads(text)
+
+
+def check_provenance(fname, versions=False, module=False):
+    """List the reasons that output ``fname`` is stale ([] if it is not).
+
+    Compares its provenance record with the parameter files, inputs, script
+    and helpers it used as they are now (and, if ``versions=True``, with the
+    installed package versions; if ``module=True``, with this whole module,
+    so that a change to any helper counts). Inputs are only compared with
+    the hashes recorded, so an input that is itself stale (but unchanged)
+    is not noticed; see ``analysis/provenance_report.py --recursive``.
+    """
+    record = read_provenance(fname)
+    if record is None:
+        return ['no provenance record']
+    reasons = list()
+    for path, params in record['params'].items():
+        if not os.path.isfile(path):
+            reasons.append(f'parameter file {path} is gone')
+            continue
+        with open(path, 'r') as f:
+            current = _jsonable(yamload(f))
+        if current == params:
+            continue
+        if isinstance(current, dict) and isinstance(params, dict):
+            keys = sorted(key for key in set(current) | set(params)
+                          if current.get(key) != params.get(key))
+            reasons.append(f'parameters changed in {path}: '
+                           f'{", ".join(keys)}')
+        else:
+            reasons.append(f'parameters changed in {path}')
+    files = (('inputs', 'input'), ('code', 'code')) + (
+        (('module', 'code'),) if module else ())
+    for kind, label in files:
+        for path, digest in record.get(kind, dict()).items():
+            if not os.path.exists(path):
+                reasons.append(f'{label} file {path} is gone')
+            elif file_hash(path) != digest:
+                reasons.append(f'{label} file {path} changed')
+    if 'helpers' not in record:  # records made before helpers were hashed
+        reasons.append('helpers used are unknown (older record)')
+    for name, digest in record.get('helpers', dict()).items():
+        helper = getattr(sys.modules[__name__], name, None)
+        if helper is None:
+            reasons.append(f'helper {name} is gone')
+        elif _source_hash(helper) != digest:
+            reasons.append(f'helper {name} changed')
+    if versions:
+        from importlib.metadata import version, PackageNotFoundError
+        for name, recorded in record['versions'].items():
+            try:
+                current = (sys.version.split()[0] if name == 'python' else
+                           version(name))
+            except PackageNotFoundError:
+                current = None
+            if current != recorded:
+                reasons.append(f'{name} {recorded} is now {current}')
+    return reasons